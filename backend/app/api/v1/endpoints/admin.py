@@ -1,17 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
 from fastapi import Request
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+import asyncio
+import json
 from pydantic import BaseModel
 
 from ....core.database import get_db
-from ....core.admin_auth import create_admin_session, verify_admin_session, verify_admin_password
+from ....core.admin_auth import (
+    admin_session_store, create_admin_session, delete_admin_session, verify_admin_session, verify_admin_password
+)
 from ....core.config import get_settings
-from ....models.meal import Meal
-from ....models.user import User
+from ....core.llm_client import llm_client
+from ....core.llm_router import llm_router
+from ....core.llm_guard import llm_guard
+from ....core.analysis_cache import analysis_cache
+from ....core.singleflight import llm_singleflight
+from ....core.nutrition_db import nutrition_db
+from ....core.job_queue import job_queue
+from ....core.events import meal_events
+from ....core.rate_limit import rate_limiter
+from ....core.user_cache import user_cache
+from ....core.clerk import clerk_client
+from ....core.profile_sync import profile_sync
+from ....core.rollup import user_count
+from ....models.meal_daily_rollup import MealDailyRollup
 
 router = APIRouter()
 settings = get_settings()
@@ -25,10 +41,11 @@ class AdminLoginRequest(BaseModel):
 async def admin_login(request: AdminLoginRequest, response: Response):
     """Connexion admin"""
     if verify_admin_password(request.password):
-        session_token = create_admin_session()
+        session_token = await create_admin_session()
         response.set_cookie(
             key="admin_session",
             value=session_token,
+            max_age=settings.ADMIN_SESSION_TTL,
             httponly=True,
             secure=False,  # True en production avec HTTPS
             samesite="lax"
@@ -44,14 +61,11 @@ async def admin_login(request: AdminLoginRequest, response: Response):
 @router.get("/logout")
 async def admin_logout(request: Request, response: Response):
     """Déconnexion admin"""
-    from ....core.admin_auth import admin_sessions
-    
     # Récupérer le token de session depuis les cookies
     admin_session = request.cookies.get("admin_session")
     
-    # Supprimer la session de la liste
-    if admin_session and admin_session in admin_sessions:
-        admin_sessions.discard(admin_session)
+    # Supprimer la session du store (partagé entre workers)
+    await delete_admin_session(admin_session)
     
     # Supprimer le cookie avec les mêmes paramètres que lors de la création
     response.delete_cookie(
@@ -64,9 +78,9 @@ async def admin_logout(request: Request, response: Response):
     return RedirectResponse(url="/admin", status_code=303)
 
 
-def require_admin_auth(admin_session: Optional[str] = Cookie(None)) -> bool:
+async def require_admin_auth(admin_session: Optional[str] = Cookie(None)) -> bool:
     """Dependency pour vérifier l'authentification admin"""
-    if not verify_admin_session(admin_session):
+    if not await verify_admin_session(admin_session):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentification admin requise"
@@ -76,86 +90,99 @@ def require_admin_auth(admin_session: Optional[str] = Cookie(None)) -> bool:
 
 @router.get("/stats")
 async def get_admin_stats(
-    db: Session = Depends(get_db),
-    _: bool = Depends(require_admin_auth)
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(require_admin_auth),
+    start: Optional[date] = None,
+    end: Optional[date] = None
 ):
-    """Statistiques pour le dashboard admin"""
+    """
+    Statistiques pour le dashboard admin, lues uniquement dans meal_daily_rollup
+    (une ligne par jour et par modèle : coût indépendant du nombre de repas)
+    et app_counters (nombre d'utilisateurs).
+    Sans période : totaux depuis le début et courbes sur les 7 derniers jours.
+    """
+    if start and end and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start doit précéder end"
+        )
     try:
-        # Total repas analysés
-        total_meals = db.query(func.count(Meal.id)).scalar() or 0
-        
-        # Total utilisateurs
-        total_users = db.query(func.count(User.id)).scalar() or 0
+        # Filtre des totaux : période demandée, sinon tout l'historique
+        period = []
+        if start:
+            period.append(MealDailyRollup.day >= start)
+        if end:
+            period.append(MealDailyRollup.day <= end)
         
-        # Coût total
-        total_cost = db.query(func.sum(Meal.cost_usd)).scalar() or 0.0
+        # Totaux repas / coût / tokens
+        total_meals, total_cost, total_tokens = (await db.execute(
+            select(
+                func.coalesce(func.sum(MealDailyRollup.meal_count), 0),
+                func.coalesce(func.sum(MealDailyRollup.cost_usd), 0.0),
+                func.coalesce(func.sum(MealDailyRollup.tokens_used), 0)
+            ).where(*period)
+        )).one()
         
-        # Tokens total
-        total_tokens = db.query(func.sum(Meal.tokens_used)).scalar() or 0
+        # Total utilisateurs : compteur tenu à jour à l'insertion, pas de COUNT(*) sur users
+        total_users = await user_count(db)
         
-        # Coût par jour (7 derniers jours)
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        daily_costs = db.query(
-            func.date(Meal.created_at).label('date'),
-            func.sum(Meal.cost_usd).label('cost')
-        ).filter(
-            Meal.created_at >= seven_days_ago
-        ).group_by(
-            func.date(Meal.created_at)
-        ).all()
+        # Coût et repas par jour (7 derniers jours par défaut)
+        daily_period = period or [MealDailyRollup.day >= date.today() - timedelta(days=7)]
+        daily = (await db.execute(
+            select(
+                MealDailyRollup.day,
+                func.sum(MealDailyRollup.cost_usd),
+                func.sum(MealDailyRollup.meal_count)
+            ).where(*daily_period).group_by(MealDailyRollup.day).order_by(MealDailyRollup.day)
+        )).all()
         
         daily_stats = [
             {
-                "date": str(date),
+                "date": str(day),
                 "cost": float(cost) if cost else 0.0
             }
-            for date, cost in daily_costs
+            for day, cost, _count in daily
         ]
         
-        # Repas par jour (7 derniers jours)
-        daily_meals = db.query(
-            func.date(Meal.created_at).label('date'),
-            func.count(Meal.id).label('count')
-        ).filter(
-            Meal.created_at >= seven_days_ago
-        ).group_by(
-            func.date(Meal.created_at)
-        ).all()
-        
         daily_meals_stats = [
             {
-                "date": str(date),
-                "count": count
+                "date": str(day),
+                "count": int(count)
             }
-            for date, count in daily_meals
+            for day, _cost, count in daily
         ]
         
         # Top modèles utilisés
-        model_usage = db.query(
-            Meal.model_used,
-            func.count(Meal.id).label('count'),
-            func.sum(Meal.cost_usd).label('cost')
-        ).group_by(
-            Meal.model_used
-        ).all()
+        model_usage = (await db.execute(
+            select(
+                MealDailyRollup.model_used,
+                func.sum(MealDailyRollup.meal_count),
+                func.sum(MealDailyRollup.cost_usd)
+            ).where(*period).group_by(MealDailyRollup.model_used)
+        )).all()
         
         model_stats = [
             {
                 "model": model,
-                "count": count,
+                "count": int(count),
                 "cost": float(cost) if cost else 0.0
             }
             for model, count, cost in model_usage
         ]
         
+        total_meals = int(total_meals)
         return {
             "summary": {
                 "total_meals": total_meals,
                 "total_users": total_users,
                 "total_cost_usd": round(float(total_cost), 6),
-                "total_tokens": total_tokens,
+                "total_tokens": int(total_tokens),
                 "avg_cost_per_meal": round(float(total_cost) / total_meals, 6) if total_meals > 0 else 0.0
             },
+            "period": {
+                "start": str(start) if start else None,
+                "end": str(end) if end else None
+            },
             "daily_costs": daily_stats,
             "daily_meals": daily_meals_stats,
             "model_usage": model_stats
@@ -167,3 +194,135 @@ async def get_admin_stats(
         )
 
 
+@router.get("/stats/stream")
+async def stream_admin_stats(_: bool = Depends(require_admin_auth)):
+    """
+    Deltas en direct pour le dashboard (Server-Sent Events), sans requête SQL :
+    `delta` à chaque repas enregistré (par modèle : repas, tokens, coût),
+    `resync` si le client a pris du retard (recharger /stats).
+    Le bus est propre à chaque process : avec plusieurs workers uvicorn, un
+    dashboard ne voit que les repas traités par le sien.
+    """
+    queue = meal_events.subscribe()
+    
+    async def event_stream():
+        try:
+            yield ": connecté\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    # Garde la connexion ouverte à travers les proxys
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            meal_events.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/llm/pool")
+async def get_llm_pool_stats(_: bool = Depends(require_admin_auth)):
+    """Statistiques du pool de connexions OpenRouter"""
+    return llm_client.stats()
+
+
+@router.get("/cache")
+async def get_analysis_cache_stats(_: bool = Depends(require_admin_auth)):
+    """Statistiques du cache d'analyses (hits, misses, évictions)"""
+    return analysis_cache.stats()
+
+
+@router.get("/llm/singleflight")
+async def get_llm_singleflight_stats(_: bool = Depends(require_admin_auth)):
+    """Appels OpenRouter économisés par regroupement des requêtes identiques"""
+    return llm_singleflight.stats()
+
+
+@router.get("/nutrition/local")
+async def get_local_nutrition_stats(
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(require_admin_auth)
+):
+    """Base locale vs LLM : taux de réponse, latence et coût par chemin"""
+    per_path = (await db.execute(select(
+        MealDailyRollup.model_used,
+        func.sum(MealDailyRollup.meal_count),
+        func.sum(MealDailyRollup.cost_usd)
+    ).group_by(MealDailyRollup.model_used))).all()
+    return {
+        "engine": nutrition_db.stats(),
+        "llm": {
+            "requests_total": llm_client.requests_total,
+            "avg_latency_ms": llm_client.stats()["avg_latency_ms"],
+        },
+        "paths": [
+            {
+                "model": model,
+                "count": int(count),
+                "avg_cost_usd": round(float(total_cost or 0.0) / count, 6) if count else 0.0,
+                "total_cost_usd": round(float(total_cost or 0.0), 6),
+            }
+            for model, count, total_cost in per_path
+        ]
+    }
+
+
+@router.get("/llm/router")
+async def get_llm_router_stats(
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(require_admin_auth)
+):
+    """Latences par modèle, hedges lancés / gagnés et coût total de la couverture"""
+    hedge_cost = (await db.execute(select(func.sum(MealDailyRollup.hedge_cost_usd)))).scalar() or 0.0
+    return {**llm_router.stats(), "total_hedge_cost_usd": round(float(hedge_cost), 6)}
+
+
+@router.get("/llm/guard")
+async def get_llm_guard_stats(_: bool = Depends(require_admin_auth)):
+    """État du disjoncteur et de la limite de concurrence adaptative"""
+    return llm_guard.stats()
+
+
+@router.get("/jobs")
+async def get_job_queue_stats(
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(require_admin_auth)
+):
+    """File d'analyses asynchrones : profondeur, jobs en cours, attente et durée moyennes"""
+    return await job_queue.stats(db)
+
+
+@router.get("/rate-limit")
+async def get_rate_limit_stats(_: bool = Depends(require_admin_auth)):
+    """Rate limiter : vérifications, rejets par règle et coût moyen d'une vérification"""
+    return rate_limiter.stats()
+
+
+@router.get("/auth/cache")
+async def get_user_cache_stats(_: bool = Depends(require_admin_auth)):
+    """Cache des utilisateurs authentifiés : hit ratio et durée de l'étape d'authentification"""
+    return user_cache.stats()
+
+
+@router.get("/auth/jwks")
+async def get_jwks_stats(_: bool = Depends(require_admin_auth)):
+    """Vérification locale des tokens Clerk : état du JWKS, tokens vérifiés / rejetés, coût moyen"""
+    return clerk_client.stats()
+
+
+@router.get("/auth/profile-sync")
+async def get_profile_sync_stats(_: bool = Depends(require_admin_auth)):
+    """Synchronisation des profils Clerk : file, taille des lots, lag et mises à jour appliquées"""
+    return profile_sync.stats()
+
+
+@router.get("/sessions")
+async def get_admin_session_stats(_: bool = Depends(require_admin_auth)):
+    """Sessions admin : backend, sessions actives et purgées"""
+    return await admin_session_store.stats()
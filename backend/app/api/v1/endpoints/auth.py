@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import httpx
@@ -8,6 +8,8 @@ from datetime import datetime
 from ....core.database import get_db
 from ....core.config import get_settings
 from ....core.auth import get_current_user
+from ....core.quota import quota_remaining, quota_used
+from ....core.http_cache import json_response, not_modified, weak_etag
 from ....models.user import User, SubscriptionTier
 
 router = APIRouter()
@@ -35,7 +37,7 @@ class AuthResponse(BaseModel):
 
 
 @router.post("/signup", response_model=AuthResponse)
-async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
+async def signup(request: SignUpRequest, db: AsyncSession = Depends(get_db)):
     """
     Créer un compte utilisateur via Clerk
     """
@@ -113,7 +115,7 @@ async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
             
             # Créer l'utilisateur dans notre DB
             try:
-                user = db.query(User).filter(User.id == clerk_user_id).first()
+                user = await db.get(User, clerk_user_id)
                 if not user:
                     user = User(
                         id=clerk_user_id,
@@ -125,14 +127,14 @@ async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
                         quota_reset_date=datetime.now()
                     )
                     db.add(user)
-                    db.commit()
-                    db.refresh(user)
+                    await db.commit()
+                    await db.refresh(user)
                     print(f"✅ Utilisateur créé dans DB: {clerk_user_id}")
                 else:
                     print(f"ℹ️ Utilisateur existe déjà dans DB: {clerk_user_id}")
             except Exception as db_error:
                 print(f"❌ Erreur DB: {str(db_error)}")
-                db.rollback()
+                await db.rollback()
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=f"Erreur sauvegarde utilisateur: {str(db_error)}"
@@ -167,7 +169,7 @@ async def signup(request: SignUpRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/signin", response_model=AuthResponse)
-async def signin(request: SignInRequest, db: Session = Depends(get_db)):
+async def signin(request: SignInRequest, db: AsyncSession = Depends(get_db)):
     """
     Se connecter via Clerk et obtenir un token
     """
@@ -212,7 +214,7 @@ async def signin(request: SignInRequest, db: Session = Depends(get_db)):
             clerk_user_id = clerk_user.get("id")
             
             # Créer ou récupérer l'utilisateur dans notre DB
-            user = db.query(User).filter(User.id == clerk_user_id).first()
+            user = await db.get(User, clerk_user_id)
             if not user:
                 user = User(
                     id=clerk_user_id,
@@ -224,8 +226,8 @@ async def signin(request: SignInRequest, db: Session = Depends(get_db)):
                     quota_reset_date=datetime.now()
                 )
                 db.add(user)
-                db.commit()
-                db.refresh(user)
+                await db.commit()
+                await db.refresh(user)
             
             # Pour obtenir un token JWT, on doit utiliser l'endpoint de session de Clerk
             # Pour simplifier le MVP, on va générer un token basique
@@ -262,14 +264,22 @@ class UserInfo(BaseModel):
 
 
 @router.get("/me", response_model=UserInfo)
-async def get_current_user_info(user: User = Depends(get_current_user)):
-    """Récupère les informations de l'utilisateur connecté"""
-    return UserInfo(
-        id=user.id,
-        email=user.email,
-        display_name=user.display_name,
-        subscription=user.subscription.value,
-        daily_quota=user.daily_quota,
-        quota_used=user.quota_used,
-        quota_remaining=user.daily_quota - user.quota_used if user.daily_quota != -1 else -1
-    )
+async def get_current_user_info(request: Request, user: User = Depends(get_current_user)):
+    """
+    Récupère les informations de l'utilisateur connecté.
+    L'ETag faible dérive des champs renvoyés (profil + quota) : aucune requête en plus.
+    """
+    info = {
+        "id": user.id,
+        "email": user.email,
+        "display_name": user.display_name,
+        "subscription": user.subscription.value,
+        "daily_quota": user.daily_quota,
+        "quota_used": quota_used(user),
+        "quota_remaining": quota_remaining(user),
+    }
+    etag = weak_etag("me", *info.values())
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    return json_response(request, info, etag=etag)
@@ -1,42 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import base64
 import httpx
 import json
 import re
+import time
 import uuid
 from datetime import datetime
 
-from ....core.database import get_db
+from ....core.database import get_db, SessionLocal
 from ....core.config import get_settings
 from ....core.auth import get_current_user
+from ....core.llm_client import llm_client
+from ....core.llm_router import llm_router
+from ....core.llm_guard import UpstreamUnavailable
+from ....core.analysis_cache import analysis_cache, cache_key
+from ....core.singleflight import Claim, llm_singleflight
+from ....core.json_stream import IncrementalJSONObjectParser
+from ....core.nutrition_db import nutrition_db, LOCAL_MODEL_NAME
+from ....core.job_queue import job_queue, TERMINAL_STATUSES
+from ....core.rollup import record_meals, publish_meals
+from ....core.quota import reserve_quota, refund_quota, quota_remaining
+from ....core.serialization import dumps, meal_analysis, meal_read, trusted_response
+from ....core.http_cache import json_response, not_modified, weak_etag
+from ....core.metrics import record_llm_usage
+from ....core.meal_sync import CursorExpired, NDJSON_MEDIA_TYPE, SyncCursor, delta, delete_meal, stream_delta
 from ....models.meal import Meal
+from ....models.analysis_job import AnalysisJob, JobStatus
 from ....models.user import User, SubscriptionTier
-from ....schemas.meal import MealAnalysisRequest, MealAnalysisResponse, NutritionData, MealMetadata, MealRead
+from ....schemas.meal import (
+    MealAnalysisRequest, MealAnalysisResponse, MealPage, MealRead,
+    MealBatchAnalysisRequest, MealBatchAnalysisResponse,
+    AnalysisJobAccepted, AnalysisJobRead,
+)
 
 router = APIRouter()
 settings = get_settings()
 
 
-@router.post("/analyze", response_model=MealAnalysisResponse)
-async def analyze_meal(
-    request: MealAnalysisRequest,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    """Analyse un repas via OpenRouter"""
-    
-    # L'utilisateur est déjà récupéré depuis Clerk via get_current_user
-    
-    # Vérifier quota
-    if user.has_reached_quota():
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Quota atteint"
-        )
-    
-    # Prompt optimisé
-    system_prompt = """Tu es un assistant nutritionnel. Retourne UNIQUEMENT un JSON valide :
+# Prompt optimisé
+SYSTEM_PROMPT = """Tu es un assistant nutritionnel. Retourne UNIQUEMENT un JSON valide :
 {
   "calories": nombre,
   "proteins": nombre,
@@ -45,8 +53,28 @@ async def analyze_meal(
   "fiber": nombre,
   "suggestions": ["suggestion 1", "suggestion 2"]
 }"""
-    
-    # Appel OpenRouter
+
+
+BATCH_SYSTEM_PROMPT = """Tu es un assistant nutritionnel. Tu reçois une liste numérotée de repas.
+Retourne UNIQUEMENT un tableau JSON valide, un objet par repas, dans le même ordre :
+[
+  {
+    "index": numéro du repas,
+    "calories": nombre,
+    "proteins": nombre,
+    "carbs": nombre,
+    "fats": nombre,
+    "fiber": nombre,
+    "suggestions": ["suggestion 1", "suggestion 2"]
+  }
+]"""
+
+
+async def _complete(system_prompt: str, user_content: str, max_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Appelle OpenRouter via le routeur multi-modèles et retourne
+    (message du modèle, {"usage", "model", "hedge_cost_usd"})
+    """
     if not settings.OPENROUTER_API_KEY:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -54,25 +82,20 @@ async def analyze_meal(
         )
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                },
-                json={
-                    "model": settings.OPENROUTER_MODEL,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"Repas : {request.description.strip()}"}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 500,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
+        data, model, hedge_cost = await llm_router.complete({
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            "temperature": 0.3,
+            "max_tokens": max_tokens,
+        })
+    except UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except httpx.HTTPStatusError as e:
         print(f"❌ Erreur OpenRouter HTTP: {e.response.status_code} - {e.response.text}")
         raise HTTPException(
@@ -96,13 +119,17 @@ async def analyze_meal(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Format de réponse invalide: {str(e)}"
         )
-    
+    return ai_message, {"usage": usage, "model": model, "hedge_cost_usd": hedge_cost}
+
+
+def _extract_json(ai_message: str, pattern: str) -> Any:
+    """Extrait et décode le bloc JSON (objet ou tableau) de la réponse du modèle"""
     try:
-        json_match = re.search(r'\{[\s\S]*\}', ai_message)
+        json_match = re.search(pattern, ai_message)
         if not json_match:
             print(f"❌ Pas de JSON trouvé dans: {ai_message}")
             raise ValueError("JSON invalide dans la réponse")
-        nutrition_json = json.loads(json_match.group(0))
+        return json.loads(json_match.group(0))
     except json.JSONDecodeError as e:
         print(f"❌ Erreur parsing JSON: {ai_message}")
         raise HTTPException(
@@ -115,104 +142,804 @@ async def analyze_meal(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur parsing: {str(e)}"
         )
+
+
+async def _call_llm(description: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Analyse un repas via OpenRouter et retourne (nutrition_json, completion)"""
+    ai_message, completion = await _complete(SYSTEM_PROMPT, f"Repas : {description}", 500)
+    return _extract_json(ai_message, r'\{[\s\S]*\}'), completion
+
+
+async def _call_llm_batch(descriptions: List[str]) -> Tuple[List[Optional[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Analyse plusieurs repas en une seule complétion.
+    Retourne (résultats alignés sur `descriptions`, None si absent de la réponse ; completion)
+    """
+    meals_list = "\n".join(f"{i}. {d}" for i, d in enumerate(descriptions))
+    ai_message, completion = await _complete(BATCH_SYSTEM_PROMPT, f"Repas :\n{meals_list}", 100 + 300 * len(descriptions))
+    items = _extract_json(ai_message, r'\[[\s\S]*\]')
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur parsing: tableau JSON attendu"
+        )
     
-    # Calcul coût
+    results: List[Optional[Dict[str, Any]]] = [None] * len(descriptions)
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index", position)
+        if isinstance(index, int) and 0 <= index < len(descriptions) and results[index] is None:
+            results[index] = item
+    return results, completion
+
+
+def _compute_cost(usage: Dict[str, Any], model: str) -> Tuple[int, float]:
+    """Retourne (total_tokens, coût USD) à partir du bloc `usage` d'OpenRouter et des tarifs du modèle"""
     prompt_tokens = usage.get("prompt_tokens", 0)
     completion_tokens = usage.get("completion_tokens", 0)
     total_tokens = usage.get("total_tokens", prompt_tokens + completion_tokens)
+    return total_tokens, llm_router.cost(model, usage)
+
+
+async def _lookup_without_llm(db: AsyncSession, description: str, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Base nutritionnelle locale puis cache d'analyses : (nutrition_json, model_used) ou (None, None)"""
+    if settings.LOCAL_NUTRITION_ENABLED:
+        local = nutrition_db.analyze(description)
+        if local:
+            return local, LOCAL_MODEL_NAME
+    if settings.ANALYSIS_CACHE_ENABLED:
+        cached = await analysis_cache.get(db, key)
+        if cached:
+            # Modèle qui a réellement produit l'analyse (principal, hedge ou secours)
+            return cached, f"cache:{cached['model']}"
+    return None, None
+
+
+def _new_meal(
+    user: User,
+    description: str,
+    nutrition_json: Dict[str, Any],
+    model_used: str,
+    tokens_used: int,
+    cost_usd: float,
+    hedge_cost_usd: float = 0.0
+) -> Meal:
+    """Construit la ligne Meal à partir du JSON nutritionnel (lève ValueError si invalide)"""
+    return Meal(
+        id=str(uuid.uuid4()),
+        user_id=user.id,
+        description=description,
+        calories=float(nutrition_json.get("calories", 0)),
+        proteins=float(nutrition_json.get("proteins", 0)),
+        carbs=float(nutrition_json.get("carbs", 0)),
+        fats=float(nutrition_json.get("fats", 0)),
+        fiber=float(nutrition_json.get("fiber", 0.0)),
+        suggestions=nutrition_json.get("suggestions", []),
+        model_used=model_used,
+        tokens_used=tokens_used,
+        cost_usd=round(cost_usd, 6),
+        hedge_cost_usd=round(hedge_cost_usd, 6)
+    )
+
+
+def _cache_value(meal: Meal) -> Dict[str, Any]:
+    return {
+        "calories": meal.calories,
+        "proteins": meal.proteins,
+        "carbs": meal.carbs,
+        "fats": meal.fats,
+        "fiber": meal.fiber,
+        "suggestions": meal.suggestions,
+        "tokens_used": meal.tokens_used,
+        "cost_usd": meal.cost_usd,
+        "model": meal.model_used,
+    }
+
+
+def _build_response(meal: Meal, user: User) -> Dict[str, Any]:
+    """Réponse MealAnalysisResponse sous forme de dict (sérialisée directement par orjson)"""
+    return meal_analysis(meal, quota_remaining(user))
+
+
+async def _shared_llm_call(description: str, key: str) -> Tuple[Dict[str, Any], Dict[str, Any], Claim]:
+    """Appel OpenRouter partagé : (nutrition_json, completion, coût + clé de cache à attribuer)"""
+    nutrition_json, completion = await _call_llm(description)
+    tokens_used, cost_usd = _compute_cost(completion["usage"], completion["model"])
+    return nutrition_json, completion, Claim({
+        "tokens_used": tokens_used,
+        "cost_usd": cost_usd,
+        "hedge_cost_usd": completion["hedge_cost_usd"],
+        "cache_key": key,
+    })
+
+
+async def _run_analysis(db: AsyncSession, description: str) -> Dict[str, Any]:
+    """
+    Base locale, cache d'analyses puis OpenRouter (appel partagé entre requêtes identiques).
+    Retourne le JSON nutritionnel et le modèle ; le coût de l'appel et la clé à mettre en
+    cache sont attribués à la sauvegarde par _take_charge.
+    """
+    # Base locale puis cache (même repas normalisé + mêmes modèles du routeur) => pas d'appel LLM
+    key, normalized = cache_key(description, llm_router.cache_scope())
+    cached, model_used = await _lookup_without_llm(db, description, key)
+    analysis = {
+        "nutrition": cached,
+        "model_used": model_used,
+        "tokens_used": 0,
+        "cost_usd": 0.0,
+        "hedge_cost_usd": 0.0,
+        "cache_key": None,
+        "normalized": normalized,
+        "charge": None,
+    }
+    if cached:
+        return analysis
     
-    input_cost = (prompt_tokens / 1_000_000) * 0.5
-    output_cost = (completion_tokens / 1_000_000) * 1.5
-    total_cost = input_cost + output_cost
+    # Fin de la transaction de lecture : la connexion retourne au pool pendant l'appel LLM
+    await db.commit()
+    
+    # Requêtes identiques simultanées => un seul appel OpenRouter partagé
+    (nutrition_json, completion, charge), _ = await llm_singleflight.do(key, lambda: _shared_llm_call(description, key))
+    analysis["nutrition"] = nutrition_json
+    analysis["model_used"] = completion["model"]
+    analysis["charge"] = charge
+    return analysis
+
+
+def _take_charge(analysis: Dict[str, Any]):
+    """
+    Juste avant la sauvegarde : le coût de l'appel partagé et l'écriture du cache reviennent
+    au premier repas sauvegardé, pas forcément à celui du client qui a lancé l'appel
+    (parti ou en échec entre-temps) ; les autres repas de l'appel sont à coût nul.
+    """
+    charge = analysis["charge"].take() if analysis["charge"] else None
+    if charge:
+        analysis.update(charge)
+
+
+def _return_charge(analysis: Dict[str, Any]):
+    """Sauvegarde ratée : le coût passe au prochain repas de l'appel partagé"""
+    if analysis["charge"] and analysis["cache_key"]:
+        analysis["charge"].give_back()
+        analysis.update(tokens_used=0, cost_usd=0.0, hedge_cost_usd=0.0, cache_key=None)
+
+
+async def _store_analysis(db: AsyncSession, analysis: Dict[str, Any], meal: Meal):
+    if settings.ANALYSIS_CACHE_ENABLED and analysis["cache_key"]:
+        await analysis_cache.set(db, analysis["cache_key"], analysis["normalized"], meal.model_used, _cache_value(meal))
+
+
+@router.post(
+    "/analyze",
+    response_model=MealAnalysisResponse,
+    responses={202: {"model": AnalysisJobAccepted}}
+)
+async def analyze_meal(
+    request: MealAnalysisRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+    mode: str = Query("sync", pattern="^(sync|async)$")
+):
+    """
+    Analyse un repas via la base locale, le cache d'analyses ou OpenRouter.
+    `mode=async` : retourne 202 + job_id ; le résultat est disponible via
+    GET /jobs/{job_id} (polling) ou GET /jobs/{job_id}/events (SSE).
+    """
+    
+    # L'utilisateur est déjà récupéré depuis Clerk via get_current_user
+    
+    description = request.description.strip()
+    
+    if mode == "async":
+        # Le quota est réservé dès la mise en file, rendu si le job échoue
+        try:
+            job = await job_queue.enqueue(db, str(uuid.uuid4()), user, description)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"❌ Erreur mise en file: {str(e)}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erreur mise en file: {str(e)}"
+            )
+        accepted = AnalysisJobAccepted(
+            job_id=job.id,
+            status=job.status.value,
+            quota_remaining=quota_remaining(user)
+        )
+        return trusted_response(
+            accepted.model_dump(),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Location": f"/api/v1/meals/jobs/{job.id}"}
+        )
+    
+    # Réservation atomique avant tout appel LLM (429 si le quota est atteint)
+    await reserve_quota(db, user)
+    await db.commit()
+    
+    try:
+        analysis = await _run_analysis(db, description)
+    except (Exception, asyncio.CancelledError):
+        # Échec LLM ou client parti : la réservation est rendue
+        await refund_quota(db, user.id, user=user)
+        await db.commit()
+        raise
     
     # Sauvegarder
+    _take_charge(analysis)
     try:
-        meal_id = str(uuid.uuid4())
-        meal = Meal(
-            id=meal_id,
-            user_id=user.id,
-            description=request.description.strip(),
-            calories=float(nutrition_json.get("calories", 0)),
-            proteins=float(nutrition_json.get("proteins", 0)),
-            carbs=float(nutrition_json.get("carbs", 0)),
-            fats=float(nutrition_json.get("fats", 0)),
-            fiber=float(nutrition_json.get("fiber", 0.0)),
-            suggestions=nutrition_json.get("suggestions", []),
-            model_used=settings.OPENROUTER_MODEL,
-            tokens_used=total_tokens,
-            cost_usd=round(total_cost, 6)
+        meal = _new_meal(
+            user, description, analysis["nutrition"], analysis["model_used"],
+            analysis["tokens_used"], analysis["cost_usd"], analysis["hedge_cost_usd"]
         )
         
         db.add(meal)
-        user.quota_used += 1
-        db.commit()
-        db.refresh(meal)
+        day = await record_meals(db, [meal])
+        await db.commit()
+        await db.refresh(meal)
     except Exception as e:
         print(f"❌ Erreur sauvegarde DB: {str(e)}")
-        db.rollback()
+        _return_charge(analysis)
+        await db.rollback()
+        await refund_quota(db, user.id, user=user)
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur sauvegarde: {str(e)}"
         )
     
-    return MealAnalysisResponse(
-        meal_id=meal_id,
-        description=meal.description,
-        nutrition=NutritionData(
-            calories=meal.calories,
-            proteins=meal.proteins,
-            carbs=meal.carbs,
-            fats=meal.fats,
-            fiber=meal.fiber,
-            suggestions=meal.suggestions
-        ),
-        metadata=MealMetadata(
-            model_used=meal.model_used,
-            tokens_used=meal.tokens_used,
-            cost_usd=meal.cost_usd
-        ),
-        quota_remaining=user.daily_quota - user.quota_used if user.daily_quota != -1 else -1
+    publish_meals([meal], day)
+    await _store_analysis(db, analysis, meal)
+    
+    return trusted_response(_build_response(meal, user))
+
+
+async def run_analysis_job(job_id: str):
+    """Traite un job réclamé par la file (quota déjà réservé à la mise en file)"""
+    async with SessionLocal() as db:
+        job = await db.get(AnalysisJob, job_id)
+        if job is None or job.status != JobStatus.RUNNING:
+            return
+        user = await db.get(User, job.user_id)
+        
+        try:
+            analysis = await _run_analysis(db, job.description)
+        except HTTPException as e:
+            if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+                # Amont indisponible : remis en file tout de suite, réclamable après Retry-After
+                retry_after = int((e.headers or {}).get("Retry-After", 0))
+                await job_queue.retry(db, job, str(e.detail), delay=retry_after)
+            else:
+                await job_queue.fail(db, job, str(e.detail))
+            return
+        
+        _take_charge(analysis)
+        try:
+            meal = _new_meal(
+                user, job.description, analysis["nutrition"], analysis["model_used"],
+                analysis["tokens_used"], analysis["cost_usd"], analysis["hedge_cost_usd"]
+            )
+            db.add(meal)
+            await db.flush()
+            day = await record_meals(db, [meal])
+            await job_queue.succeed(db, job, meal.id)
+        except Exception as e:
+            print(f"❌ Erreur sauvegarde DB: {str(e)}")
+            _return_charge(analysis)
+            await db.rollback()
+            await job_queue.fail(db, await db.get(AnalysisJob, job_id), f"Erreur sauvegarde: {str(e)}")
+            return
+        
+        publish_meals([meal], day)
+        await _store_analysis(db, analysis, meal)
+
+
+async def _job_read(db: AsyncSession, job: AnalysisJob, user: User) -> AnalysisJobRead:
+    result = None
+    if job.meal_id:
+        meal = await db.get(Meal, job.meal_id)
+        if meal:
+            result = _build_response(meal, user)
+    return AnalysisJobRead(
+        job_id=job.id,
+        status=job.status.value,
+        attempts=job.attempts,
+        error=job.error,
+        result=result,
+        created_at=job.created_at.isoformat() if job.created_at else "",
+        finished_at=job.finished_at.isoformat() if job.finished_at else None
     )
 
 
-@router.get("/", response_model=List[MealRead])
-async def get_meals(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 20
+async def _get_user_job(db: AsyncSession, job_id: str, user: User) -> AnalysisJob:
+    job = await db.get(AnalysisJob, job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job introuvable"
+        )
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobRead)
+async def get_analysis_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
 ):
-    """Récupère l'historique de l'utilisateur connecté"""
-    try:
-        meals = db.query(Meal)\
-            .filter(Meal.user_id == user.id)\
-            .order_by(Meal.created_at.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
-        print(f"✅ Récupération historique: {len(meals)} repas trouvés pour user {user.id}")
+    """État d'une analyse asynchrone (polling)"""
+    return await _job_read(db, await _get_user_job(db, job_id, user), user)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Notification de fin d'une analyse asynchrone (Server-Sent Events).
+    Événements : `status` à chaque changement d'état, puis `succeeded` ou `failed` (AnalysisJobRead).
+    """
+    await _get_user_job(db, job_id, user)
+    user_id = user.id
+    
+    async def event_stream():
+        last_status = None
+        try:
+            while True:
+                async with SessionLocal() as stream_db:
+                    job = await stream_db.get(AnalysisJob, job_id)
+                    if job.status in TERMINAL_STATUSES:
+                        payload = (await _job_read(stream_db, job, await stream_db.get(User, user_id))).model_dump()
+                        yield _sse(job.status.value, payload)
+                        return
+                    if job.status != last_status:
+                        last_status = job.status
+                        yield _sse("status", {"job_id": job_id, "status": job.status.value})
+                # Réveil immédiat si ce process traite le job, sinon re-lecture DB périodique
+                await job_queue.wait(job_id, settings.JOB_POLL_INTERVAL)
+        finally:
+            job_queue.forget(job_id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+@router.post("/analyze/stream")
+async def analyze_meal_stream(
+    request: MealAnalysisRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Analyse un repas en streaming (Server-Sent Events).
+    Événements : `field` (un champ nutritionnel complet), `suggestion`,
+    `done` (MealAnalysisResponse + timing) ou `error`.
+    """
+    description = request.description.strip()
+    key, normalized = cache_key(description, llm_router.cache_scope())
+    cached, cached_model = await _lookup_without_llm(db, description, key)
+    if not cached and not settings.OPENROUTER_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="OPENROUTER_API_KEY non configurée"
+        )
+    await reserve_quota(db, user)
+    await db.commit()
+    user_id = user.id
+    state = {"saved": False}
+    
+    async def refund_unsaved():
+        # Tâche de fond de la réponse : exécutée même si le client se déconnecte avant que
+        # le générateur démarre (son `finally` ne serait jamais atteint). Erreur, sauvegarde
+        # ratée ou client parti : la réservation est rendue.
+        if not state["saved"]:
+            async with SessionLocal() as refund_db:
+                await refund_quota(refund_db, user_id)
+                await refund_db.commit()
+    
+    async def analysis_events(state: Dict[str, bool]):
+        started = time.perf_counter()
+        first_field: Optional[float] = None
+        usage: Dict[str, Any] = {}
         
-        # Convertir les meals en MealRead avec created_at en string
-        result = []
-        for meal in meals:
-            result.append(MealRead(
-                id=meal.id,
-                user_id=meal.user_id,
-                description=meal.description,
-                calories=meal.calories,
-                proteins=meal.proteins,
-                carbs=meal.carbs,
-                fats=meal.fats,
-                fiber=meal.fiber,
-                suggestions=meal.suggestions,
-                created_at=meal.created_at.isoformat() if meal.created_at else ""
-            ))
+        try:
+            if cached:
+                nutrition_json = cached
+                model_used = cached_model
+                first_field = time.perf_counter() - started
+                for name in ("calories", "proteins", "carbs", "fats", "fiber"):
+                    yield _sse("field", {"name": name, "value": cached[name]})
+                for suggestion in cached["suggestions"]:
+                    yield _sse("suggestion", {"text": suggestion})
+            else:
+                # Pas de hedge en streaming : le meilleur modèle du routeur répond seul
+                route = llm_router.ranked()[0]
+                route.requests += 1
+                model_used = route.name
+                parser = IncrementalJSONObjectParser()
+                async for chunk in llm_client.stream_chat_completion({
+                    "model": route.name,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": f"Repas : {description}"}
+                    ],
+                    "temperature": 0.3,
+                    "max_tokens": 500,
+                }):
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    choices = chunk.get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if not content or parser.done:
+                        continue
+                    for kind, name, value in parser.feed(content):
+                        if kind == "field" and name != "suggestions":
+                            if first_field is None:
+                                first_field = time.perf_counter() - started
+                            yield _sse("field", {"name": name, "value": value})
+                        elif kind == "item" and name == "suggestions":
+                            yield _sse("suggestion", {"text": value})
+                nutrition_json = parser.result
+                if not isinstance(nutrition_json, dict):
+                    raise ValueError("JSON invalide dans la réponse")
+                route.record(time.perf_counter() - started, ok=True)
+                # Le flux ne passe pas par llm_router._call : usage compté ici
+                record_llm_usage(route.name, usage, llm_router.cost(route.name, usage))
+        except UpstreamUnavailable as e:
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except httpx.HTTPStatusError as e:
+            route.record(time.perf_counter() - started, ok=False)
+            print(f"❌ Erreur OpenRouter HTTP: {e.response.status_code} - {e.response.text}")
+            yield _sse("error", {"detail": f"Erreur API OpenRouter: {e.response.status_code}"})
+            return
+        except Exception as e:
+            if not cached:
+                route.record(time.perf_counter() - started, ok=False)
+            print(f"❌ Erreur OpenRouter (stream): {str(e)}")
+            yield _sse("error", {"detail": f"Erreur API: {str(e)}"})
+            return
         
-        return result
+        # Sauvegarder une fois l'objet JSON fermé. La session de la requête est
+        # déjà rendue quand le corps de la réponse est streamé : on en ouvre une dédiée.
+        async with SessionLocal() as stream_db:
+            try:
+                stream_user = await stream_db.get(User, user_id)
+                total_tokens, total_cost = (0, 0.0) if cached else _compute_cost(usage, model_used)
+                meal = _new_meal(stream_user, description, nutrition_json, model_used, total_tokens, total_cost)
+                stream_db.add(meal)
+                day = await record_meals(stream_db, [meal])
+                await stream_db.commit()
+                state["saved"] = True
+                await stream_db.refresh(meal)
+                publish_meals([meal], day)
+                
+                if settings.ANALYSIS_CACHE_ENABLED and not cached:
+                    await analysis_cache.set(stream_db, key, normalized, model_used, _cache_value(meal))
+                
+                total = time.perf_counter() - started
+                llm_client.record_stream_timing(first_field, total)
+                payload = _build_response(meal, stream_user)
+                payload["timing"] = {
+                    "first_field_ms": round(1000 * first_field, 1) if first_field is not None else None,
+                    "total_ms": round(1000 * total, 1),
+                }
+                yield _sse("done", payload)
+            except Exception as e:
+                print(f"❌ Erreur sauvegarde DB: {str(e)}")
+                await stream_db.rollback()
+                yield _sse("error", {"detail": f"Erreur sauvegarde: {str(e)}"})
+    
+    return StreamingResponse(
+        analysis_events(state),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(refund_unsaved)
+    )
+
+
+@router.post("/analyze/batch", response_model=MealBatchAnalysisResponse)
+async def analyze_meal_batch(
+    request: MealBatchAnalysisRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """Analyse plusieurs repas en regroupant les descriptions dans le moins de complétions possible"""
+    descriptions = [item.description.strip() for item in request.items]
+    count = len(descriptions)
+    
+    # Réserver le quota une seule fois pour tout le lot ; les échecs sont rendus à la sauvegarde
+    await reserve_quota(db, user, count)
+    await db.commit()
+    
+    nutrition: List[Optional[Dict[str, Any]]] = [None] * count
+    errors: List[Optional[str]] = [None] * count
+    models = [""] * count
+    tokens = [0] * count
+    costs = [0.0] * count
+    hedge_costs = [0.0] * count
+    
+    # Base locale et cache d'abord ; les descriptions identiques du lot ne sont envoyées qu'une fois
+    keys = [cache_key(d, llm_router.cache_scope()) for d in descriptions]
+    pending: Dict[str, List[int]] = {}
+    for i, (key, _) in enumerate(keys):
+        cached, cached_model = await _lookup_without_llm(db, descriptions[i], key)
+        if cached:
+            nutrition[i] = cached
+            models[i] = cached_model
+        else:
+            pending.setdefault(key, []).append(i)
+    
+    unique_keys = list(pending.keys())
+    per_call = max(settings.BATCH_ITEMS_PER_CALL, 1)
+    chunks = [unique_keys[i:i + per_call] for i in range(0, len(unique_keys), per_call)]
+    outcomes = await asyncio.gather(
+        *[_call_llm_batch([descriptions[pending[key][0]] for key in chunk]) for chunk in chunks],
+        return_exceptions=True
+    )
+    
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            for key in chunk:
+                for i in pending[key]:
+                    errors[i] = detail
+            continue
+        
+        items, completion = outcome
+        rows = []
+        for key, item in zip(chunk, items):
+            for i in pending[key]:
+                if item is None:
+                    errors[i] = "Analyse absente de la réponse du modèle"
+                else:
+                    nutrition[i] = item
+                    models[i] = completion["model"]
+                    rows.append(i)
+        
+        # Répartir le coût de la complétion entre les repas qu'elle a produits
+        if rows:
+            total_tokens, total_cost = _compute_cost(completion["usage"], completion["model"])
+            for n, i in enumerate(rows):
+                tokens[i] = total_tokens // len(rows) + (1 if n < total_tokens % len(rows) else 0)
+                costs[i] = total_cost / len(rows)
+                hedge_costs[i] = completion["hedge_cost_usd"] / len(rows)
+    
+    meals: Dict[int, Meal] = {}
+    for i in range(count):
+        if errors[i]:
+            continue
+        try:
+            meals[i] = _new_meal(user, descriptions[i], nutrition[i], models[i], tokens[i], costs[i], hedge_costs[i])
+        except (TypeError, ValueError) as e:
+            errors[i] = f"Erreur parsing: {str(e)}"
+    
+    # Sauvegarder tous les repas dans une seule transaction
+    try:
+        db.add_all(list(meals.values()))
+        day = await record_meals(db, meals.values())
+        await refund_quota(db, user.id, count - len(meals), user=user)
+        await db.commit()
+    except Exception as e:
+        print(f"❌ Erreur sauvegarde DB: {str(e)}")
+        await db.rollback()
+        await refund_quota(db, user.id, count, user=user)
+        await db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur sauvegarde: {str(e)}"
+        )
+    publish_meals(meals.values(), day)
+    
+    if settings.ANALYSIS_CACHE_ENABLED:
+        for key, indices in pending.items():
+            if indices[0] in meals:
+                meal = meals[indices[0]]
+                await analysis_cache.set(db, key, keys[indices[0]][1], meal.model_used, _cache_value(meal))
+    
+    results = [
+        {"index": i, "success": True, "result": _build_response(meals[i], user), "error": None}
+        if i in meals else
+        {"index": i, "success": False, "result": None, "error": errors[i]}
+        for i in range(count)
+    ]
+    return trusted_response({
+        "results": results,
+        "succeeded": len(meals),
+        "failed": count - len(meals),
+        "quota_remaining": quota_remaining(user)
+    })
+
+
+def _encode_cursor(meal: Meal) -> str:
+    """Curseur opaque (created_at, id) du dernier repas d'une page"""
+    raw = f"{meal.created_at.isoformat()}|{meal.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, meal_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), meal_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur de pagination invalide"
+        )
+
+
+async def _history_etag(db: AsyncSession, user_id: str, *params: Any) -> str:
+    """
+    Version de l'historique : nombre de repas + date du plus récent (les repas ne sont
+    jamais modifiés ; une suppression change le nombre). count/max sur (user_id, created_at) sont lus dans
+    ix_meals_user_id_created_at_id sans toucher la table ; les paramètres de
+    pagination distinguent les pages.
+    """
+    count, latest = (await db.execute(
+        select(func.count(), func.max(Meal.created_at)).where(Meal.user_id == user_id)
+    )).one()
+    return weak_etag("meals", user_id, count, latest.isoformat() if latest else "", *params)
+
+
+async def _history_page(
+    db: AsyncSession, user: User, limit: int, cursor: Optional[str], skip: int = 0
+) -> Tuple[List[Meal], Optional[str]]:
+    """Repas d'une page d'historique (plus récents d'abord) et curseur de la suivante"""
+    query = select(Meal).where(Meal.user_id == user.id)
+    if cursor:
+        # Keyset : reprend juste après le dernier repas vu, sans OFFSET. La position
+        # est relue en base (même représentation que la colonne : sous SQLite,
+        # CURRENT_TIMESTAMP n'a pas de microsecondes) ; la date du curseur ne sert
+        # que si ce repas a été supprimé entre-temps
+        created_at, meal_id = _decode_cursor(cursor)
+        position = func.coalesce(select(Meal.created_at).where(Meal.id == meal_id).scalar_subquery(), created_at)
+        query = query.where(tuple_(Meal.created_at, Meal.id) < tuple_(position, meal_id))
+    elif skip:
+        query = query.offset(skip)
+
+    try:
+        # Une ligne de plus que demandé pour savoir s'il existe une page suivante
+        meals = (await db.execute(
+            query.order_by(Meal.created_at.desc(), Meal.id.desc()).limit(limit + 1)
+        )).scalars().all()
     except Exception as e:
         print(f"❌ Erreur récupération historique: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur récupération historique: {str(e)}"
         )
+    next_cursor = None
+    if len(meals) > limit:
+        meals = meals[:limit]
+        next_cursor = _encode_cursor(meals[-1])
+    print(f"✅ Récupération historique: {len(meals)} repas trouvés pour user {user.id}")
+    return meals, next_cursor
+
+
+@router.get("/page", response_model=MealPage)
+async def get_meals_page(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = None
+):
+    """
+    Historique paginé par curseur : `items` puis `next_cursor`, à repasser en
+    `cursor` pour la page suivante (null sur la dernière page). Pas d'OFFSET :
+    coût constant quelle que soit la profondeur. ETag faible comme GET /.
+    """
+    etag = await _history_etag(db, user.id, "page", limit, cursor or "")
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    meals, next_cursor = await _history_page(db, user, limit, cursor)
+    return json_response(
+        request, {"items": [meal_read(meal) for meal in meals], "next_cursor": next_cursor}, etag=etag
+    )
+
+
+@router.get(
+    "/",
+    response_model=List[MealRead],
+    responses={200: {"headers": {"X-Next-Cursor": {
+        "description": "Curseur de la page suivante (absent sur la dernière page) ; préférer GET /page",
+        "schema": {"type": "string"},
+    }}}}
+)
+async def get_meals(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+    skip: int = Query(0, ge=0, deprecated=True, description="OFFSET des anciens clients ; utiliser `cursor`"),
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = None
+):
+    """
+    Récupère l'historique de l'utilisateur connecté (liste nue, anciens clients).
+    Les nouveaux clients utilisent GET /page, qui renvoie le curseur dans le corps ;
+    ici le curseur suivant est dans l'en-tête `X-Next-Cursor`.
+    `skip` (OFFSET) est déprécié et refusé avec `cursor`.
+    Réponse avec ETag faible : un client à jour (If-None-Match) reçoit un 304
+    sans que les repas soient relus ni sérialisés.
+    """
+    if cursor and skip:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="`skip` et `cursor` sont incompatibles : paginer avec `cursor` seul"
+        )
+    etag = await _history_etag(db, user.id, skip, limit, cursor or "")
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    meals, next_cursor = await _history_page(db, user, limit, cursor, skip)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Lignes -> octets directement (format MealRead, sans revalidation response_model),
+    # compressés selon Accept-Encoding
+    return json_response(request, [meal_read(meal) for meal in meals], etag=etag, headers=headers)
+
+
+@router.get("/sync")
+async def sync_meals(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+    since: Optional[str] = None,
+    limit: int = Query(settings.SYNC_PAGE_SIZE, ge=1, le=settings.SYNC_MAX_PAGE_SIZE)
+):
+    """
+    Synchronisation incrémentale du cache hors ligne.
+    Sans `since` : tout l'historique ; ensuite passer le `cursor` renvoyé.
+    Réponse compacte : `fields` puis une liste par repas (`meals`), ids supprimés
+    (`deleted`), `cursor` et `has_more` (rappeler tant qu'il vaut true).
+    Les lignes proches du filigrane peuvent revenir : dédoublonner par id.
+    `Accept: application/x-ndjson` : tout le delta en un flux, sans pagination.
+    410 : curseur trop ancien, recommencer sans `since`.
+    """
+    try:
+        cursor = SyncCursor.decode(since) if since else None
+    except CursorExpired as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_delta(user.id, cursor),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+        )
+
+    page = await delta(db, user.id, cursor, limit)
+    print(f"✅ Sync: {len(page['meals'])} repas, {len(page['deleted'])} suppressions pour user {user.id}")
+    return json_response(request, page, headers={"Cache-Control": "no-store"})
 
+
+@router.delete("/{meal_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_meal(
+    meal_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """Supprime un repas de l'historique ; les autres appareils le voient via /sync"""
+    if not await delete_meal(db, user.id, meal_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Repas introuvable"
+        )
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
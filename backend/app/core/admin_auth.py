@@ -1,15 +1,141 @@
-from fastapi import Depends, HTTPException, status, Cookie, Request
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from typing import Optional
+from typing import Dict, Optional
+from datetime import datetime, timedelta, timezone
 import secrets
 import hashlib
+import time
+
+from sqlalchemy import delete, func, insert, select
+
 from .config import get_settings
+from .database import engine
+from ..models.admin_session import AdminSession
 
 settings = get_settings()
-security = HTTPBasic()
 
-# Stocker les sessions admin (en production, utiliser Redis ou DB)
-admin_sessions = set()
+
+def _hash(session_token: str) -> str:
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+class MemorySessionStore:
+    """Sessions dans le process : un seul worker uvicorn (dev)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._sessions: Dict[str, float] = {}  # hash -> expiration (time.time())
+
+    async def add(self, token_hash: str, ttl: int):
+        self._sessions[token_hash] = time.time() + ttl
+
+    async def exists(self, token_hash: str) -> bool:
+        expires_at = self._sessions.get(token_hash)
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            del self._sessions[token_hash]
+            return False
+        return True
+
+    async def delete(self, token_hash: str):
+        self._sessions.pop(token_hash, None)
+
+    async def purge(self) -> int:
+        now = time.time()
+        expired = [h for h, expires_at in self._sessions.items() if expires_at < now]
+        for token_hash in expired:
+            del self._sessions[token_hash]
+        return len(expired)
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+
+class DatabaseSessionStore:
+    """Sessions dans la table `admin_sessions` : visibles de tous les workers et instances"""
+
+    name = "database"
+
+    async def add(self, token_hash: str, ttl: int):
+        async with engine.begin() as conn:
+            await conn.execute(insert(AdminSession).values(
+                token_hash=token_hash,
+                expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            ))
+
+    async def exists(self, token_hash: str) -> bool:
+        async with engine.connect() as conn:
+            found = (await conn.execute(select(AdminSession.token_hash).where(
+                AdminSession.token_hash == token_hash,
+                AdminSession.expires_at > datetime.now(timezone.utc)
+            ))).first()
+        return found is not None
+
+    async def delete(self, token_hash: str):
+        async with engine.begin() as conn:
+            await conn.execute(delete(AdminSession).where(AdminSession.token_hash == token_hash))
+
+    async def purge(self) -> int:
+        async with engine.begin() as conn:
+            result = await conn.execute(delete(AdminSession).where(AdminSession.expires_at <= datetime.now(timezone.utc)))
+        return result.rowcount
+
+    async def count(self) -> int:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(func.count()).select_from(AdminSession))).scalar()
+
+
+class AdminSessionStore:
+    """
+    Sessions du dashboard admin : cookie aléatoire, seul son hash est stocké.
+    Expiration après ADMIN_SESSION_TTL ; les sessions expirées sont purgées
+    au fil des vérifications, au plus une fois par ADMIN_SESSION_PURGE_INTERVAL.
+    """
+
+    def __init__(self, backend: str, ttl: int, purge_interval: int):
+        self.backend = DatabaseSessionStore() if backend == "database" else MemorySessionStore()
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self.created = 0
+        self.purged = 0
+
+    async def create(self) -> str:
+        session_token = secrets.token_urlsafe(32)
+        await self.backend.add(_hash(session_token), self.ttl)
+        self.created += 1
+        return session_token
+
+    async def verify(self, session_token: Optional[str]) -> bool:
+        if time.monotonic() - self._last_purge > self.purge_interval:
+            self._last_purge = time.monotonic()
+            try:
+                self.purged += await self.backend.purge()
+            except Exception as e:
+                print(f"⚠️ Purge des sessions admin échouée: {str(e)}")
+        if not session_token:
+            return False
+        return await self.backend.exists(_hash(session_token))
+
+    async def delete(self, session_token: Optional[str]):
+        if session_token:
+            await self.backend.delete(_hash(session_token))
+
+    async def stats(self):
+        return {
+            "backend": self.backend.name,
+            "ttl_s": self.ttl,
+            "active": await self.backend.count(),
+            "created": self.created,
+            "purged": self.purged,
+        }
+
+
+admin_session_store = AdminSessionStore(
+    backend=settings.ADMIN_SESSION_BACKEND,
+    ttl=settings.ADMIN_SESSION_TTL,
+    purge_interval=settings.ADMIN_SESSION_PURGE_INTERVAL
+)
 
 
 def verify_admin_password(password: str) -> bool:
@@ -18,42 +144,17 @@ def verify_admin_password(password: str) -> bool:
     return password == settings.ADMIN_PASSWORD
 
 
-def create_admin_session() -> str:
+async def create_admin_session() -> str:
     """Créer une session admin"""
-    session_token = secrets.token_urlsafe(32)
-    admin_sessions.add(session_token)
-    return session_token
+    return await admin_session_store.create()
 
 
-def verify_admin_session(session_token: Optional[str]) -> bool:
+async def verify_admin_session(session_token: Optional[str]) -> bool:
     """Vérifier la session admin"""
-    if not session_token:
-        return False
-    return session_token in admin_sessions
-
-
-async def require_admin(request: Request, admin_session: Optional[str] = Cookie(None)):
-    """Dependency pour vérifier l'authentification admin"""
-    if verify_admin_session(admin_session):
-        return True
-    
-    # Vérifier l'authentification HTTP Basic
-    authorization = request.headers.get("Authorization")
-    if authorization and authorization.startswith("Basic "):
-        try:
-            import base64
-            credentials = base64.b64decode(authorization.replace("Basic ", "")).decode()
-            username, password = credentials.split(":", 1)
-            if username == "admin" and verify_admin_password(password):
-                return True
-        except:
-            pass
-    
-    raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Authentification admin requise",
-        headers={"WWW-Authenticate": "Basic"},
-    )
+    return await admin_session_store.verify(session_token)
 
 
+async def delete_admin_session(session_token: Optional[str]):
+    """Supprimer une session admin (déconnexion)"""
+    await admin_session_store.delete(session_token)
 
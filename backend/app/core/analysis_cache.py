@@ -0,0 +1,177 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_settings
+from ..models.analysis_cache import AnalysisCacheEntry
+
+settings = get_settings()
+
+# Nombres écrits en toutes lettres -> chiffres ("deux oeufs" == "2 oeufs")
+_NUMBER_WORDS = {
+    "un": "1", "une": "1", "deux": "2", "trois": "3", "quatre": "4", "cinq": "5",
+    "six": "6", "sept": "7", "huit": "8", "neuf": "9", "dix": "10", "demi": "0.5",
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "half": "0.5",
+}
+
+# Unités -> forme canonique collée au nombre ("200 grammes" == "200g")
+_UNITS = {
+    "g": "g", "gr": "g", "gramme": "g", "grammes": "g", "gram": "g", "grams": "g",
+    "kg": "kg", "ml": "ml", "cl": "cl", "l": "l", "litre": "l", "litres": "l",
+}
+
+_QUANTITY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)\b")
+
+
+def normalize_description(description: str) -> str:
+    """
+    Forme canonique d'une description de repas : casse, accents, espaces,
+    ponctuation et format des quantités ("2 Œufs,  200 g de riz" == "2 oeufs 200g de riz")
+    """
+    text = unicodedata.normalize("NFKD", description.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.replace("œ", "oe").replace("æ", "ae")
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)
+    text = re.sub(r"[^a-z0-9.\s]", " ", text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+    words = [_NUMBER_WORDS.get(w, w) for w in text.split()]
+    text = " ".join(words)
+    text = _QUANTITY_RE.sub(
+        lambda m: f"{m.group(1)}{_UNITS[m.group(2)]}" if m.group(2) in _UNITS else m.group(0),
+        text,
+    )
+    return text
+
+
+def cache_key(description: str, model: str) -> Tuple[str, str]:
+    """Retourne (clé, description normalisée) pour un couple description/modèle(s)"""
+    normalized = normalize_description(description)
+    key = hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+    return key, normalized
+
+
+class AnalysisCache:
+    """
+    Cache à deux niveaux des résultats d'analyse :
+    LRU en mémoire avec TTL devant la table durable `analysis_cache`.
+    Les valeurs sont des dicts {calories, proteins, carbs, fats, fiber, suggestions, tokens_used, cost_usd, model},
+    `model` étant le modèle qui a produit l'analyse.
+    """
+
+    def __init__(self, max_size: int, memory_ttl: int, db_ttl: int):
+        self.max_size = max_size
+        self.memory_ttl = memory_ttl
+        self.db_ttl = db_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stores = 0
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_memory(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.memory_ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[Dict[str, Any]]:
+        value = self._get_memory(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        cutoff = datetime.now() - timedelta(seconds=self.db_ttl)
+        row = (await db.execute(select(AnalysisCacheEntry).where(
+            AnalysisCacheEntry.key == key,
+            AnalysisCacheEntry.created_at >= cutoff
+        ))).scalars().first()
+        if row is None:
+            self.misses += 1
+            return None
+
+        value = {
+            "calories": row.calories,
+            "proteins": row.proteins,
+            "carbs": row.carbs,
+            "fats": row.fats,
+            "fiber": row.fiber,
+            "suggestions": row.suggestions,
+            "tokens_used": row.tokens_used,
+            "cost_usd": row.cost_usd,
+            "model": row.model,
+        }
+        self._set_memory(key, value)
+        self.db_hits += 1
+        return value
+
+    async def set(self, db: AsyncSession, key: str, normalized: str, model: str, value: Dict[str, Any]):
+        """Enregistre un résultat (mémoire + DB). Une erreur DB n'est jamais bloquante."""
+        self._set_memory(key, value)
+        self.stores += 1
+        try:
+            await db.merge(AnalysisCacheEntry(
+                key=key,
+                model=model,
+                normalized_description=normalized,
+                calories=value["calories"],
+                proteins=value["proteins"],
+                carbs=value["carbs"],
+                fats=value["fats"],
+                fiber=value["fiber"],
+                suggestions=value["suggestions"],
+                tokens_used=value["tokens_used"],
+                cost_usd=value["cost_usd"],
+                created_at=datetime.now(),
+            ))
+            await db.commit()
+        except Exception as e:
+            print(f"⚠️ Erreur écriture cache analyse: {str(e)}")
+            await db.rollback()
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": settings.ANALYSIS_CACHE_ENABLED,
+            "memory_size": len(self._entries),
+            "memory_max_size": self.max_size,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stores": self.stores,
+        }
+
+
+analysis_cache = AnalysisCache(
+    max_size=settings.ANALYSIS_CACHE_MEMORY_SIZE,
+    memory_ttl=settings.ANALYSIS_CACHE_MEMORY_TTL,
+    db_ttl=settings.ANALYSIS_CACHE_DB_TTL,
+)
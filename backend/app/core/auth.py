@@ -1,30 +1,50 @@
-from fastapi import Depends, HTTPException, status, Header
-from typing import Optional
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Request, status, Header
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from jose import jwt, JWTError
-import httpx
+from jose import JWTError
+import time
 
 from .config import get_settings
+from .clerk import VERIFIED_CLAIMS_STATE, ClerkClient, JWKSUnavailable, clerk_client, profile_from_claims
 from .database import get_db
+from .profile_sync import profile_sync
+from .user_cache import user_cache
 from ..models.user import User, SubscriptionTier
 
 settings = get_settings()
 
 
 async def get_current_user(
+    request: Request,
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Dependency pour obtenir l'utilisateur actuel depuis le token Clerk
     Si Clerk n'est pas configuré, utilise un utilisateur temporaire pour le développement
     """
+    started = time.perf_counter()
+    verified = getattr(request.state, VERIFIED_CLAIMS_STATE, None)
+    user, cached = await _resolve_user(authorization, db, verified)
+    user_cache.record_auth(time.perf_counter() - started, hit=cached)
+    return user
+
+
+async def _resolve_user(
+    authorization: Optional[str],
+    db: AsyncSession,
+    verified: Optional[Tuple[str, Dict[str, Any]]] = None
+) -> Tuple[User, bool]:
+    """(utilisateur, servi par le cache) ; `verified` : (token, claims) déjà vérifiés par le rate limiter"""
     # Mode développement : si Clerk n'est pas configuré, utiliser un utilisateur temporaire
     if not settings.CLERK_SECRET_KEY:
-        print("⚠️ Clerk non configuré, utilisation d'un utilisateur temporaire pour le développement")
         temp_user_id = "temp_user_dev"
-        user = db.query(User).filter(User.id == temp_user_id).first()
+        user = await user_cache.attach(db, temp_user_id)
+        if user:
+            return user, True
+        print("⚠️ Clerk non configuré, utilisation d'un utilisateur temporaire pour le développement")
+        user = await db.get(User, temp_user_id)
         if not user:
             user = User(
                 id=temp_user_id,
@@ -36,9 +56,10 @@ async def get_current_user(
                 quota_reset_date=datetime.now()
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
-        return user
+            await db.commit()
+            await db.refresh(user)
+        user_cache.put(user)
+        return user, False
     
     if not authorization:
         raise HTTPException(
@@ -60,62 +81,55 @@ async def get_current_user(
     # Vérifier le token avec Clerk
     try:
         clerk_user_id = None
-        email = ""
-        display_name = "User"
+        profile = None
+        user = None
         
         # Pour MVP : accepter les tokens simplifiés (clerk_{user_id})
         if token.startswith("clerk_"):
             # Token simplifié pour MVP - extraire l'ID utilisateur directement
             clerk_user_id = token.replace("clerk_", "")
+            cached = await user_cache.attach(db, clerk_user_id)
+            if cached:
+                return cached, True
             print(f"✅ Token simplifié détecté, user_id: {clerk_user_id}")
             
-            # Pour les tokens simplifiés, récupérer les infos depuis la DB
+            # Pour les tokens simplifiés, les infos viennent de la DB
             # (l'utilisateur a déjà été créé lors de l'inscription)
-            existing_user = db.query(User).filter(User.id == clerk_user_id).first()
-            if existing_user:
-                email = existing_user.email
-                display_name = existing_user.display_name
+            user = await db.get(User, clerk_user_id)
         else:
-            # Token JWT réel de Clerk
+            # Token JWT réel de Clerk : signature vérifiée localement contre le JWKS en cache
             try:
-                decoded_token = jwt.get_unverified_claims(token)
-                clerk_user_id = decoded_token.get("sub")
-                
-                if not clerk_user_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Token invalide: ID utilisateur manquant",
-                    )
-                
-                # Récupérer les infos complètes de l'utilisateur depuis Clerk API REST
-                try:
-                    async with httpx.AsyncClient(timeout=10.0) as client:
-                        headers = {"Authorization": f"Bearer {settings.CLERK_SECRET_KEY}"}
-                        response = await client.get(
-                            f"https://api.clerk.com/v1/users/{clerk_user_id}",
-                            headers=headers
-                        )
-                        if response.status_code == 200:
-                            user_info = response.json()
-                            email = user_info.get("email_addresses", [{}])[0].get("email_address", "") if user_info.get("email_addresses") else ""
-                            first_name = user_info.get("first_name", "")
-                            last_name = user_info.get("last_name", "")
-                            display_name = f"{first_name} {last_name}".strip() or user_info.get("username", "User")
-                        else:
-                            # Si on ne peut pas récupérer depuis Clerk, utiliser les infos du token
-                            email = decoded_token.get("email", "")
-                            display_name = decoded_token.get("name") or decoded_token.get("first_name", "User")
-                except:
-                    # Si on ne peut pas récupérer depuis Clerk, utiliser les infos du token
-                    email = decoded_token.get("email", "")
-                    display_name = decoded_token.get("name") or decoded_token.get("first_name", "User")
-                    
+                if verified is not None and verified[0] == token:
+                    decoded_token = verified[1]
+                else:
+                    decoded_token = await clerk_client.verify(token)
+            except JWKSUnavailable:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Vérification des tokens indisponible",
+                    headers={"Retry-After": str(int(ClerkClient.MIN_REFRESH_INTERVAL))},
+                )
             except JWTError:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Token JWT invalide",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
+            clerk_user_id = decoded_token.get("sub")
+            
+            if not clerk_user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token invalide: ID utilisateur manquant",
+                )
+            
+            # Utilisateur déjà résolu récemment : ni API Clerk ni DB
+            cached = await user_cache.attach(db, clerk_user_id)
+            if cached:
+                return cached, True
+            
+            profile = profile_from_claims(decoded_token)
+            user = await db.get(User, clerk_user_id)
         
         if not clerk_user_id:
             raise HTTPException(
@@ -123,32 +137,25 @@ async def get_current_user(
                 detail="Token invalide: impossible d'extraire l'ID utilisateur",
             )
         
-        # Récupérer ou créer l'utilisateur dans notre DB
-        user = db.query(User).filter(User.id == clerk_user_id).first()
-        
         if not user:
-            # Créer un nouvel utilisateur depuis Clerk
+            # Créer un nouvel utilisateur ; sans profil dans le token, la synchro le complète
             user = User(
                 id=clerk_user_id,
-                email=email or f"{clerk_user_id}@clerk.app",
-                display_name=display_name,
+                email=(profile or {}).get("email") or f"{clerk_user_id}@clerk.app",
+                display_name=(profile or {}).get("display_name") or "User",
                 subscription=SubscriptionTier.FREE,
                 daily_quota=10,
                 quota_used=0,
                 quota_reset_date=datetime.now()
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
-        else:
-            # Mettre à jour les infos si nécessaire
-            if email and user.email != email:
-                user.email = email
-            if display_name and user.display_name != display_name:
-                user.display_name = display_name
-            db.commit()
+            await db.commit()
+            await db.refresh(user)
         
-        return user
+        # Email / nom tenus à jour avec Clerk par le worker de synchronisation, pas ici
+        profile_sync.seen(clerk_user_id, profile)
+        user_cache.put(user)
+        return user, False
         
     except HTTPException:
         raise
@@ -159,4 +166,3 @@ async def get_current_user(
             detail=f"Erreur authentification: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
-
@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+from jose import jwt, JWTError
+
+from .config import get_settings
+from .metrics import clerk_request_duration
+
+settings = get_settings()
+
+CLERK_API_URL = "https://api.clerk.com/v1"
+
+# Clé de l'état de requête : (token, claims) déjà vérifiés par le rate limiter
+VERIFIED_CLAIMS_STATE = "clerk_claims"
+
+
+class JWKSUnavailable(Exception):
+    """Aucune clé de signature disponible (JWKS jamais chargé) : on ne peut pas vérifier le token"""
+
+
+class ClerkClient:
+    """
+    Accès à Clerk partagé par toute l'application :
+    - JWKS chargé au démarrage puis rafraîchi en tâche de fond ; les tokens sont
+      vérifiés localement (signature, exp/nbf, émetteur) sans appel réseau.
+      Un `kid` inconnu (rotation des clés) déclenche un rechargement, borné
+      à un toutes les MIN_REFRESH_INTERVAL secondes.
+    - API users (profil) sur un pool keep-alive, appelée par le worker de
+      synchronisation des profils quand le token ne porte pas le profil.
+    CLERK_JWKS_URL accepte file:///chemin/jwks.json (JWKS local de test).
+    """
+
+    MIN_REFRESH_INTERVAL = 30.0  # secondes
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self.jwks_loaded_at: Optional[float] = None
+        self._last_refresh_attempt = 0.0
+        self.jwks_refreshes = 0
+        self.jwks_errors = 0
+        self.verified = 0
+        self.rejected = 0
+        self.verify_time = 0.0
+        self.profile_requests = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=10.0,
+                headers={"Authorization": f"Bearer {settings.CLERK_SECRET_KEY}"} if settings.CLERK_SECRET_KEY else None,
+            )
+        return self._client
+
+    def jwks_url(self) -> str:
+        return settings.CLERK_JWKS_URL or f"{CLERK_API_URL}/jwks"
+
+    async def start(self):
+        """Charge le JWKS (une erreur n'empêche pas le démarrage) et lance le rafraîchissement"""
+        await self.refresh_jwks()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def load_jwks(self, jwks: Dict[str, Any]):
+        """Remplace le jeu de clés ({"keys": [...]}) ; seules les clés de signature avec `kid` sont gardées"""
+        keys = {k["kid"]: k for k in jwks.get("keys", []) if k.get("kid") and k.get("use", "sig") == "sig"}
+        if not keys:
+            raise ValueError("JWKS sans clé de signature")
+        self._keys = keys
+        self.jwks_loaded_at = time.time()
+
+    async def refresh_jwks(self) -> bool:
+        self._last_refresh_attempt = time.monotonic()
+        url = self.jwks_url()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            if url.startswith("file://"):
+                with open(url[len("file://"):], "r", encoding="utf-8") as f:
+                    jwks = json.load(f)
+            else:
+                response = await self.client.get(url)
+                response.raise_for_status()
+                jwks = response.json()
+            self.load_jwks(jwks)
+            self.jwks_refreshes += 1
+            outcome = "ok"
+            return True
+        except Exception as e:
+            self.jwks_errors += 1
+            print(f"⚠️ Chargement JWKS Clerk échoué ({url}): {str(e)}")
+            return False
+        finally:
+            clerk_request_duration.observe(time.perf_counter() - started, "jwks", outcome)
+
+    async def _refresh_loop(self):
+        while True:
+            # Tant que le JWKS n'a jamais été chargé, on réessaie vite
+            await asyncio.sleep(settings.CLERK_JWKS_REFRESH_INTERVAL if self._keys else self.MIN_REFRESH_INTERVAL)
+            await self.refresh_jwks()
+
+    async def _key_for(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        # kid inconnu : clés tournées depuis le dernier chargement ?
+        async with self._refresh_lock:
+            key = self._keys.get(kid)
+            if key is None and time.monotonic() - self._last_refresh_attempt > self.MIN_REFRESH_INTERVAL:
+                await self.refresh_jwks()
+                key = self._keys.get(kid)
+        if key is None and not self._keys:
+            raise JWKSUnavailable("JWKS Clerk indisponible")
+        return key
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Claims d'un token Clerk dont la signature et les dates sont valides ; lève JWTError sinon"""
+        started = time.perf_counter()
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = await self._key_for(kid)
+            if key is None:
+                raise JWTError(f"Clé de signature inconnue: {kid}")
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[key.get("alg", "RS256")],
+                issuer=settings.CLERK_ISSUER or None,
+                options={"verify_aud": False, "leeway": settings.CLERK_JWT_LEEWAY},
+            )
+            if settings.CLERK_AUTHORIZED_PARTIES and claims.get("azp") and claims["azp"] not in settings.CLERK_AUTHORIZED_PARTIES:
+                raise JWTError(f"azp non autorisé: {claims['azp']}")
+            self.verified += 1
+            return claims
+        except JWTError:
+            self.rejected += 1
+            raise
+        finally:
+            self.verify_time += time.perf_counter() - started
+
+    async def fetch_profile(self, user_id: str) -> Optional[Dict[str, str]]:
+        """{email, display_name} depuis l'API users de Clerk ; None si indisponible"""
+        self.profile_requests += 1
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.get(f"{CLERK_API_URL}/users/{user_id}")
+            if response.status_code != 200:
+                return None
+            user_info = response.json()
+            outcome = "ok"
+        except Exception as e:
+            print(f"⚠️ Profil Clerk indisponible pour {user_id}: {str(e)}")
+            return None
+        finally:
+            clerk_request_duration.observe(time.perf_counter() - started, "profile", outcome)
+        email = user_info.get("email_addresses", [{}])[0].get("email_address", "") if user_info.get("email_addresses") else ""
+        first_name = user_info.get("first_name") or ""
+        last_name = user_info.get("last_name") or ""
+        display_name = f"{first_name} {last_name}".strip() or user_info.get("username") or "User"
+        return {"email": email, "display_name": display_name}
+
+    def stats(self) -> Dict[str, Any]:
+        checks = self.verified + self.rejected
+        return {
+            "jwks_url": self.jwks_url(),
+            "keys": sorted(self._keys),
+            "jwks_age_s": round(time.time() - self.jwks_loaded_at, 1) if self.jwks_loaded_at else None,
+            "jwks_refreshes": self.jwks_refreshes,
+            "jwks_errors": self.jwks_errors,
+            "tokens_verified": self.verified,
+            "tokens_rejected": self.rejected,
+            "avg_verify_us": round(self.verify_time / checks * 1e6, 1) if checks else 0.0,
+            "profile_requests": self.profile_requests,
+        }
+
+
+def profile_from_claims(claims: Dict[str, Any]) -> Dict[str, str]:
+    """Profil porté par le token (claims personnalisés du template de session Clerk)"""
+    name = claims.get("name") or " ".join(p for p in (claims.get("first_name"), claims.get("last_name")) if p)
+    return {"email": claims.get("email") or "", "display_name": name or ""}
+
+
+clerk_client = ClerkClient()
+
+
+async def _bench(iterations: int):
+    """Vérification locale d'un token RS256 contre un JWKS généré à la volée (aucun appel Clerk)"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": "bench", "use": "sig", "alg": "RS256"})
+
+    client = ClerkClient()
+    client.load_jwks({"keys": [public_jwk]})
+    now = int(time.time())
+    token = jwt.encode(
+        {"sub": "user_bench", "iat": now, "nbf": now, "exp": now + 60, "email": "bench@nutriai.app"},
+        private_pem.decode(),
+        algorithm="RS256",
+        headers={"kid": "bench"},
+    )
+    await client.verify(token)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await client.verify(token)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {iterations} vérifications JWT en {elapsed:.3f}s ({elapsed / iterations * 1e6:.1f} µs/requête)")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.clerk", description="Vérification des tokens Clerk")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="coût d'authentification par requête (JWKS local)")
+    bench.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args(argv)
+    asyncio.run(_bench(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Dict, Set
+
+RESYNC = {"type": "resync"}
+
+
+class EventBus:
+    """
+    Bus d'événements en mémoire (un process uvicorn) : chaque abonné a sa propre
+    file bornée. `publish` ne bloque jamais l'appelant ; un abonné trop lent
+    perd ses événements en attente et reçoit `resync` pour se recharger.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self._subscribers: Set[asyncio.Queue] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: Dict[str, Any]):
+        self.published += 1
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += queue.qsize()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+# Repas enregistrés (deltas pour le dashboard admin en direct)
+meal_events = EventBus()
@@ -0,0 +1,96 @@
+import gzip
+import hashlib
+from typing import Any, Dict, Iterable, Optional, Set
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .config import get_settings
+
+settings = get_settings()
+
+
+def brotli_module():
+    """Brotli nécessite le paquet optionnel `brotli` ; sans lui on se limite à gzip"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def available_encodings() -> tuple:
+    return ("br", "gzip") if brotli_module() is not None else ("gzip",)
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Codages acceptés par le client (ceux en q=0 exclus)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding.strip():
+            accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> str:
+    """Premier codage de `available` (ordre de préférence serveur) accepté par le client"""
+    accepted = accepted_encodings(accept_encoding)
+    for coding in available:
+        if coding in accepted or "*" in accepted:
+            return coding
+    return "identity"
+
+
+def compress(body: bytes, coding: str, static: bool = False) -> bytes:
+    """Pages statiques : compression maximale (une fois) ; réponses dynamiques : niveau rapide"""
+    if coding == "br":
+        return brotli_module().compress(body, quality=11 if static else settings.COMPRESSION_BROTLI_QUALITY)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=9 if static else settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+    return body
+
+
+def weak_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """If-None-Match : comparaison faible (W/ ignoré), `*` accepte tout"""
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or any(etag.removeprefix("W/") in tags for etag in etags)
+
+
+def not_modified(request: Request, etag: str, cache_control: str = "private, no-cache") -> Optional[Response]:
+    """304 si le client a déjà cette version ; None sinon"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"})
+    return None
+
+
+def json_response(
+    request: Request,
+    content: Any,
+    etag: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """JSON (orjson) compressé selon Accept-Encoding au-delà de COMPRESSION_MIN_SIZE octets"""
+    body = orjson.dumps(content)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if etag:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = cache_control
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        coding = negotiate_encoding(request.headers.get("accept-encoding", ""), available_encodings())
+        if coding != "identity":
+            body = compress(body, coding)
+            headers["Content-Encoding"] = coding
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,238 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_settings
+from .database import SessionLocal
+from .quota import refund_quota, reserve_quota
+from ..models.analysis_job import AnalysisJob, JobStatus
+from ..models.user import User
+
+settings = get_settings()
+
+TERMINAL_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+MAX_ERROR_BACKOFF = 30.0  # secondes entre deux tentatives d'un worker après une erreur DB
+
+
+def _utcnow() -> datetime:
+    """Horloge unique des jobs (created_at, started_at, finished_at) : durées cohérentes"""
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """
+    File d'analyses asynchrones adossée à la table `analysis_jobs`.
+    Un pool borné de workers asyncio réclame les jobs par UPDATE conditionnel
+    (status queued -> running), ce qui reste correct avec plusieurs process uvicorn.
+    Les jobs "running" dont le bail a expiré (redémarrage, crash) sont remis en file.
+    Un job remis en file avec un délai (Retry-After) n'est pas réclamé avant `not_before` :
+    le worker repart aussitôt sur un autre job au lieu de dormir.
+    Le quota est réservé à l'enqueue et rendu si le job échoue définitivement.
+    """
+
+    def __init__(self):
+        self.handler: Optional[Callable[[str], Awaitable[None]]] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._events: Dict[str, asyncio.Event] = {}
+        self._last_requeue = 0.0
+        self.enqueued = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.requeued_stale = 0
+        self.queue_wait_total_s = 0.0
+        self.run_total_s = 0.0
+        self.processed = 0
+
+    async def start(self, handler: Callable[[str], Awaitable[None]]):
+        self.handler = handler
+        self._wakeup = asyncio.Event()
+        await self._requeue_stale()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(settings.JOB_WORKERS)]
+        print(f"✅ File d'analyses démarrée ({settings.JOB_WORKERS} workers)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, db: AsyncSession, job_id: str, user: User, description: str) -> AnalysisJob:
+        """Crée le job et réserve une unité de quota dans la même transaction"""
+        job = AnalysisJob(id=job_id, user_id=user.id, description=description, status=JobStatus.QUEUED)
+        await reserve_quota(db, user)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def fail(self, db: AsyncSession, job: AnalysisJob, error: str):
+        """Échec définitif : libère la réservation de quota"""
+        job.status = JobStatus.FAILED
+        job.error = error[:500]
+        job.finished_at = _utcnow()
+        await refund_quota(db, job.user_id)
+        await db.commit()
+        self.failed += 1
+
+    async def retry(self, db: AsyncSession, job: AnalysisJob, error: str, delay: float = 0):
+        """
+        Erreur transitoire : remet le job en file tant qu'il reste des tentatives,
+        réclamable seulement dans `delay` secondes (Retry-After de l'amont)
+        """
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            await self.fail(db, job, error)
+            return
+        job.status = JobStatus.QUEUED
+        job.error = error[:500]
+        job.started_at = None
+        job.not_before = _utcnow() + timedelta(seconds=delay) if delay > 0 else None
+        await db.commit()
+        self.retried += 1
+
+    async def succeed(self, db: AsyncSession, job: AnalysisJob, meal_id: str):
+        job.status = JobStatus.SUCCEEDED
+        job.meal_id = meal_id
+        job.error = None
+        job.finished_at = _utcnow()
+        await db.commit()
+        self.succeeded += 1
+
+    async def wait(self, job_id: str, timeout: float):
+        """Attend la fin d'un job traité par ce process (les autres process sont vus par polling DB)"""
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        # Notification consommée : après un échec remis en file, l'attente suivante
+        # bloque jusqu'à la fin de la nouvelle tentative au lieu de revenir aussitôt
+        event.clear()
+
+    def forget(self, job_id: str):
+        self._events.pop(job_id, None)
+
+    async def _claim(self) -> Optional[str]:
+        async with SessionLocal() as db:
+            candidates = (await db.execute(
+                select(AnalysisJob.id)
+                .where(
+                    AnalysisJob.status == JobStatus.QUEUED,
+                    or_(AnalysisJob.not_before.is_(None), AnalysisJob.not_before <= _utcnow())
+                )
+                .order_by(AnalysisJob.created_at)
+                .limit(5)
+            )).scalars().all()
+            for job_id in candidates:
+                claimed = await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, AnalysisJob.status == JobStatus.QUEUED)
+                    .values(
+                        status=JobStatus.RUNNING,
+                        started_at=_utcnow(),
+                        attempts=AnalysisJob.attempts + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if claimed.rowcount:
+                    return job_id
+            return None
+
+    async def _requeue_stale(self):
+        self._last_requeue = time.monotonic()
+        async with SessionLocal() as db:
+            try:
+                cutoff = _utcnow() - timedelta(seconds=settings.JOB_LEASE_TIMEOUT)
+                stale = (await db.execute(select(AnalysisJob).where(
+                    AnalysisJob.status == JobStatus.RUNNING,
+                    AnalysisJob.started_at < cutoff
+                ))).scalars().all()
+                for job in stale:
+                    self.requeued_stale += 1
+                    await self.retry(db, job, "Bail expiré (worker interrompu)")
+            except Exception as e:
+                print(f"⚠️ Erreur remise en file des jobs: {str(e)}")
+                await db.rollback()
+
+    async def _worker(self):
+        backoff = settings.JOB_POLL_INTERVAL
+        while True:
+            try:
+                await self._iteration()
+                backoff = settings.JOB_POLL_INTERVAL
+            except Exception as e:
+                # DB indisponible un instant : le worker survit et réessaie plus tard
+                print(f"⚠️ Worker de la file d'analyses en erreur (reprise dans {backoff:.1f}s): {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+
+    async def _iteration(self):
+        if time.monotonic() - self._last_requeue > settings.JOB_LEASE_TIMEOUT:
+            await self._requeue_stale()
+        # Effacer avant de réclamer : un enqueue concurrent ne peut pas être manqué
+        self._wakeup.clear()
+        job_id = await self._claim()
+        if job_id is None:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            return
+        await self._run(job_id)
+
+    async def _run(self, job_id: str):
+        started = time.perf_counter()
+        try:
+            async with SessionLocal() as db:
+                job = await db.get(AnalysisJob, job_id)
+                if job and job.started_at and job.created_at:
+                    # Même horloge UTC ; SQLite les relit sans fuseau, Postgres avec
+                    waited = job.started_at.replace(tzinfo=None) - job.created_at.replace(tzinfo=None)
+                    self.queue_wait_total_s += max(waited.total_seconds(), 0.0)
+            await self.handler(job_id)
+        except Exception as e:
+            print(f"❌ Erreur job {job_id}: {str(e)}")
+            async with SessionLocal() as db:
+                job = await db.get(AnalysisJob, job_id)
+                if job and job.status == JobStatus.RUNNING:
+                    await self.fail(db, job, str(e))
+        finally:
+            self.processed += 1
+            self.run_total_s += time.perf_counter() - started
+            event = self._events.get(job_id)
+            if event is not None:
+                event.set()
+
+    async def stats(self, db: AsyncSession) -> Dict[str, Any]:
+        counts = dict((await db.execute(
+            select(AnalysisJob.status, func.count(AnalysisJob.id))
+            .where(AnalysisJob.status.in_((JobStatus.QUEUED, JobStatus.RUNNING)))
+            .group_by(AnalysisJob.status)
+        )).all())
+        depth = counts.get(JobStatus.QUEUED, 0)
+        running = counts.get(JobStatus.RUNNING, 0)
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": depth,
+            "running": running,
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "requeued_stale": self.requeued_stale,
+            "avg_queue_wait_ms": round(1000 * self.queue_wait_total_s / self.processed, 1) if self.processed else 0.0,
+            "avg_run_ms": round(1000 * self.run_total_s / self.processed, 1) if self.processed else 0.0,
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,122 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class IncrementalJSONObjectParser:
+    """
+    Parseur incrémental pour la réponse du modèle (un objet JSON, éventuellement
+    entouré de texte). Alimenté token par token, il émet :
+      ("field", clé, valeur)  dès qu'un champ de premier niveau est complet
+      ("item", clé, valeur)   dès qu'un élément d'un tableau de premier niveau est complet
+      ("done", None, objet)   quand l'accolade fermante de l'objet arrive
+    Un nombre n'est complet qu'à la virgule ou à l'accolade qui le suit.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._array_item_start: Optional[int] = None
+        self.started = False
+        self.done = False
+        self.result: Optional[Any] = None
+
+    def feed(self, text: str) -> List[Tuple[str, Optional[str], Any]]:
+        events: List[Tuple[str, Optional[str], Any]] = []
+        for ch in text:
+            if self.done:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._depth = 1
+                    self._buffer.append(ch)
+                continue
+
+            pos = len(self._buffer)
+            self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(pos, events)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+                if self._depth == 1 and not self._expect_key and self._value_start is None:
+                    self._value_start = pos
+            elif ch in "{[":
+                if self._depth == 1:
+                    self._value_start = pos
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # Fin d'un tableau / objet imbriqué
+                    self._emit_value(pos + 1, events)
+                elif self._depth == 0:
+                    self._emit_value(pos, events)
+                    self.done = True
+                    self.result = json.loads("".join(self._buffer))
+                    events.append(("done", None, self.result))
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_key = False
+                    self._value_start = None
+                elif ch == ",":
+                    self._emit_value(pos, events)
+                    self._expect_key = True
+                elif not ch.isspace() and not self._expect_key and self._value_start is None:
+                    self._value_start = pos
+            elif self._depth == 2 and self._is_array_value():
+                if ch == ",":
+                    if self._array_item_start is not None:
+                        self._emit_array_scalar(pos, events)
+                elif not ch.isspace() and self._array_item_start is None:
+                    # Élément scalaire non-chaîne dans un tableau (ex: nombres)
+                    self._array_item_start = pos
+        return events
+
+    def _end_string(self, pos: int, events: list):
+        raw = "".join(self._buffer[self._string_start:pos + 1])
+        if self._depth == 1:
+            if self._expect_key:
+                self._key = json.loads(raw)
+            # Les valeurs chaînes sont émises à la virgule / accolade suivante
+        elif self._depth == 2 and self._is_array_value():
+            events.append(("item", self._key, json.loads(raw)))
+
+    def _is_array_value(self) -> bool:
+        return self._value_start is not None and self._buffer[self._value_start] == "["
+
+    def _emit_array_scalar(self, end: int, events: list):
+        raw = "".join(self._buffer[self._array_item_start:end]).strip()
+        self._array_item_start = None
+        if raw:
+            try:
+                events.append(("item", self._key, json.loads(raw)))
+            except json.JSONDecodeError:
+                pass
+
+    def _emit_value(self, end: int, events: list):
+        if self._value_start is None or self._key is None:
+            return
+        if self._is_array_value() and self._array_item_start is not None:
+            self._emit_array_scalar(end - 1, events)
+        raw = "".join(self._buffer[self._value_start:end]).strip()
+        self._value_start = None
+        try:
+            events.append(("field", self._key, json.loads(raw)))
+        except json.JSONDecodeError:
+            pass
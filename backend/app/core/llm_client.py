@@ -0,0 +1,212 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from .config import get_settings
+from .llm_guard import llm_guard
+from .metrics import openrouter_request_duration
+
+settings = get_settings()
+
+
+def _http2_available() -> bool:
+    """HTTP/2 nécessite le paquet optionnel `h2` (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LLMClient:
+    """
+    Client HTTP partagé vers OpenRouter.
+    Un seul pool de connexions keep-alive pour toute l'application, ouvert au
+    démarrage (lifespan) et fermé à l'arrêt : les analyses ne paient plus
+    DNS + TCP + TLS à chaque appel.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.http2 = False
+        self.started_at: Optional[float] = None
+        self.requests_total = 0
+        self.errors_total = 0
+        self.connections_opened = 0
+        self.warmup_connections = 0
+        self.total_latency_s = 0.0
+        self.stream_requests = 0
+        self.stream_first_field_total_s = 0.0
+        self.stream_total_s = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client httpx sous-jacent (créé à la demande si start() n'a pas été appelé)"""
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _build_client(self) -> httpx.AsyncClient:
+        self.http2 = settings.OPENROUTER_HTTP2 and _http2_available()
+        if settings.OPENROUTER_HTTP2 and not self.http2:
+            print("⚠️ HTTP/2 demandé mais paquet 'h2' absent, utilisation de HTTP/1.1")
+        limits = httpx.Limits(
+            max_connections=settings.OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENROUTER_MAX_KEEPALIVE,
+            keepalive_expiry=settings.OPENROUTER_KEEPALIVE_EXPIRY,
+        )
+        self.started_at = time.time()
+        return httpx.AsyncClient(
+            base_url=settings.OPENROUTER_BASE_URL,
+            timeout=settings.OPENROUTER_TIMEOUT,
+            limits=limits,
+            http2=self.http2,
+        )
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+        }
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        """Hook httpcore : compte les requêtes qui ont dû ouvrir une connexion"""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def start(self):
+        """Créer le pool et pré-ouvrir les connexions vers OpenRouter"""
+        _ = self.client
+        if settings.OPENROUTER_API_KEY and settings.OPENROUTER_WARMUP_CONNECTIONS > 0:
+            await self.warmup(settings.OPENROUTER_WARMUP_CONNECTIONS)
+
+    async def warmup(self, connections: int = 1):
+        """Pré-connexion (DNS + TCP + TLS) pour que la première analyse ne la paie pas"""
+        async def _ping() -> bool:
+            try:
+                await self.client.get("/models", headers=self._headers(), timeout=5.0)
+                return True
+            except Exception as e:
+                print(f"⚠️ Warm-up OpenRouter échoué: {str(e)}")
+                return False
+
+        results = await asyncio.gather(*[_ping() for _ in range(connections)])
+        self.warmup_connections = sum(results)
+        print(f"✅ Pool OpenRouter prêt ({self.warmup_connections} connexion(s), http2={self.http2})")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def chat_completion(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        POST /chat/completions sur le pool partagé.
+        Lève httpx.HTTPStatusError / httpx.HTTPError comme l'appel direct le faisait.
+        """
+        self.requests_total += 1
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with llm_guard.slot():
+                response = await self.client.post(
+                    "/chat/completions",
+                    headers=self._headers(),
+                    json=payload,
+                    timeout=timeout or settings.OPENROUTER_TIMEOUT,
+                    extensions={"trace": self._trace},
+                )
+                response.raise_for_status()
+                data = response.json()
+                outcome = "ok"
+                return data
+        except asyncio.CancelledError:
+            # Requête perdante d'un hedge
+            outcome = "cancelled"
+            raise
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.total_latency_s += elapsed
+            openrouter_request_duration.observe(elapsed, payload.get("model", ""), outcome)
+
+    async def stream_chat_completion(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST /chat/completions avec `stream: true` : itère sur les chunks SSE décodés
+        (le dernier porte `usage` grâce à `usage.include`).
+        """
+        self.requests_total += 1
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with llm_guard.slot(), self.client.stream(
+                "POST",
+                "/chat/completions",
+                headers=self._headers(),
+                json={**payload, "stream": True, "usage": {"include": True}},
+                extensions={"trace": self._trace},
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Lignes vides et commentaires SSE (": OPENROUTER PROCESSING") ignorés
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    yield json.loads(data)
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client SSE déconnecté avant la fin du flux
+            outcome = "cancelled"
+            raise
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            openrouter_request_duration.observe(time.perf_counter() - started, payload.get("model", ""), outcome)
+
+    def record_stream_timing(self, first_field_s: Optional[float], total_s: float):
+        """Temps jusqu'au premier champ nutritionnel vs latence totale d'une analyse streamée"""
+        self.stream_requests += 1
+        self.stream_first_field_total_s += first_field_s or total_s
+        self.stream_total_s += total_s
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du pool (réutilisation des connexions sous charge)"""
+        connections = []
+        try:
+            # httpcore n'expose pas d'API publique pour l'état du pool
+            connections = list(self.client._transport._pool.connections)
+        except AttributeError:
+            pass
+        idle = sum(1 for c in connections if c.is_idle())
+        reused = max(self.requests_total - self.connections_opened, 0)
+        return {
+            "http2": self.http2,
+            "requests_total": self.requests_total,
+            "errors_total": self.errors_total,
+            "connections_opened": self.connections_opened,
+            "warmup_connections": self.warmup_connections,
+            "connections_open": len(connections),
+            "connections_idle": idle,
+            "connections_active": len(connections) - idle,
+            "avg_latency_ms": round(1000 * self.total_latency_s / self.requests_total, 1) if self.requests_total else 0.0,
+            "reuse_ratio": round(reused / self.requests_total, 4) if self.requests_total else 0.0,
+            "max_connections": settings.OPENROUTER_MAX_CONNECTIONS,
+            "max_keepalive": settings.OPENROUTER_MAX_KEEPALIVE,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "stream_requests": self.stream_requests,
+            "stream_avg_first_field_ms": round(1000 * self.stream_first_field_total_s / self.stream_requests, 1) if self.stream_requests else 0.0,
+            "stream_avg_total_ms": round(1000 * self.stream_total_s / self.stream_requests, 1) if self.stream_requests else 0.0,
+        }
+
+
+llm_client = LLMClient()
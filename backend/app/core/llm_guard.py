@@ -0,0 +1,254 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .config import get_settings
+
+settings = get_settings()
+
+
+class UpstreamUnavailable(Exception):
+    """Appel LLM refusé sans contacter OpenRouter (circuit ouvert ou limite de concurrence)"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """Erreurs qui signalent un amont dégradé (timeouts, réseau, 429, 5xx) ; pas les 4xx du client"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur sur une fenêtre glissante d'appels.
+    closed -> open quand le taux d'erreur dépasse le seuil ; open -> half_open après
+    le délai de refroidissement ; half_open laisse passer quelques sondes et se
+    referme au premier succès (ou se rouvre au premier échec).
+    """
+
+    def __init__(self, window: int, min_calls: int, threshold: float, cooldown: float, probes: int):
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._outcomes: deque = deque(maxlen=window)
+        self._probes_in_flight = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def retry_after(self) -> int:
+        return max(int(self.opened_at + self.cooldown - time.monotonic()) + 1, 1)
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                raise UpstreamUnavailable("Service d'analyse temporairement indisponible", self.retry_after())
+            self.state = "half_open"
+            self._probes_in_flight = 0
+        if self.state == "half_open":
+            if self._probes_in_flight >= self.probes:
+                self.rejected += 1
+                raise UpstreamUnavailable("Service d'analyse en cours de rétablissement", 1)
+            self._probes_in_flight += 1
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._trip()
+            return
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self.min_calls and self.error_rate() >= self.threshold:
+            self._trip()
+
+    def release_probe(self):
+        """Sonde annulée sans résultat exploitable"""
+        if self.state == "half_open":
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def _trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+        print(f"⚠️ Circuit LLM ouvert pour {self.cooldown:.0f}s")
+
+
+class AdaptiveLimiter:
+    """
+    Limite adaptative (AIMD) du nombre d'appels LLM simultanés :
+    +1/limite à chaque succès sous la latence cible ; x0.5 sur erreur amont (429,
+    5xx, timeout) ou quand le percentile de latence d'une fenêtre complète d'appels
+    réussis dépasse la cible. Un appel lent isolé (longue description, modèle
+    chargé) ne réduit donc pas la limite ; la fenêtre repart de zéro après chaque baisse.
+    Au-delà de la limite, l'appel attend au plus `queue_timeout` avant d'être refusé.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        queue_timeout: float,
+        latency_window: int = 50,
+        latency_percentile: float = 0.9,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.queue_timeout = queue_timeout
+        self.latency_percentile = latency_percentile
+        self.inflight = 0
+        self.rejected = 0
+        self.latency_decreases = 0
+        self._waiters: deque = deque()
+        self._latencies: deque = deque(maxlen=latency_window)
+
+    async def acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Le slot est réservé par _wake() avant que le waiter soit résolu
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return
+            self.rejected += 1
+            raise UpstreamUnavailable("Trop d'analyses en cours, réessayez dans un instant", 1)
+        except asyncio.CancelledError:
+            # Annulé juste après avoir reçu un slot : le rendre
+            if waiter.done() and not waiter.cancelled():
+                self.inflight -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def latency(self) -> Optional[float]:
+        """Percentile de latence des derniers appels réussis ; None tant que la fenêtre n'est pas pleine"""
+        if len(self._latencies) < self._latencies.maxlen:
+            return None
+        ordered = sorted(self._latencies)
+        # Rang le plus proche : p90 de 10 valeurs = 9e valeur, pas le maximum
+        return ordered[max(math.ceil(len(ordered) * self.latency_percentile) - 1, 0)]
+
+    def release(self, latency_s: float, ok: Optional[bool]):
+        self.inflight -= 1
+        if ok is False:
+            self._decrease()
+        elif ok is True:
+            self._latencies.append(latency_s)
+            percentile = self.latency()
+            if percentile is not None and percentile > self.latency_target:
+                self.latency_decreases += 1
+                self._decrease()
+            elif latency_s <= self.latency_target:
+                self.limit = min(self.limit + 1 / self.limit, float(self.maximum))
+        self._wake()
+
+    def _decrease(self):
+        self.limit = max(self.limit * 0.5, float(self.minimum))
+        self._latencies.clear()
+
+    def _wake(self):
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+
+class LLMGuard:
+    """Disjoncteur + limite adaptative autour de chaque appel OpenRouter"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            window=settings.BREAKER_WINDOW,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            threshold=settings.BREAKER_ERROR_THRESHOLD,
+            cooldown=settings.BREAKER_COOLDOWN,
+            probes=settings.BREAKER_HALF_OPEN_PROBES,
+        )
+        self.limiter = AdaptiveLimiter(
+            initial=settings.LLM_CONCURRENCY_INITIAL,
+            minimum=settings.LLM_CONCURRENCY_MIN,
+            maximum=settings.LLM_CONCURRENCY_MAX,
+            latency_target=settings.LLM_LATENCY_TARGET,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+            latency_window=settings.LLM_LATENCY_WINDOW,
+            latency_percentile=settings.LLM_LATENCY_PERCENTILE,
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        self.breaker.before_call()
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        started = time.perf_counter()
+        ok: Optional[bool] = None
+        try:
+            yield
+            ok = True
+        except Exception as e:
+            ok = not is_upstream_failure(e)
+            raise
+        finally:
+            # ok=None : appel annulé (hedge perdant, client parti) => ni succès ni échec
+            if ok is None:
+                self.breaker.release_probe()
+            else:
+                self.breaker.record(ok)
+            self.limiter.release(time.perf_counter() - started, ok)
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "error_rate": round(self.breaker.error_rate(), 4),
+            "concurrency_limit": int(self.limiter.limit),
+            "inflight": self.limiter.inflight,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        latency = self.limiter.latency()
+        return {
+            **self.state(),
+            "circuit_trips": self.breaker.trips,
+            "circuit_rejected": self.breaker.rejected,
+            "limiter_rejected": self.limiter.rejected,
+            "limiter_latency_decreases": self.limiter.latency_decreases,
+            "latency_percentile_s": round(latency, 3) if latency is not None else None,
+            "retry_after_s": self.breaker.retry_after() if self.breaker.state == "open" else 0,
+        }
+
+
+llm_guard = LLMGuard()
@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import get_settings
+from .llm_client import llm_client
+from .llm_guard import UpstreamUnavailable
+from .metrics import openrouter_cost, record_llm_usage
+
+settings = get_settings()
+
+
+class ModelRoute:
+    """Un modèle OpenRouter, ses tarifs et sa fenêtre glissante de latences / erreurs"""
+
+    def __init__(self, name: str, input_price: float, output_price: float, window_size: int):
+        self.name = name
+        self.input_price = input_price
+        self.output_price = output_price
+        self.latencies: deque = deque(maxlen=window_size)
+        self.outcomes: deque = deque(maxlen=window_size)
+        self.requests = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    def record(self, latency_s: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency_s)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(p / 100 * (len(ordered) - 1) + 0.5), len(ordered) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens / 1_000_000) * self.input_price + (completion_tokens / 1_000_000) * self.output_price
+
+
+def parse_model_specs(specs: List[str]) -> List[ModelRoute]:
+    """["openai/gpt-3.5-turbo=0.5/1.5", "google/gemini-flash-1.5"] -> routes (tarifs par défaut si absents)"""
+    routes = []
+    for spec in specs:
+        name, _, prices = spec.partition("=")
+        input_price, output_price = settings.OPENROUTER_INPUT_PRICE, settings.OPENROUTER_OUTPUT_PRICE
+        if prices:
+            raw_in, _, raw_out = prices.partition("/")
+            input_price = float(raw_in)
+            output_price = float(raw_out) if raw_out else input_price
+        routes.append(ModelRoute(name.strip(), input_price, output_price, settings.ROUTER_WINDOW_SIZE))
+    return routes
+
+
+class LLMRouter:
+    """
+    Routage des complétions entre plusieurs modèles OpenRouter.
+    Le modèle principal est choisi selon la latence médiane et le taux d'erreur
+    récents ; si sa réponse dépasse le percentile configuré de sa propre latence,
+    une requête de couverture (hedge) part vers le modèle suivant et la plus
+    lente des deux est annulée.
+    """
+
+    def __init__(self, routes: List[ModelRoute]):
+        self.routes = routes
+        self._by_name = {r.name: r for r in routes}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def route(self, model: str) -> ModelRoute:
+        route = self._by_name.get(model)
+        if route is None:
+            route = ModelRoute(model, settings.OPENROUTER_INPUT_PRICE, settings.OPENROUTER_OUTPUT_PRICE, settings.ROUTER_WINDOW_SIZE)
+            self._by_name[model] = route
+        return route
+
+    def ranked(self) -> List[ModelRoute]:
+        """Modèles triés par score (p50 pénalisée par les erreurs) ; ordre de config à données égales"""
+        def score(item: Tuple[int, ModelRoute]):
+            position, route = item
+            if len(route.latencies) < settings.ROUTER_HEDGE_MIN_SAMPLES:
+                return (0, position)
+            return (1, route.percentile(50) * (1 + 4 * route.error_rate()))
+        return [route for _, route in sorted(enumerate(self.routes), key=score)]
+
+    def hedge_delay(self, route: ModelRoute) -> float:
+        if len(route.latencies) < settings.ROUTER_HEDGE_MIN_SAMPLES:
+            return settings.ROUTER_HEDGE_DEFAULT_DELAY
+        return max(route.percentile(settings.ROUTER_HEDGE_PERCENTILE), settings.ROUTER_HEDGE_MIN_DELAY)
+
+    def cache_scope(self) -> str:
+        """
+        Modèles susceptibles de répondre, pour la clé du cache d'analyses : le gagnant
+        n'est connu qu'après l'appel, la recherche se fait donc sur l'ensemble routé
+        """
+        return ",".join(sorted(route.name for route in self.routes))
+
+    def cost(self, model: str, usage: Dict[str, Any]) -> float:
+        return self.route(model).cost(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    async def _call(self, route: ModelRoute, payload: Dict[str, Any]) -> Dict[str, Any]:
+        route.requests += 1
+        started = time.perf_counter()
+        try:
+            data = await llm_client.chat_completion({**payload, "model": route.name})
+        except asyncio.CancelledError:
+            # Requête perdante d'un hedge : sa durée n'est qu'une borne basse de sa latence.
+            # L'enregistrer tirerait p50/p95 vers le bas, donc des hedges plus précoces.
+            route.cancelled += 1
+            raise
+        except UpstreamUnavailable:
+            # Refus local (disjoncteur / limite) : ne dit rien de la santé du modèle
+            raise
+        except Exception:
+            route.record(time.perf_counter() - started, ok=False)
+            raise
+        route.record(time.perf_counter() - started, ok=True)
+        usage = data.get("usage", {})
+        record_llm_usage(route.name, usage, route.cost(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)))
+        return data
+
+    async def complete(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], str, float]:
+        """
+        Complétion routée. Retourne (réponse OpenRouter, modèle gagnant, coût estimé du hedge perdant).
+        Le perdant étant annulé avant sa réponse, son coût est estimé sur les tokens d'entrée du gagnant.
+        """
+        ranked = self.ranked()
+        primary = ranked[0]
+        first = asyncio.ensure_future(self._call(primary, payload))
+        if len(ranked) < 2 or not settings.ROUTER_HEDGING_ENABLED:
+            data = await first
+            primary.wins += 1
+            return data, primary.name, 0.0
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(primary))
+        except BaseException:
+            # Appelant annulé pendant le délai de couverture (asyncio.wait n'annule pas
+            # ce qu'il attend) : la requête principale libère son slot llm_guard
+            first.cancel()
+            raise
+        if done and first.exception() is None:
+            primary.wins += 1
+            return first.result(), primary.name, 0.0
+
+        backup = ranked[1]
+        if done and isinstance(first.exception(), UpstreamUnavailable):
+            raise first.exception()
+        if done:
+            # Échec rapide du principal : bascule immédiate sans surcoût
+            self.failovers += 1
+            data = await self._call(backup, payload)
+            backup.wins += 1
+            return data, backup.name, 0.0
+
+        self.hedges += 1
+        second = asyncio.ensure_future(self._call(backup, payload))
+        contenders = {first: primary, second: backup}
+        pending = set(contenders)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    winner = contenders[task]
+                    winner.wins += 1
+                    # Si l'autre requête a déjà échoué, pas de coût de couverture
+                    hedge_cost = 0.0
+                    if pending:
+                        loser = contenders[next(iter(pending))]
+                        hedge_cost = loser.cost(task.result().get("usage", {}).get("prompt_tokens", 0), 0)
+                        openrouter_cost.inc(hedge_cost, loser.name)
+                    if winner is backup:
+                        self.hedge_wins += 1
+                    return task.result(), winner.name, hedge_cost
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedging_enabled": settings.ROUTER_HEDGING_ENABLED,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "models": [
+                {
+                    "model": route.name,
+                    "input_price": route.input_price,
+                    "output_price": route.output_price,
+                    "requests": route.requests,
+                    "wins": route.wins,
+                    "cancelled": route.cancelled,
+                    "samples": len(route.latencies),
+                    "p50_ms": round(1000 * route.percentile(50), 1) if route.latencies else None,
+                    "p95_ms": round(1000 * route.percentile(95), 1) if route.latencies else None,
+                    "error_rate": round(route.error_rate(), 4),
+                    "hedge_delay_ms": round(1000 * self.hedge_delay(route), 1),
+                }
+                for route in self.routes
+            ],
+        }
+
+
+llm_router = LLMRouter(parse_model_specs(settings.OPENROUTER_MODELS or [settings.OPENROUTER_MODEL]))
@@ -0,0 +1,210 @@
+import base64
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_settings
+from .database import SessionLocal
+from .rollup import forget_meal
+from ..models.analysis_job import AnalysisJob
+from ..models.meal import Meal
+from ..models.meal_tombstone import MealTombstone
+
+settings = get_settings()
+
+# Format compact : une ligne = un tableau dans cet ordre (user_id implicite)
+SYNC_FIELDS = ("id", "description", "calories", "proteins", "carbs", "fats", "fiber", "suggestions", "created_at")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+PURGE_INTERVAL = 3600.0  # secondes entre deux purges des tombstones expirées
+
+# (horodatage, id) de la dernière ligne transmise ; None = depuis le début
+Position = Optional[Tuple[datetime, str]]
+
+
+class CursorExpired(Exception):
+    """Curseur plus ancien que la rétention des tombstones : des suppressions ont pu être perdues"""
+
+
+@dataclass
+class SyncCursor:
+    meals: Position
+    deleted: Position
+    issued_at: float
+
+    def encode(self) -> str:
+        raw = orjson.dumps({
+            "m": [self.meals[0].isoformat(), self.meals[1]] if self.meals else None,
+            "t": [self.deleted[0].isoformat(), self.deleted[1]] if self.deleted else None,
+            "at": int(self.issued_at),
+        })
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "SyncCursor":
+        """Lève ValueError si le curseur est illisible, CursorExpired s'il est trop ancien"""
+        try:
+            raw = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            decoded = cls(meals=_position(raw["m"]), deleted=_position(raw["t"]), issued_at=float(raw["at"]))
+        except (ValueError, TypeError, KeyError, IndexError, orjson.JSONDecodeError) as e:
+            raise ValueError(f"Curseur de synchronisation invalide: {str(e)}")
+        if time.time() - decoded.issued_at > settings.SYNC_TOMBSTONE_RETENTION_DAYS * 86400:
+            raise CursorExpired("Curseur expiré : resynchronisation complète requise")
+        return decoded
+
+
+def _position(raw: Optional[List[str]]) -> Position:
+    return (datetime.fromisoformat(raw[0]), str(raw[1])) if raw else None
+
+
+def meal_row(meal: Meal) -> List[Any]:
+    return [
+        meal.id, meal.description, meal.calories, meal.proteins, meal.carbs,
+        meal.fats, meal.fiber, meal.suggestions,
+        meal.created_at.isoformat() if meal.created_at else "",
+    ]
+
+
+def _meals_query(user_id: str, position: Position):
+    # Parcours ascendant de ix_meals_user_id_created_at_id : coût proportionnel au delta
+    query = select(Meal).where(Meal.user_id == user_id)
+    if position is not None:
+        query = query.where(tuple_(Meal.created_at, Meal.id) > tuple_(*position))
+    return query.order_by(Meal.created_at, Meal.id)
+
+
+def _tombstones_query(user_id: str, position: Position):
+    query = select(MealTombstone.meal_id, MealTombstone.deleted_at).where(MealTombstone.user_id == user_id)
+    if position is not None:
+        query = query.where(tuple_(MealTombstone.deleted_at, MealTombstone.meal_id) > tuple_(*position))
+    return query.order_by(MealTombstone.deleted_at, MealTombstone.meal_id)
+
+
+def _caught_up(last: Optional[datetime], position: Position) -> Position:
+    """
+    Filigrane rendu une fois le client à jour : recule de SYNC_OVERLAP pour renvoyer
+    les lignes d'une transaction commitée après une ligne plus récente déjà transmise.
+    """
+    if last is None:
+        return position
+    return (last - timedelta(seconds=settings.SYNC_OVERLAP), "")
+
+
+async def _initial_deleted_position(db: AsyncSession, user_id: str) -> Position:
+    """Première synchronisation : l'état complet est envoyé, les suppressions passées sont inutiles"""
+    latest = (await db.execute(
+        select(func.max(MealTombstone.deleted_at)).where(MealTombstone.user_id == user_id)
+    )).scalar()
+    return _caught_up(latest, None)
+
+
+async def delta(db: AsyncSession, user_id: str, cursor: Optional[SyncCursor], limit: int) -> Dict[str, Any]:
+    """
+    Une page de changements depuis `cursor` (tout l'historique si None).
+    `has_more` : rappeler immédiatement avec le `cursor` renvoyé.
+    """
+    meals = (await db.execute(
+        _meals_query(user_id, cursor.meals if cursor else None).limit(limit + 1)
+    )).scalars().all()
+    more_meals = len(meals) > limit
+    meals = meals[:limit]
+
+    deleted: List[str] = []
+    more_deleted = False
+    if cursor is None:
+        deleted_position = await _initial_deleted_position(db, user_id)
+    else:
+        tombstones = (await db.execute(
+            _tombstones_query(user_id, cursor.deleted).limit(limit + 1)
+        )).all()
+        more_deleted = len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        deleted = [meal_id for meal_id, _ in tombstones]
+        if more_deleted:
+            deleted_position = (tombstones[-1].deleted_at, tombstones[-1].meal_id)
+        else:
+            deleted_position = _caught_up(tombstones[-1].deleted_at if tombstones else None, cursor.deleted)
+
+    if more_meals:
+        meals_position = (meals[-1].created_at, meals[-1].id)
+    else:
+        meals_position = _caught_up(meals[-1].created_at if meals else None, cursor.meals if cursor else None)
+
+    next_cursor = SyncCursor(meals=meals_position, deleted=deleted_position, issued_at=time.time())
+    return {
+        "fields": SYNC_FIELDS,
+        "meals": [meal_row(meal) for meal in meals],
+        "deleted": deleted,
+        "cursor": next_cursor.encode(),
+        "has_more": more_meals or more_deleted,
+    }
+
+
+async def stream_delta(user_id: str, cursor: Optional[SyncCursor]) -> AsyncIterator[bytes]:
+    """
+    Tous les changements en NDJSON, sans pagination (gros rattrapages) :
+    {"fields": [...]}, un tableau par repas, {"deleted": id} par suppression,
+    puis {"cursor": ..., "has_more": false}.
+    Session propre au flux : celle de la requête est fermée avant l'envoi du corps.
+    """
+    async with SessionLocal() as db:
+        yield orjson.dumps({"fields": SYNC_FIELDS}) + b"\n"
+
+        last_meal: Optional[datetime] = None
+        rows = await db.stream_scalars(_meals_query(user_id, cursor.meals if cursor else None).execution_options(yield_per=500))
+        async for meal in rows:
+            last_meal = meal.created_at
+            yield orjson.dumps(meal_row(meal)) + b"\n"
+        meals_position = _caught_up(last_meal, cursor.meals if cursor else None)
+
+        if cursor is None:
+            deleted_position = await _initial_deleted_position(db, user_id)
+        else:
+            last_deleted: Optional[datetime] = None
+            rows = await db.stream(_tombstones_query(user_id, cursor.deleted).execution_options(yield_per=500))
+            async for meal_id, deleted_at in rows:
+                last_deleted = deleted_at
+                yield orjson.dumps({"deleted": meal_id}) + b"\n"
+            deleted_position = _caught_up(last_deleted, cursor.deleted)
+
+        next_cursor = SyncCursor(meals=meals_position, deleted=deleted_position, issued_at=time.time())
+        yield orjson.dumps({"cursor": next_cursor.encode(), "has_more": False}) + b"\n"
+
+
+_last_purge = time.monotonic()
+
+
+async def delete_meal(db: AsyncSession, user_id: str, meal_id: str) -> bool:
+    """
+    Supprime un repas de l'utilisateur et pose sa tombstone dans la même transaction
+    (commit à la charge de l'appelant). False si le repas n'existe pas ou n'est pas à lui.
+    Le repas est aussi retiré du rollup quotidien et détaché des jobs asynchrones
+    qui l'ont produit (clé étrangère analysis_jobs.meal_id).
+    """
+    global _last_purge
+    owned = (await db.execute(
+        select(Meal.id).where(Meal.id == meal_id, Meal.user_id == user_id).with_for_update()
+    )).first()
+    if owned is None:
+        return False
+    await db.execute(update(AnalysisJob).where(AnalysisJob.meal_id == meal_id).values(meal_id=None))
+    await forget_meal(db, meal_id)
+    await db.execute(delete(Meal).where(Meal.id == meal_id))
+    await db.execute(insert(MealTombstone).values(meal_id=meal_id, user_id=user_id))
+    if time.monotonic() - _last_purge > PURGE_INTERVAL:
+        _last_purge = time.monotonic()
+        await purge_tombstones(db)
+    return True
+
+
+async def purge_tombstones(db: AsyncSession) -> int:
+    """Tombstones plus anciennes que la rétention : leurs curseurs sont refusés (410) de toute façon"""
+    horizon = datetime.now(timezone.utc) - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    result = await db.execute(delete(MealTombstone).where(MealTombstone.deleted_at < horizon))
+    return result.rowcount
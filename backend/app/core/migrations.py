@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .database import engine
+
+# Table de suivi hors de Base.metadata : jamais créée ni modifiée par les modèles
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+# Verrou consultatif Postgres : un seul process applique les migrations à la fois
+_ADVISORY_LOCK_ID = 7_318_204
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def load_migrations() -> List[ModuleType]:
+    """
+    Migrations de `app/migrations`, triées par VERSION.
+    Chaque module définit VERSION, DESCRIPTION, TRANSACTIONAL et `async def upgrade(conn)`.
+    Les étapes doivent être idempotentes : une migration non transactionnelle
+    interrompue est simplement rejouée.
+    """
+    from .. import migrations as package
+    modules = [
+        importlib.import_module(f"{package.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(package.__path__)
+        if info.name.startswith("v")
+    ]
+    modules.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in modules]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Versions de migration en double : {versions}")
+    return modules
+
+
+def latest_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+
+# --- Helpers DDL (Postgres + SQLite) ---
+
+def is_postgres(conn: AsyncConnection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+async def has_column(conn: AsyncConnection, table: str, column: str) -> bool:
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(table))
+    return any(c["name"] == column for c in columns)
+
+
+async def add_column(conn: AsyncConnection, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN si la colonne n'existe pas encore"""
+    if not await has_column(conn, table, column):
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+async def create_index(conn: AsyncConnection, name: str, table: str, columns: Sequence[str], unique: bool = False):
+    """
+    CREATE INDEX idempotent. Sur Postgres la construction est CONCURRENTLY
+    (pas de verrou en écriture sur la table) : la migration doit alors être
+    déclarée TRANSACTIONAL = False. Un index laissé invalide par une
+    construction concurrente interrompue est supprimé puis reconstruit.
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cols = ", ".join(columns)
+    if not is_postgres(conn):
+        await conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({cols})"))
+        return
+
+    invalid = (await conn.execute(text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name})).scalar()
+    if invalid:
+        print(f"⚠️ Index {name} invalide (construction interrompue), reconstruction")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+async def create_tables(conn: AsyncConnection, *tables: Table):
+    """Crée les tables (et leurs index) absentes, d'après les modèles"""
+    await conn.run_sync(lambda sync_conn: [t.create(sync_conn, checkfirst=True) for t in tables])
+
+
+# --- Exécution ---
+
+async def current_version(conn: AsyncConnection) -> int:
+    exists = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(schema_version.name))
+    if not exists:
+        return 0
+    return (await conn.execute(select(func.max(schema_version.c.version)))).scalar() or 0
+
+
+async def upgrade(db_engine: AsyncEngine = engine, target: Optional[int] = None) -> int:
+    """Applique les migrations en attente jusqu'à `target` (dernière par défaut). Retourne la version atteinte."""
+    migrations = load_migrations()
+    target = target if target is not None else (migrations[-1].VERSION if migrations else 0)
+
+    async with db_engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if is_postgres(lock_conn):
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        try:
+            await lock_conn.run_sync(lambda sync_conn: schema_version.create(sync_conn, checkfirst=True))
+            version = await current_version(lock_conn)
+            for migration in migrations:
+                if migration.VERSION <= version or migration.VERSION > target:
+                    continue
+                print(f"⏳ Migration {migration.VERSION:03d} : {migration.DESCRIPTION}")
+                if migration.TRANSACTIONAL:
+                    async with db_engine.begin() as conn:
+                        await migration.upgrade(conn)
+                        await conn.execute(schema_version.insert().values(
+                            version=migration.VERSION, description=migration.DESCRIPTION
+                        ))
+                else:
+                    # Ex: CREATE INDEX CONCURRENTLY, interdit dans une transaction
+                    await migration.upgrade(lock_conn)
+                    await lock_conn.execute(schema_version.insert().values(
+                        version=migration.VERSION, description=migration.DESCRIPTION
+                    ))
+                version = migration.VERSION
+                print(f"✅ Migration {migration.VERSION:03d} appliquée")
+            return version
+        finally:
+            if is_postgres(lock_conn):
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+
+
+async def verify_schema(db_engine: AsyncEngine = engine) -> int:
+    """Contrôle de démarrage : une seule lecture de schema_version, pas d'introspection des tables"""
+    expected = latest_version()
+    async with db_engine.connect() as conn:
+        try:
+            version = (await conn.execute(select(func.max(schema_version.c.version)))).scalar() or 0
+        except Exception:
+            version = 0
+    if version < expected:
+        raise SchemaOutdated(
+            f"Schéma en version {version}, version {expected} attendue : "
+            f"lancer `python -m app.core.migrations upgrade`"
+        )
+    return version
+
+
+async def _status():
+    migrations = load_migrations()
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    for migration in migrations:
+        mark = "✅" if migration.VERSION <= version else "⏳"
+        print(f"{mark} {migration.VERSION:03d} {migration.DESCRIPTION}")
+    print(f"Version actuelle : {version} / {migrations[-1].VERSION if migrations else 0}")
+
+
+async def _run_cli(args: argparse.Namespace):
+    try:
+        if args.command == "upgrade":
+            version = await upgrade(target=args.target)
+            print(f"✅ Schéma en version {version}")
+        else:
+            await _status()
+    finally:
+        await engine.dispose()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.migrations", description="Migrations du schéma NutriAI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upgrade", help="applique les migrations en attente")
+    up.add_argument("--target", type=int, default=None, help="version cible (dernière par défaut)")
+    sub.add_parser("status", help="liste les migrations et la version actuelle")
+    asyncio.run(_run_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import csv
+import os
+import re
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import get_settings
+from .analysis_cache import normalize_description
+
+settings = get_settings()
+
+DEFAULT_FOODS_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "foods.csv")
+
+LOCAL_MODEL_NAME = "local/nutrition-db"
+
+_NUTRIENTS = ("calories", "proteins", "carbs", "fats", "fiber")
+
+# Séparateurs d'ingrédients (avant / après normalisation)
+_RAW_SPLIT_RE = re.compile(r"[,;+\n]")
+_WORD_SPLIT_RE = re.compile(r"\b(?:et|and|avec|with|plus|accompagne de|served with)\b")
+
+_MASS_RE = re.compile(r"^(\d+(?:\.\d+)?)(g|kg|ml|cl|l)$")
+_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+_MASS_FACTORS = {"g": 1.0, "kg": 1000.0, "ml": 1.0, "cl": 10.0, "l": 1000.0}
+
+# Mesures ménagères -> grammes (None = une portion standard de l'aliment)
+_PORTIONS = {
+    "cuillere a soupe": 15.0, "tablespoon": 15.0, "cas": 15.0, "tbsp": 15.0,
+    "cuillere a cafe": 5.0, "teaspoon": 5.0, "cac": 5.0, "tsp": 5.0,
+    "cuillere": 10.0, "spoon": 10.0,
+    "bol": None, "bowl": None,
+    "verre": 200.0, "glass": 200.0,
+    "tasse": 200.0, "cup": 200.0, "mug": 250.0,
+    "assiette": 300.0, "plate": 300.0,
+    "poignee": 30.0, "handful": 30.0,
+    "tranche": None, "slice": None, "portion": None, "part": None,
+    "serving": None, "piece": None, "morceau": None,
+}
+
+# Mots ignorés autour du nom de l'aliment
+_STOPWORDS = {"de", "d", "du", "des", "la", "le", "les", "l", "of", "a", "an", "some", "the", "un", "une"}
+
+# Qualificatifs sans impact notable sur la composition (confiance réduite)
+_QUALIFIERS = {
+    "cuit", "cuite", "cuits", "cuites", "nature", "grille", "grillee", "roti", "rotie",
+    "vapeur", "bouilli", "bouillie", "frais", "fraiche", "entier", "entiere", "moyen", "moyenne",
+    "gros", "grosse", "petit", "petite", "bio", "maison", "basmati", "complet",
+    "cooked", "boiled", "grilled", "roasted", "steamed", "fresh", "plain", "whole",
+    "medium", "large", "small", "big", "organic", "homemade",
+}
+
+
+def _singular(text: str) -> str:
+    return " ".join(w[:-1] if len(w) > 3 and w[-1] in "sx" else w for w in text.split())
+
+
+class NutritionDB:
+    """
+    Moteur local de composition nutritionnelle.
+    Charge une table hors-ligne (valeurs pour 100 g + portion standard) dans un
+    index compact : colonnes `array('f')` et dictionnaire alias -> indice.
+    Répond aux descriptions simples ("une banane", "2 oeufs et une tartine")
+    sans appel LLM ; en dessous du seuil de confiance, l'appelant bascule sur OpenRouter.
+    """
+
+    def __init__(self, path: str = DEFAULT_FOODS_PATH):
+        self.path = path
+        self.loaded = False
+        self._names: List[str] = []
+        self._portions = array("f")
+        self._columns: Dict[str, array] = {}
+        self._aliases: Dict[str, int] = {}
+        self.lookups = 0
+        self.answered = 0
+        self.fallbacks = 0
+        self.total_latency_s = 0.0
+
+    def load(self):
+        names: List[str] = []
+        portions = array("f")
+        columns = {n: array("f") for n in _NUTRIENTS}
+        aliases: Dict[str, int] = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for index, row in enumerate(csv.DictReader(f)):
+                names.append(row["name"])
+                portions.append(float(row["portion_g"]))
+                for nutrient in _NUTRIENTS:
+                    columns[nutrient].append(float(row[nutrient]))
+                for alias in [row["name"]] + [a for a in row["aliases"].split("|") if a]:
+                    normalized = normalize_description(alias)
+                    aliases.setdefault(normalized, index)
+                    aliases.setdefault(_singular(normalized), index)
+        self._names, self._portions, self._columns, self._aliases = names, portions, columns, aliases
+        self.loaded = True
+        print(f"✅ Base nutritionnelle locale chargée ({len(names)} aliments, {len(aliases)} alias)")
+
+    def _lookup(self, name: str) -> Tuple[Optional[int], float]:
+        """Retourne (indice aliment, confiance) pour un nom normalisé"""
+        for candidate in (name, _singular(name)):
+            if candidate in self._aliases:
+                return self._aliases[candidate], 1.0
+        words = [w for w in name.split() if w not in _QUALIFIERS]
+        if words and len(words) < len(name.split()):
+            stripped = " ".join(words)
+            for candidate in (stripped, _singular(stripped)):
+                if candidate in self._aliases:
+                    return self._aliases[candidate], 0.95
+        return None, 0.0
+
+    def _parse_item(self, segment: str) -> Optional[Tuple[int, float, float]]:
+        """
+        Analyse "2 oeufs", "200g de riz", "1 bol de cereales" -> (aliment, grammes, confiance).
+        None si l'aliment est inconnu ou la quantité hors des bornes LOCAL_NUTRITION_MAX_*.
+        """
+        tokens = segment.split()
+        quantity = 1.0
+        grams: Optional[float] = None
+        confidence = 1.0
+
+        if tokens:
+            mass = _MASS_RE.match(tokens[0])
+            if mass:
+                grams = float(mass.group(1)) * _MASS_FACTORS[mass.group(2)]
+                tokens = tokens[1:]
+            elif _NUMBER_RE.match(tokens[0]):
+                quantity = float(tokens[0])
+                tokens = tokens[1:]
+
+        portion_g: Optional[float] = None
+        has_portion = False
+        if grams is None:
+            for size in (3, 2, 1):
+                candidate = _singular(" ".join(tokens[:size]))
+                if len(tokens) > size and candidate in _PORTIONS:
+                    portion_g = _PORTIONS[candidate]
+                    has_portion = True
+                    tokens = tokens[size:]
+                    confidence = 0.95
+                    break
+
+        while len(tokens) > 1 and tokens[0] in _STOPWORDS:
+            tokens = tokens[1:]
+        if not tokens:
+            return None
+
+        food, match_confidence = self._lookup(" ".join(tokens))
+        if food is None:
+            return None
+        if grams is None:
+            if not 0 < quantity <= settings.LOCAL_NUTRITION_MAX_COUNT:
+                return None
+            unit = portion_g if has_portion and portion_g is not None else self._portions[food]
+            grams = quantity * unit
+        # Quantité invraisemblable ("1000 oeufs", "50kg de riz") : plutôt le LLM qu'un total absurde
+        if not 0 < grams <= settings.LOCAL_NUTRITION_MAX_ITEM_GRAMS:
+            return None
+        return food, grams, min(confidence, match_confidence)
+
+    def analyze(self, description: str) -> Optional[Dict[str, Any]]:
+        """
+        Analyse locale d'une description FR/EN.
+        Retourne None si un ingrédient est inconnu ou si la confiance est sous le seuil.
+        """
+        if not self.loaded:
+            self.load()
+        started = time.perf_counter()
+        self.lookups += 1
+        try:
+            segments = []
+            for raw in _RAW_SPLIT_RE.split(description):
+                segments.extend(s.strip() for s in _WORD_SPLIT_RE.split(normalize_description(raw)))
+            segments = [s for s in segments if s]
+            if not segments:
+                self.fallbacks += 1
+                return None
+
+            totals = dict.fromkeys(_NUTRIENTS, 0.0)
+            confidence = 1.0
+            items = []
+            for segment in segments:
+                parsed = self._parse_item(segment)
+                if parsed is None:
+                    self.fallbacks += 1
+                    return None
+                food, grams, item_confidence = parsed
+                confidence = min(confidence, item_confidence)
+                for nutrient in _NUTRIENTS:
+                    totals[nutrient] += self._columns[nutrient][food] * grams / 100.0
+                items.append({"food": self._names[food], "grams": round(grams, 1)})
+
+            if confidence < settings.LOCAL_NUTRITION_MIN_CONFIDENCE:
+                self.fallbacks += 1
+                return None
+
+            self.answered += 1
+            result: Dict[str, Any] = {n: round(v, 1) for n, v in totals.items()}
+            result["suggestions"] = self._suggestions(result)
+            result["confidence"] = confidence
+            result["items"] = items
+            return result
+        finally:
+            self.total_latency_s += time.perf_counter() - started
+
+    @staticmethod
+    def _suggestions(totals: Dict[str, float]) -> List[str]:
+        suggestions = []
+        if totals["fiber"] < 3:
+            suggestions.append("Ajoutez des légumes ou des fruits pour augmenter les fibres.")
+        if totals["proteins"] < 10:
+            suggestions.append("Ajoutez une source de protéines (œuf, yaourt, légumineuses).")
+        if totals["fats"] > 30:
+            suggestions.append("Repas riche en lipides : privilégiez des cuissons sans matière grasse.")
+        if totals["calories"] > 900:
+            suggestions.append("Repas copieux : pensez à alléger le prochain repas.")
+        return suggestions[:2] or ["Repas équilibré, continuez ainsi !"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.LOCAL_NUTRITION_ENABLED,
+            "foods": len(self._names),
+            "aliases": len(self._aliases),
+            "lookups": self.lookups,
+            "answered": self.answered,
+            "fallbacks": self.fallbacks,
+            "answer_ratio": round(self.answered / self.lookups, 4) if self.lookups else 0.0,
+            "avg_latency_us": round(1_000_000 * self.total_latency_s / self.lookups, 1) if self.lookups else 0.0,
+        }
+
+
+nutrition_db = NutritionDB(settings.LOCAL_NUTRITION_PATH or DEFAULT_FOODS_PATH)
@@ -0,0 +1,198 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .clerk import clerk_client
+from .config import get_settings
+from .database import SessionLocal
+from .user_cache import user_cache
+from ..models.user import User
+
+settings = get_settings()
+
+
+class ProfileSync:
+    """
+    Synchronisation email / display_name avec Clerk, hors du chemin des requêtes.
+    get_current_user signale seulement "utilisateur X vu" (avec le profil du token
+    s'il en porte un) ; un worker regroupe les utilisateurs à rafraîchir par lots,
+    interroge l'API Clerk avec une concurrence bornée sur le pool partagé, puis
+    applique les différences en un UPDATE groupé par clé primaire.
+    Un utilisateur synchronisé il y a moins de PROFILE_SYNC_MAX_AGE n'est pas remis en file.
+    """
+
+    def __init__(self):
+        # user_id -> (vu à, profil du token ou None)
+        self._pending: "OrderedDict[str, Tuple[float, Optional[Dict[str, str]]]]" = OrderedDict()
+        self._synced_at: "OrderedDict[str, float]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.skipped_fresh = 0
+        self.dropped = 0
+        self.batches = 0
+        self.synced = 0
+        self.updated = 0
+        self.errors = 0
+        self.last_batch_size = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def seen(self, user_id: str, profile: Optional[Dict[str, str]] = None):
+        """Appelé par les handlers : O(1), jamais d'I/O"""
+        if not settings.PROFILE_SYNC_ENABLED:
+            return
+        synced_at = self._synced_at.get(user_id)
+        if synced_at is not None and time.monotonic() - synced_at < settings.PROFILE_SYNC_MAX_AGE:
+            self.skipped_fresh += 1
+            return
+        if user_id in self._pending:
+            if profile:
+                self._pending[user_id] = (self._pending[user_id][0], profile)
+            return
+        if len(self._pending) >= settings.PROFILE_SYNC_MAX_PENDING:
+            self.dropped += 1
+            return
+        self._pending[user_id] = (time.monotonic(), profile)
+        self.enqueued += 1
+        if self._wakeup is not None and len(self._pending) >= settings.PROFILE_SYNC_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.PROFILE_SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                try:
+                    await self.sync_batch()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"❌ Synchronisation profils Clerk: {str(e)}")
+                    break
+
+    def _take_batch(self) -> List[Tuple[str, float, Optional[Dict[str, str]]]]:
+        batch = []
+        while self._pending and len(batch) < settings.PROFILE_SYNC_BATCH_SIZE:
+            user_id, (seen_at, profile) = self._pending.popitem(last=False)
+            batch.append((user_id, seen_at, profile))
+        return batch
+
+    async def _fetch_profiles(self, batch) -> Dict[str, Dict[str, str]]:
+        semaphore = asyncio.Semaphore(max(settings.PROFILE_SYNC_CONCURRENCY, 1))
+
+        async def _profile(user_id: str, profile: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+            # Profil déjà porté par le token : pas d'appel Clerk
+            if profile and profile.get("email"):
+                return profile
+            async with semaphore:
+                return await clerk_client.fetch_profile(user_id)
+
+        profiles = await asyncio.gather(*[_profile(user_id, profile) for user_id, _, profile in batch])
+        return {user_id: profile for (user_id, _, _), profile in zip(batch, profiles) if profile}
+
+    async def sync_batch(self) -> int:
+        """Synchronise un lot ; retourne le nombre d'utilisateurs modifiés"""
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        profiles = await self._fetch_profiles(batch)
+
+        changes: List[Dict[str, Any]] = []
+        async with SessionLocal() as db:
+            if profiles:
+                rows = (await db.execute(
+                    select(User.id, User.email, User.display_name).where(User.id.in_(list(profiles)))
+                )).all()
+                for user_id, email, display_name in rows:
+                    wanted = profiles[user_id]
+                    new_email = wanted.get("email") or email
+                    new_name = wanted.get("display_name") or display_name
+                    if new_email != email or new_name != display_name:
+                        changes.append({"id": user_id, "email": new_email, "display_name": new_name})
+            if changes:
+                try:
+                    # UPDATE groupé par clé primaire (executemany)
+                    await db.execute(update(User), changes)
+                    await db.commit()
+                except IntegrityError:
+                    # Email déjà pris par un autre compte : on applique ligne par ligne
+                    await db.rollback()
+                    changes = await self._update_one_by_one(db, changes)
+
+        now = time.monotonic()
+        for user_id, seen_at, _ in batch:
+            lag = now - seen_at
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+        for user_id in profiles:
+            self._synced_at[user_id] = now
+            self._synced_at.move_to_end(user_id)
+        while len(self._synced_at) > settings.PROFILE_SYNC_MAX_PENDING:
+            self._synced_at.popitem(last=False)
+        for change in changes:
+            user_cache.invalidate(change["id"])
+        self.synced += len(batch)
+        self.updated += len(changes)
+        return len(changes)
+
+    async def _update_one_by_one(self, db, changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        applied = []
+        for change in changes:
+            try:
+                await db.execute(
+                    update(User).where(User.id == change["id"])
+                    .values(email=change["email"], display_name=change["display_name"])
+                )
+                await db.commit()
+                applied.append(change)
+            except IntegrityError as e:
+                await db.rollback()
+                self.errors += 1
+                print(f"⚠️ Profil Clerk non appliqué pour {change['id']}: {str(e.orig)}")
+        return applied
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = next(iter(self._pending.values()))[0] if self._pending else None
+        return {
+            "enabled": settings.PROFILE_SYNC_ENABLED,
+            "running": self._task is not None,
+            "batch_size": settings.PROFILE_SYNC_BATCH_SIZE,
+            "interval_s": settings.PROFILE_SYNC_INTERVAL,
+            "max_age_s": settings.PROFILE_SYNC_MAX_AGE,
+            "pending": len(self._pending),
+            "oldest_pending_s": round(now - oldest, 2) if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "skipped_fresh": self.skipped_fresh,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "synced": self.synced,
+            "updated": self.updated,
+            "errors": self.errors,
+            "avg_lag_s": round(self.total_lag / self.synced, 2) if self.synced else 0.0,
+            "max_lag_s": round(self.max_lag, 2),
+            "clerk_profile_requests": clerk_client.profile_requests,
+        }
+
+
+profile_sync = ProfileSync()
@@ -0,0 +1,81 @@
+from datetime import date, datetime, time
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .user_cache import user_cache
+from ..models.user import User
+
+
+def _today_start() -> datetime:
+    return datetime.combine(date.today(), time.min)
+
+
+def quota_used(user: User) -> int:
+    """Quota consommé aujourd'hui, en tenant compte d'une remise à zéro pas encore appliquée en base"""
+    if user.quota_reset_date is not None and user.quota_reset_date.replace(tzinfo=None) < _today_start():
+        return 0
+    return user.quota_used
+
+
+def quota_remaining(user: User) -> int:
+    """Quota restant, même remise à zéro paresseuse que quota_used"""
+    if user.daily_quota == -1:
+        return -1
+    return max(user.daily_quota - quota_used(user), 0)
+
+
+async def reserve_quota(db: AsyncSession, user: User, count: int = 1):
+    """
+    Réserve `count` analyses en un seul UPDATE ... RETURNING conditionnel :
+    remise à zéro paresseuse si la dernière remise date d'avant aujourd'hui,
+    puis incrément seulement s'il reste assez de quota. Deux requêtes
+    concurrentes ne peuvent donc jamais dépasser le quota.
+    L'appelant commite (seul ou avec d'autres écritures) ; lève 429 si le quota est atteint.
+    """
+    today_start = _today_start()
+    stale = User.quota_reset_date < today_start
+    used_before = case((stale, 0), else_=User.quota_used)
+    row = (await db.execute(
+        update(User)
+        .where(
+            User.id == user.id,
+            (User.daily_quota == -1) | (used_before + count <= User.daily_quota)
+        )
+        .values(
+            quota_used=used_before + count,
+            quota_reset_date=case((stale, datetime.now()), else_=User.quota_reset_date)
+        )
+        .returning(User.quota_used, User.quota_reset_date)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Quota atteint" if count == 1 else f"Quota insuffisant pour {count} repas"
+        )
+    # Valeurs de la base, sans marquer l'objet comme modifié
+    set_committed_value(user, "quota_used", row.quota_used)
+    set_committed_value(user, "quota_reset_date", row.quota_reset_date)
+    user_cache.put(user)
+
+
+async def refund_quota(db: AsyncSession, user_id: str, count: int = 1, user: Optional[User] = None):
+    """Rend `count` réservations (échec LLM / sauvegarde). L'appelant commite."""
+    if count <= 0:
+        return
+    row = (await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(quota_used=case((User.quota_used > count, User.quota_used - count), else_=0))
+        .returning(User.quota_used)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if user is not None and row is not None:
+        set_committed_value(user, "quota_used", row.quota_used)
+        user_cache.put(user)
+    else:
+        user_cache.invalidate(user_id)
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from jose import JWTError
+from sqlalchemy import case, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from .config import get_settings
+from .clerk import VERIFIED_CLAIMS_STATE, JWKSUnavailable, clerk_client
+from .database import engine
+from ..models.rate_limit_bucket import RateLimitBucket
+
+settings = get_settings()
+
+
+class RateRule:
+    """
+    `METHODE /préfixe=capacité/secondes` : rafale de `capacité` requêtes,
+    rechargée linéairement sur `secondes`. METHODE `*` = toutes les méthodes.
+    """
+
+    def __init__(self, spec: str):
+        try:
+            route, limit = spec.rsplit("=", 1)
+            method, prefix = route.split()
+            capacity, period = limit.split("/")
+            self.method = method.upper()
+            self.prefix = "/" + prefix.strip("/")
+            self.capacity = float(capacity)
+            self.rate = self.capacity / float(period)
+        except (ValueError, ZeroDivisionError):
+            raise ValueError(f"Règle de rate limit invalide : {spec!r} (attendu 'POST /api/v1/meals/analyze=20/60')")
+        self.name = f"{self.method} {self.prefix}"
+        self.rejected = 0
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method != "*" and self.method != method:
+            return False
+        return path == self.prefix or path.startswith(self.prefix.rstrip("/") + "/")
+
+
+class MemoryBackend:
+    """Buckets dans le process : O(1) par vérification, mais propres à chaque worker uvicorn"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # clé -> (jetons, horodatage monotonic, instant où le bucket sera plein)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Consomme un jeton : 0 si la requête passe, sinon secondes avant le prochain jeton"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        if bucket is None and len(self._buckets) > self.max_keys:
+            self._evict(now)
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now: float):
+        # Un bucket plein équivaut à un bucket absent : on les oublie d'abord
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        # Sinon (beaucoup de clés actives) : les plus anciennes, dans l'ordre d'insertion
+        overflow = len(self._buckets) - int(self.max_keys * 0.9)
+        for key in list(self._buckets)[:max(overflow, 0)]:
+            del self._buckets[key]
+
+    async def purge(self, idle_after: float):
+        self._evict(time.monotonic())
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class DatabaseBackend:
+    """
+    Buckets dans la table `rate_limit_buckets`, partagés entre workers et instances.
+    Recharge + consommation en un seul UPSERT ... RETURNING : atomique sans verrou applicatif.
+    """
+
+    name = "database"
+
+    def __init__(self, db_engine=engine):
+        self.engine = db_engine
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.time()
+        insert = pg_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate
+        refilled = case((refilled > capacity, capacity), else_=refilled)
+        stmt = insert(RateLimitBucket).values(key=key, tokens=capacity - 1, updated_at=now, allowed=capacity >= 1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={
+                "tokens": case((refilled >= 1, refilled - 1), else_=refilled),
+                "updated_at": now,
+                "allowed": refilled >= 1,
+            }
+        ).returning(RateLimitBucket.tokens, RateLimitBucket.allowed)
+        async with self.engine.begin() as conn:
+            tokens, allowed = (await conn.execute(stmt)).one()
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    async def purge(self, idle_after: float):
+        """Supprime les buckets inactifs depuis assez longtemps pour être pleins"""
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < time.time() - idle_after))
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class RateLimiter:
+    """
+    Token buckets par route × utilisateur, plus un bucket par IP.
+    L'utilisateur est celui qu'accepte l'authentification (JWT vérifié ou token
+    simplifié clerk_<id>) ; identifié, son bucket IP est élargi de `ip_factor`
+    (plusieurs utilisateurs derrière un même NAT ou une IP d'opérateur). Un JWT
+    invalide ne donne ni bucket utilisateur ni bucket IP élargi.
+    """
+
+    PURGE_INTERVAL = 300.0  # secondes
+
+    def __init__(self, rules: Sequence[str], backend: str, ip_factor: float):
+        # Préfixe le plus long d'abord, puis méthode explicite avant "*"
+        self.rules = sorted((RateRule(spec) for spec in rules), key=lambda r: (-len(r.prefix), r.method == "*"))
+        self.backend = DatabaseBackend() if backend == "database" else MemoryBackend()
+        self.ip_factor = ip_factor
+        self.idle_after = max((r.capacity / r.rate for r in self.rules), default=0.0)
+        self._last_purge = time.monotonic()
+        self.checks = 0
+        self.rejected = 0
+        self.errors = 0
+        self.check_time = 0.0
+
+    def match(self, method: str, path: str) -> Optional[RateRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    async def check(self, rule: RateRule, user_id: Optional[str], ip: str) -> int:
+        """0 si la requête passe, sinon la valeur de Retry-After (secondes)"""
+        started = time.perf_counter()
+        self.checks += 1
+        ip_capacity = rule.capacity * self.ip_factor if user_id else rule.capacity
+        ip_rate = rule.rate * self.ip_factor if user_id else rule.rate
+        buckets: List[Tuple[str, float, float]] = [(f"{rule.name}:ip:{ip}", ip_capacity, ip_rate)]
+        if user_id:
+            buckets.append((f"{rule.name}:user:{user_id}", rule.capacity, rule.rate))
+        wait = 0.0
+        try:
+            # IP d'abord : une requête déjà refusée ne consomme pas le bucket utilisateur
+            for key, capacity, rate in buckets:
+                wait = await self.backend.take(key, capacity, rate)
+                if wait:
+                    break
+            if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                await self.backend.purge(self.idle_after)
+        except Exception as e:
+            # Backend partagé indisponible : on laisse passer plutôt que de bloquer l'API
+            self.errors += 1
+            print(f"⚠️ Rate limiter indisponible ({self.backend.name}): {str(e)}")
+            wait = 0.0
+        self.check_time += time.perf_counter() - started
+        if wait:
+            self.rejected += 1
+            rule.rejected += 1
+            return max(int(wait) + 1, 1)
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RATE_LIMIT_ENABLED,
+            "backend": self.backend.name,
+            "buckets": self.backend.size(),
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "avg_check_us": round(self.check_time / self.checks * 1e6, 1) if self.checks else 0.0,
+            "rules": [
+                {"rule": r.name, "capacity": r.capacity, "per_second": round(r.rate, 4), "rejected": r.rejected}
+                for r in self.rules
+            ],
+        }
+
+
+async def _identity(scope, authorization: Optional[str]) -> Optional[str]:
+    """
+    Utilisateur que get_current_user retiendra pour ce token, sinon None (limite par IP seule) :
+    id des tokens simplifiés clerk_<id> (acceptés tels quels par l'authentification),
+    `sub` d'un JWT dont la signature est valide. Les claims vérifiés sont laissés dans
+    l'état de la requête : get_current_user ne revérifie pas la signature.
+    """
+    if not settings.CLERK_SECRET_KEY or not authorization or not authorization.startswith("Bearer "):
+        return None
+    token = authorization[len("Bearer "):].strip()
+    if token.startswith("clerk_"):
+        return token[len("clerk_"):] or None
+    try:
+        claims = await clerk_client.verify(token)
+    except (JWTError, JWKSUnavailable):
+        return None
+    scope.setdefault("state", {})[VERIFIED_CLAIMS_STATE] = (token, claims)
+    return claims.get("sub")
+
+
+def _client_ip(scope, headers: Headers) -> str:
+    """
+    Adresse du client. Derrière RATE_LIMIT_PROXY_HOPS proxys de confiance, c'est
+    l'entrée de X-Forwarded-For ajoutée par le plus proche d'entre eux (en partant
+    de la droite) : les entrées de gauche sont fournies par le client.
+    """
+    hops = settings.RATE_LIMIT_PROXY_HOPS
+    forwarded = headers.get("x-forwarded-for")
+    if hops > 0 and forwarded:
+        entries = [e.strip() for e in forwarded.split(",") if e.strip()]
+        if entries:
+            return entries[-min(hops, len(entries))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI : 429 + Retry-After avant d'atteindre les routes (et donc le LLM ou la DB)"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        rule = self.limiter.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        user_id = await _identity(scope, headers.get("authorization"))
+        retry_after = await self.limiter.check(rule, user_id, _client_ip(scope, headers))
+        if retry_after:
+            response = JSONResponse(
+                {"detail": "Trop de requêtes, réessayez plus tard"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+rate_limiter = RateLimiter(
+    rules=settings.RATE_LIMIT_RULES,
+    backend=settings.RATE_LIMIT_BACKEND,
+    ip_factor=settings.RATE_LIMIT_IP_FACTOR
+)
+
+
+async def _bench(backend_name: str, checks: int, keys: int):
+    backend = DatabaseBackend() if backend_name == "database" else MemoryBackend(max_keys=max(keys * 2, 100_000))
+    try:
+        started = time.perf_counter()
+        for i in range(checks):
+            await backend.take(f"bench:{i % keys}", 1e9, 1e9)
+        elapsed = time.perf_counter() - started
+        print(
+            f"✅ {backend.name}: {checks} vérifications sur {keys} clés en {elapsed:.3f}s "
+            f"({elapsed / checks * 1e6:.2f} µs/vérification, {checks / elapsed:,.0f}/s)"
+        )
+    finally:
+        if backend_name == "database":
+            async with engine.begin() as conn:
+                await conn.execute(delete(RateLimitBucket).where(RateLimitBucket.key.startswith("bench:")))
+            await engine.dispose()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.rate_limit", description="Rate limiter NutriAI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="mesure le coût d'une vérification de bucket")
+    bench.add_argument("--backend", choices=["memory", "database"], default="memory")
+    bench.add_argument("--checks", type=int, default=200_000)
+    bench.add_argument("--keys", type=int, default=10_000, help="nombre de buckets distincts (le coût doit rester constant)")
+    args = parser.parse_args(argv)
+    asyncio.run(_bench(args.backend, args.checks, args.keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, event, func, literal, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .database import engine
+from .events import meal_events
+from ..models.app_counter import AppCounter
+from ..models.meal import Meal
+from ..models.meal_daily_rollup import MealDailyRollup
+from ..models.user import User
+
+_COUNTERS = ("meal_count", "tokens_used", "cost_usd", "hedge_cost_usd")
+
+USERS_COUNTER = "users"
+
+
+def _upsert(dialect_name: str):
+    return pg_insert if dialect_name == "postgresql" else sqlite_insert
+
+
+def _totals_by_model(meals: Iterable[Meal]) -> Dict[str, List[float]]:
+    """model_used -> [meal_count, tokens_used, cost_usd, hedge_cost_usd]"""
+    per_model: Dict[str, List[float]] = {}
+    for meal in meals:
+        totals = per_model.setdefault(meal.model_used, [0, 0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += meal.tokens_used or 0
+        totals[2] += meal.cost_usd or 0.0
+        totals[3] += meal.hedge_cost_usd or 0.0
+    return per_model
+
+
+async def record_meals(db, meals: Iterable[Meal]) -> Optional[date]:
+    """
+    Ajoute des repas (pas encore commités) au rollup du jour, dans la même transaction.
+    Le jour est CURRENT_DATE côté base, comme le server_default de Meal.created_at,
+    pour rester cohérent avec le backfill qui groupe sur date(created_at).
+    Retourne ce jour, à passer à publish_meals (None si aucun repas).
+    """
+    per_model = _totals_by_model(meals)
+    if not per_model:
+        return None
+
+    insert = _upsert(db.get_bind().dialect.name)
+    day = None
+    # Ordre stable des lignes verrouillées : pas d'interblocage entre deux lots concurrents
+    for model in sorted(per_model):
+        stmt = insert(MealDailyRollup).values(
+            day=func.current_date(),
+            model_used=model,
+            **dict(zip(_COUNTERS, per_model[model]))
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MealDailyRollup.day, MealDailyRollup.model_used],
+            set_={c: getattr(MealDailyRollup, c) + getattr(stmt.excluded, c) for c in _COUNTERS}
+        ).returning(MealDailyRollup.day)
+        day = (await db.execute(stmt)).scalar_one()
+    return day
+
+
+async def forget_meal(db, meal_id: str):
+    """
+    Retire un repas (pas encore supprimé) du rollup de son jour, dans la même transaction :
+    le rollup reste égal à ce que `backfill` recalcule depuis `meals`.
+    """
+    meal = select(Meal).where(Meal.id == meal_id).subquery()
+    await db.execute(
+        update(MealDailyRollup)
+        .where(
+            MealDailyRollup.day == select(func.date(meal.c.created_at)).scalar_subquery(),
+            MealDailyRollup.model_used == select(meal.c.model_used).scalar_subquery(),
+        )
+        .values(
+            meal_count=MealDailyRollup.meal_count - 1,
+            tokens_used=MealDailyRollup.tokens_used - select(func.coalesce(meal.c.tokens_used, 0)).scalar_subquery(),
+            cost_usd=MealDailyRollup.cost_usd - select(func.coalesce(meal.c.cost_usd, 0.0)).scalar_subquery(),
+            hedge_cost_usd=MealDailyRollup.hedge_cost_usd - select(func.coalesce(meal.c.hedge_cost_usd, 0.0)).scalar_subquery(),
+        )
+    )
+
+
+def publish_meals(meals: Iterable[Meal], day: Optional[date]):
+    """
+    Publie le delta des repas commités pour les dashboards ouverts (GET /admin/stats/stream).
+    `day` : jour renvoyé par record_meals (horloge de la base), celui des lignes du rollup.
+    """
+    per_model = _totals_by_model(meals)
+    if not per_model or day is None:
+        return
+    meal_events.publish({
+        "type": "delta",
+        "date": day.isoformat(),
+        "models": [
+            {
+                "model": model,
+                "meals": int(count),
+                "tokens": int(tokens),
+                "cost_usd": round(cost, 6),
+                "hedge_cost_usd": round(hedge_cost, 6),
+            }
+            for model, (count, tokens, cost, hedge_cost) in sorted(per_model.items())
+        ],
+    })
+
+
+async def backfill(conn, since: Optional[date] = None) -> int:
+    """
+    Recalcule le rollup depuis `meals` (tout l'historique ou à partir de `since`).
+    Les lignes recalculées écrasent les existantes : la commande peut être rejouée.
+    """
+    day = func.date(Meal.created_at)
+    aggregate = select(
+        day,
+        Meal.model_used,
+        func.count(Meal.id),
+        func.coalesce(func.sum(Meal.tokens_used), 0),
+        func.coalesce(func.sum(Meal.cost_usd), 0.0),
+        func.coalesce(func.sum(Meal.hedge_cost_usd), 0.0),
+    ).where(true()).group_by(day, Meal.model_used)  # WHERE requis par SQLite pour INSERT ... SELECT ... ON CONFLICT
+    cleanup = delete(MealDailyRollup)
+    if since is not None:
+        aggregate = aggregate.where(Meal.created_at >= datetime.combine(since, time.min))
+        cleanup = cleanup.where(MealDailyRollup.day >= since)
+
+    await conn.execute(cleanup)
+    insert = _upsert(conn.dialect.name)
+    stmt = insert(MealDailyRollup).from_select(["day", "model_used", *_COUNTERS], aggregate)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MealDailyRollup.day, MealDailyRollup.model_used],
+        set_={c: getattr(stmt.excluded, c) for c in _COUNTERS}
+    )
+    result = await conn.execute(stmt)
+    return result.rowcount
+
+
+@event.listens_for(User, "after_insert")
+def _count_new_user(mapper, connection, target):
+    # Même transaction que l'INSERT : /admin/stats lit le total sans COUNT(*) sur users
+    connection.execute(
+        update(AppCounter).where(AppCounter.name == USERS_COUNTER).values(value=AppCounter.value + 1)
+    )
+
+
+@event.listens_for(User, "after_delete")
+def _count_deleted_user(mapper, connection, target):
+    connection.execute(
+        update(AppCounter).where(AppCounter.name == USERS_COUNTER).values(value=AppCounter.value - 1)
+    )
+
+
+async def user_count(db) -> int:
+    return (await db.execute(select(AppCounter.value).where(AppCounter.name == USERS_COUNTER))).scalar() or 0
+
+
+async def backfill_counters(conn):
+    """Recalcule les compteurs globaux depuis leurs tables (commande rejouable)"""
+    await conn.execute(delete(AppCounter).where(AppCounter.name == USERS_COUNTER))
+    await conn.execute(
+        AppCounter.__table__.insert().from_select(["name", "value"], select(literal(USERS_COUNTER), func.count(User.id)))
+    )
+
+
+async def _run_backfill(since: Optional[date]):
+    try:
+        async with engine.begin() as conn:
+            rows = await backfill(conn, since)
+            await backfill_counters(conn)
+        print(f"✅ Rollup recalculé ({rows} lignes jour × modèle, compteurs globaux)")
+    finally:
+        await engine.dispose()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.rollup", description="Rollup quotidien des repas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="recalcule meal_daily_rollup depuis la table meals")
+    fill.add_argument("--since", type=date.fromisoformat, default=None, help="premier jour à recalculer (AAAA-MM-JJ)")
+    args = parser.parse_args(argv)
+    asyncio.run(_run_backfill(args.since))
+
+
+if __name__ == "__main__":
+    main()
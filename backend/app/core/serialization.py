@@ -0,0 +1,110 @@
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from ..models.meal import Meal
+
+
+def meal_read(meal: Meal) -> Dict[str, Any]:
+    """Ligne `meals` -> dict au format MealRead, sans modèle pydantic intermédiaire"""
+    return {
+        "id": meal.id,
+        "user_id": meal.user_id,
+        "description": meal.description,
+        "calories": meal.calories,
+        "proteins": meal.proteins,
+        "carbs": meal.carbs,
+        "fats": meal.fats,
+        "fiber": meal.fiber,
+        "suggestions": meal.suggestions,
+        "created_at": meal.created_at.isoformat() if meal.created_at else "",
+    }
+
+
+def meal_analysis(meal: Meal, quota_remaining: int) -> Dict[str, Any]:
+    """Repas enregistré -> dict au format MealAnalysisResponse"""
+    return {
+        "meal_id": meal.id,
+        "description": meal.description,
+        "nutrition": {
+            "calories": meal.calories,
+            "proteins": meal.proteins,
+            "carbs": meal.carbs,
+            "fats": meal.fats,
+            "fiber": meal.fiber,
+            "suggestions": meal.suggestions,
+        },
+        "metadata": {
+            "model_used": meal.model_used,
+            "tokens_used": meal.tokens_used,
+            "cost_usd": meal.cost_usd,
+            "hedge_cost_usd": meal.hedge_cost_usd or 0.0,
+        },
+        "quota_remaining": quota_remaining,
+    }
+
+
+def trusted_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """
+    Données construites par le serveur depuis la base : renvoyées telles quelles.
+    Retourner une Response court-circuite la validation `response_model` de FastAPI
+    (qui reste déclarée pour la doc OpenAPI).
+    """
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def dumps(data: Any) -> str:
+    return orjson.dumps(data).decode()
+
+
+def _bench(count: int, rounds: int):
+    """Sérialisation de `count` repas : chemin pydantic + json vs dicts directs + orjson"""
+    from pydantic import TypeAdapter
+    from ..schemas.meal import MealRead
+
+    meals = [
+        Meal(
+            id=str(uuid.uuid4()), user_id="user_bench", description=f"Repas de test numéro {i}",
+            calories=520.0, proteins=32.5, carbs=48.0, fats=18.2, fiber=6.0,
+            suggestions=["Ajouter des légumes", "Réduire le sel"], model_used="openai/gpt-3.5-turbo",
+            tokens_used=412, cost_usd=0.00031, hedge_cost_usd=0.0, created_at=datetime.now(),
+        )
+        for i in range(count)
+    ]
+    adapter = TypeAdapter(List[MealRead])
+
+    def pydantic_path() -> bytes:
+        # Ancien chemin : MealRead par ligne, revalidé par response_model puis encodé
+        models = [MealRead(**meal_read(m)) for m in meals]
+        return json.dumps(adapter.dump_python(adapter.validate_python(models), mode="json")).encode()
+
+    def direct_path() -> bytes:
+        return orjson.dumps([meal_read(m) for m in meals])
+
+    for name, fn in (("pydantic + json", pydantic_path), ("dicts + orjson", direct_path)):
+        fn()
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        elapsed = (time.perf_counter() - started) / rounds
+        print(f"✅ {name}: {count} repas en {elapsed * 1000:.2f} ms ({elapsed / count * 1e6:.2f} µs/repas)")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.core.serialization", description="Sérialisation des réponses")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="compare les deux chemins de sérialisation de l'historique")
+    bench.add_argument("--meals", type=int, default=1000)
+    bench.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args(argv)
+    _bench(args.meals, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class Claim:
+    """
+    Part d'un résultat partagé à n'attribuer qu'une fois (ex: coût de l'appel amont) :
+    prise par le premier appelant qui l'utilise, rendue s'il échoue pour qu'un autre la prenne.
+    """
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.taken = False
+
+    def take(self) -> Optional[Any]:
+        if self.taken:
+            return None
+        self.taken = True
+        return self.value
+
+    def give_back(self):
+        self.taken = False
+
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents portant sur la même clé :
+    un seul appel amont est lancé, les autres attendent son résultat (ou son erreur).
+    L'appel amont tourne dans sa propre tâche, il n'est donc pas annulé si le
+    client qui l'a déclenché se déconnecte.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Retourne (résultat, leader) ; leader=False si le résultat est partagé"""
+        self.calls += 1
+        task = self._flights.get(key)
+        leader = task is None
+        if leader:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task), leader
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "upstream_calls_saved": self.coalesced,
+            "in_flight": len(self._flights),
+        }
+
+
+llm_singleflight = SingleFlight()
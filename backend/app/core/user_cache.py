@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from .config import get_settings
+from ..models.user import User
+
+settings = get_settings()
+
+_COLUMNS = [c.key for c in User.__table__.columns]
+
+
+class UserCache:
+    """
+    LRU en mémoire avec TTL des utilisateurs authentifiés, par ID Clerk (sub du token).
+    On garde un instantané des colonnes, rattaché à la session de la requête par
+    merge(load=False) : pas de SELECT. L'entrée est mise à jour quand le quota
+    bouge (reserve/refund) et invalidée quand le profil change. Les autres workers
+    ne voient ces changements qu'après le TTL ; le quota, lui, est toujours
+    appliqué en base.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Durée de get_current_user, selon que l'utilisateur venait du cache ou non
+        self.auth_hit_time = 0.0
+        self.auth_miss_time = 0.0
+
+    def _get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(user_id)
+        return snapshot
+
+    async def attach(self, db: AsyncSession, user_id: str) -> Optional[User]:
+        """Utilisateur en cache, rattaché à `db` sans requête ; None si absent ou expiré"""
+        if not settings.USER_CACHE_ENABLED:
+            return None
+        snapshot = self._get(user_id)
+        if snapshot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    def put(self, user: User):
+        """Mémorise l'état (commité) de `user`"""
+        if not settings.USER_CACHE_ENABLED:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, {c: getattr(user, c) for c in _COLUMNS})
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def record_auth(self, seconds: float, hit: bool):
+        if hit:
+            self.auth_hit_time += seconds
+        else:
+            self.auth_miss_time += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.USER_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "auth_avg_hit_ms": round(1000 * self.auth_hit_time / self.hits, 3) if self.hits else 0.0,
+            "auth_avg_miss_ms": round(1000 * self.auth_miss_time / self.misses, 3) if self.misses else 0.0,
+        }
+
+
+user_cache = UserCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
@@ -1,12 +1,22 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
 
 from .core.config import get_settings
-from .core.database import create_tables, engine
+from .core.database import engine
+from .core.migrations import upgrade, verify_schema
+from .core.llm_client import llm_client
+from .core.llm_guard import llm_guard
+from .core.nutrition_db import nutrition_db
+from .core.job_queue import job_queue
+from .core.rate_limit import RateLimitMiddleware
+from .core.clerk import clerk_client
+from .core.profile_sync import profile_sync
+from .core.static_pages import static_pages
+from .core import metrics
 from .models import User, Meal
 from .api.v1.endpoints import meals, admin, auth
 
@@ -16,18 +26,43 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Starting NutriAI API...")
-    create_tables()
-    print("✅ Database ready!")
+    if settings.METRICS_ENABLED:
+        metrics.instrument_engine(engine)
+    if settings.DB_AUTO_MIGRATE:
+        await upgrade()
+    version = await verify_schema()
+    print(f"✅ Database ready! (schéma v{version})")
+    if settings.LOCAL_NUTRITION_ENABLED:
+        nutrition_db.load()
+    await llm_client.start()
+    if settings.CLERK_SECRET_KEY:
+        await clerk_client.start()
+        await profile_sync.start()
+    await job_queue.start(handler=meals.run_analysis_job)
+    static_pages.load()
+    if settings.STATIC_PAGES_RELOAD:
+        await static_pages.start_watching()
     yield
     print("👋 Shutting down...")
+    await job_queue.stop()
+    await static_pages.stop_watching()
+    await profile_sync.stop()
+    await llm_client.close()
+    await clerk_client.close()
+    await engine.dispose()
 
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Sérialisation orjson pour toutes les routes JSON
+    default_response_class=ORJSONResponse
 )
 
+# Ajouté avant CORS : les réponses 429 passent aussi par CORSMiddleware
+app.add_middleware(RateLimitMiddleware)
+
 # CORS_ORIGINS est déjà parsé par le validateur (gère "*" et listes)
 app.add_middleware(
     CORSMiddleware,
@@ -35,8 +70,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "ETag"],
 )
 
+# Ajouté en dernier : englobe CORS et le rate limiter (les 429 sont mesurés)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(meals.router, prefix="/api/v1/meals", tags=["meals"])
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
@@ -47,28 +86,7 @@ if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Landing page par défaut"""
-    static_file = os.path.join(static_dir, "index.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content=f"<h1>NutriAI API</h1><p>Version {settings.VERSION}</p>")
-
-
-@app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(request: Request):
-    """Dashboard admin - Authentification requise"""
-    from .core.admin_auth import verify_admin_session, create_admin_session
-    from fastapi import Cookie
-    
-    admin_session = request.cookies.get("admin_session")
-    
-    # Vérifier si déjà authentifié
-    if not verify_admin_session(admin_session):
-        # Afficher page de login
-        login_html = """<!DOCTYPE html>
+ADMIN_LOGIN_HTML = """<!DOCTYPE html>
 <html lang="fr">
 <head>
     <meta charset="UTF-8">
@@ -215,15 +233,9 @@ async def admin_dashboard(request: Request):
     </script>
 </body>
 </html>"""
-        return HTMLResponse(content=login_html)
-    
-    # Afficher le dashboard
-    static_file = os.path.join(static_dir, "dashboard.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Ajouter bouton déconnexion avec style amélioré
-            logout_button = '''<div style="text-align:right; margin-bottom:15px;">
+
+# Bouton déconnexion ajouté au dashboard (une fois, au rendu de la page)
+LOGOUT_BUTTON = '''<div style="text-align:right; margin-bottom:15px;">
                 <a href="/api/v1/admin/logout" 
                    style="display:inline-block; padding:8px 16px; background:#e74c3c; color:white; text-decoration:none; border-radius:4px; font-weight:500; transition:background 0.3s;"
                    onmouseover="this.style.background='#c0392b'" 
@@ -231,63 +243,94 @@ async def admin_dashboard(request: Request):
                     🚪 Déconnexion
                 </a>
             </div>'''
-            content = content.replace('<header>', f'<header>{logout_button}')
-            return HTMLResponse(content=content)
-    return HTMLResponse(content="<h1>Dashboard non disponible</h1>", status_code=404)
+
+# Pages publiques : cache long + ETag ; pages admin : revalidation à chaque fois
+static_pages.register("index", "index.html")
+static_pages.register("pricing", "pricing.html")
+static_pages.register("legal", "legal.html")
+static_pages.register("privacy", "privacy.html")
+static_pages.register("cookies", "cookies.html")
+static_pages.register("admin_login", content=ADMIN_LOGIN_HTML, cache_control="private, no-cache")
+static_pages.register(
+    "dashboard", "dashboard.html",
+    cache_control="private, no-cache",
+    transform=lambda content: content.replace('<header>', f'<header>{LOGOUT_BUTTON}')
+)
+
+
+def _page(name: str, request: Request, missing: str = "<h1>Page non disponible</h1>") -> Response:
+    page = static_pages.get(name)
+    if page is None:
+        return HTMLResponse(content=missing, status_code=404)
+    return page.response(request)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    """Landing page par défaut"""
+    page = static_pages.get("index")
+    if page is None:
+        return HTMLResponse(content=f"<h1>NutriAI API</h1><p>Version {settings.VERSION}</p>")
+    return page.response(request)
+
+
+@app.get("/admin", response_class=HTMLResponse)
+async def admin_dashboard(request: Request):
+    """Dashboard admin - Authentification requise"""
+    from .core.admin_auth import verify_admin_session
+    
+    admin_session = request.cookies.get("admin_session")
+    
+    # Vérifier si déjà authentifié, sinon afficher la page de login
+    if not await verify_admin_session(admin_session):
+        return _page("admin_login", request)
+    
+    return _page("dashboard", request, missing="<h1>Dashboard non disponible</h1>")
 
 
 @app.get("/pricing", response_class=HTMLResponse)
-async def pricing_page():
+async def pricing_page(request: Request):
     """Page pricing"""
-    static_file = os.path.join(static_dir, "pricing.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Page non disponible</h1>", status_code=404)
+    return _page("pricing", request)
 
 
 @app.get("/landing", response_class=HTMLResponse)
 @app.get("/index", response_class=HTMLResponse)
-async def landing_page():
+async def landing_page(request: Request):
     """Landing page"""
-    static_file = os.path.join(static_dir, "index.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Page non disponible</h1>", status_code=404)
+    return _page("index", request)
 
 
 @app.get("/legal", response_class=HTMLResponse)
-async def legal_page():
+async def legal_page(request: Request):
     """Mentions légales"""
-    static_file = os.path.join(static_dir, "legal.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Page non disponible</h1>", status_code=404)
+    return _page("legal", request)
 
 
 @app.get("/privacy", response_class=HTMLResponse)
-async def privacy_page():
+async def privacy_page(request: Request):
     """Politique de confidentialité"""
-    static_file = os.path.join(static_dir, "privacy.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Page non disponible</h1>", status_code=404)
+    return _page("privacy", request)
 
 
 @app.get("/cookies", response_class=HTMLResponse)
-async def cookies_page():
+async def cookies_page(request: Request):
     """Politique des cookies"""
-    static_file = os.path.join(static_dir, "cookies.html")
-    if os.path.exists(static_file):
-        with open(static_file, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    return HTMLResponse(content="<h1>Page non disponible</h1>", status_code=404)
+    return _page("cookies", request)
 
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    # L'API reste "healthy" quand le LLM est dégradé : historique et auth fonctionnent
+    return {"status": "healthy", "llm": llm_guard.state()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Exposition Prometheus (compteurs du worker qui répond)"""
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
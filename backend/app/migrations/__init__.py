@@ -0,0 +1 @@
+# Migrations du schéma : un module vNNN_*.py par version (voir app/core/migrations.py)
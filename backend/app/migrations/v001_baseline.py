@@ -0,0 +1,48 @@
+"""Schéma initial : users et meals"""
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, JSON, MetaData, String, Table, func
+
+from ..core.migrations import create_tables
+
+VERSION = 1
+DESCRIPTION = "schéma initial (users, meals)"
+TRANSACTIONAL = True
+
+# Schéma figé d'avant les migrations : ne pas suivre les modèles, qui portent
+# déjà les colonnes et index ajoutés par les versions suivantes
+metadata = MetaData()
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", String, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("display_name", String, nullable=False),
+    Column("subscription", Enum("FREE", "PRO", "PREMIUM", name="subscriptiontier"), nullable=False),
+    Column("daily_quota", Integer, nullable=False),
+    Column("quota_used", Integer, nullable=False),
+    Column("quota_reset_date", DateTime(timezone=True), nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+meals = Table(
+    "meals",
+    metadata,
+    Column("id", String, primary_key=True, index=True),
+    Column("user_id", String, ForeignKey("users.id"), nullable=False, index=True),
+    Column("description", String, nullable=False),
+    Column("calories", Float, nullable=False),
+    Column("proteins", Float, nullable=False),
+    Column("carbs", Float, nullable=False),
+    Column("fats", Float, nullable=False),
+    Column("fiber", Float),
+    Column("suggestions", JSON, nullable=False),
+    Column("model_used", String, nullable=False),
+    Column("tokens_used", Integer, nullable=False),
+    Column("cost_usd", Float, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+async def upgrade(conn):
+    # Bases créées avant les migrations (create_all au démarrage) : tables déjà présentes
+    await create_tables(conn, users, meals)
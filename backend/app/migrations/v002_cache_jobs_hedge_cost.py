@@ -0,0 +1,14 @@
+"""Cache d'analyses, file de jobs et coût des requêtes de couverture"""
+from ..core.migrations import add_column, create_tables
+from ..models.analysis_cache import AnalysisCacheEntry
+from ..models.analysis_job import AnalysisJob
+
+VERSION = 2
+DESCRIPTION = "tables analysis_cache et analysis_jobs, colonne meals.hedge_cost_usd"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, AnalysisCacheEntry.__table__, AnalysisJob.__table__)
+    # create_all n'ajoute jamais de colonne à une table existante
+    await add_column(conn, "meals", "hedge_cost_usd", "FLOAT NOT NULL DEFAULT 0")
@@ -0,0 +1,15 @@
+"""Index des requêtes chaudes sur meals, construits sans bloquer les écritures"""
+from ..core.migrations import create_index
+
+VERSION = 3
+DESCRIPTION = "index meals.created_at, meals.model_used et (user_id, created_at DESC, id DESC)"
+# CREATE INDEX CONCURRENTLY (Postgres) ne peut pas tourner dans une transaction
+TRANSACTIONAL = False
+
+
+async def upgrade(conn):
+    # Stats admin : filtres par période et regroupements par modèle
+    await create_index(conn, "ix_meals_created_at", "meals", ["created_at"])
+    await create_index(conn, "ix_meals_model_used", "meals", ["model_used"])
+    # Historique paginé par curseur
+    await create_index(conn, "ix_meals_user_id_created_at_id", "meals", ["user_id", "created_at DESC", "id DESC"])
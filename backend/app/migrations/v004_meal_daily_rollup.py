@@ -0,0 +1,13 @@
+"""Rollup quotidien des repas pour les statistiques admin"""
+from ..core.migrations import create_tables
+from ..core.rollup import backfill
+from ..models.meal_daily_rollup import MealDailyRollup
+
+VERSION = 4
+DESCRIPTION = "table meal_daily_rollup (jour × modèle) et backfill depuis meals"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, MealDailyRollup.__table__)
+    await backfill(conn)
@@ -0,0 +1,11 @@
+"""Token buckets partagés du rate limiter"""
+from ..core.migrations import create_tables
+from ..models.rate_limit_bucket import RateLimitBucket
+
+VERSION = 5
+DESCRIPTION = "table rate_limit_buckets (backend partagé du rate limiter)"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, RateLimitBucket.__table__)
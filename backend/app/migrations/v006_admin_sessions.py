@@ -0,0 +1,11 @@
+"""Sessions admin partagées entre workers"""
+from ..core.migrations import create_tables
+from ..models.admin_session import AdminSession
+
+VERSION = 6
+DESCRIPTION = "table admin_sessions (sessions du dashboard avec expiration)"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, AdminSession.__table__)
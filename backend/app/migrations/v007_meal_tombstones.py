@@ -0,0 +1,11 @@
+"""Suppressions de repas visibles par la synchronisation incrémentale"""
+from ..core.migrations import create_tables
+from ..models.meal_tombstone import MealTombstone
+
+VERSION = 7
+DESCRIPTION = "table meal_tombstones (repas supprimés, delta sync mobile)"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, MealTombstone.__table__)
@@ -0,0 +1,13 @@
+"""Compteurs globaux pour les statistiques admin"""
+from ..core.migrations import create_tables
+from ..core.rollup import backfill_counters
+from ..models.app_counter import AppCounter
+
+VERSION = 8
+DESCRIPTION = "table app_counters (nombre d'utilisateurs) et backfill depuis users"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await create_tables(conn, AppCounter.__table__)
+    await backfill_counters(conn)
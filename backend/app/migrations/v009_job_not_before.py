@@ -0,0 +1,10 @@
+"""Report des jobs remis en file après un 503 (Retry-After)"""
+from ..core.migrations import add_column, is_postgres
+
+VERSION = 9
+DESCRIPTION = "colonne analysis_jobs.not_before (pas de réclamation avant Retry-After)"
+TRANSACTIONAL = True
+
+
+async def upgrade(conn):
+    await add_column(conn, "analysis_jobs", "not_before", "TIMESTAMP WITH TIME ZONE" if is_postgres(conn) else "DATETIME")
@@ -1,5 +1,11 @@
 from .user import User
 from .meal import Meal
+from .analysis_cache import AnalysisCacheEntry
+from .analysis_job import AnalysisJob, JobStatus
+from .meal_daily_rollup import MealDailyRollup
+from .rate_limit_bucket import RateLimitBucket
+from .admin_session import AdminSession
+from .meal_tombstone import MealTombstone
+from .app_counter import AppCounter
 
-__all__ = ["User", "Meal"]
-
+__all__ = ["User", "Meal", "AnalysisCacheEntry", "AnalysisJob", "JobStatus", "MealDailyRollup", "RateLimitBucket", "AdminSession", "MealTombstone", "AppCounter"]
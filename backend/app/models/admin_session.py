@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class AdminSession(Base):
+    """Session du dashboard admin, partagée entre workers (backend `database`)"""
+    __tablename__ = "admin_sessions"
+
+    # sha256 du cookie : un dump de la table ne donne pas de session utilisable
+    token_hash = Column(String, primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
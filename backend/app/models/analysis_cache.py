@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    # sha256(modèle + description normalisée)
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    normalized_description = Column(String, nullable=False)
+
+    calories = Column(Float, nullable=False)
+    proteins = Column(Float, nullable=False)
+    carbs = Column(Float, nullable=False)
+    fats = Column(Float, nullable=False)
+    fiber = Column(Float, default=0.0)
+    suggestions = Column(JSON, nullable=False)
+
+    # Coût de l'appel LLM d'origine (les hits ne coûtent rien)
+    tokens_used = Column(Integer, nullable=False)
+    cost_usd = Column(Float, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
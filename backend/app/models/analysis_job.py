@@ -0,0 +1,37 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+from datetime import datetime, timezone
+import enum
+from ..core.database import Base
+
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        # Réclamation des jobs : WHERE status = 'queued' ORDER BY created_at
+        Index("ix_analysis_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    description = Column(String, nullable=False)
+
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    meal_id = Column(String, ForeignKey("meals.id"), nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+
+    # Même horloge (applicative, UTC) que started_at / finished_at posés par la file ;
+    # server_default conservé pour les insertions hors ORM
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Remis en file après un 503 : pas de nouvelle tentative avant Retry-After
+    not_before = Column(DateTime(timezone=True), nullable=True)
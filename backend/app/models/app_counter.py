@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Integer
+from ..core.database import Base
+
+
+class AppCounter(Base):
+    """Compteur global tenu à jour dans la transaction des écritures qu'il compte"""
+    __tablename__ = "app_counters"
+
+    # "users" : nombre d'utilisateurs (dashboard admin)
+    name = Column(String, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
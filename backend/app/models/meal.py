@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..core.database import Base
@@ -18,11 +18,17 @@ class Meal(Base):
     fiber = Column(Float, default=0.0)
     suggestions = Column(JSON, nullable=False)
     
-    model_used = Column(String, nullable=False)
+    model_used = Column(String, nullable=False, index=True)
     tokens_used = Column(Integer, nullable=False)
     cost_usd = Column(Float, nullable=False)
+    # Coût estimé de la requête de couverture annulée (hedge)
+    hedge_cost_usd = Column(Float, default=0.0, nullable=False)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     
     user = relationship("User", back_populates="meals")
 
+
+# Historique paginé par curseur : WHERE user_id = ? AND (created_at, id) < (?, ?)
+# ORDER BY created_at DESC, id DESC => parcours d'index sans tri, quelle que soit la page
+Index("ix_meals_user_id_created_at_id", Meal.user_id, Meal.created_at.desc(), Meal.id.desc())
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Integer, Float, Date
+from ..core.database import Base
+
+
+class MealDailyRollup(Base):
+    """Agrégats par jour et par modèle, tenus à jour dans la transaction d'insertion des repas"""
+    __tablename__ = "meal_daily_rollup"
+
+    day = Column(Date, primary_key=True)
+    model_used = Column(String, primary_key=True)
+
+    meal_count = Column(Integer, default=0, nullable=False)
+    tokens_used = Column(Integer, default=0, nullable=False)
+    cost_usd = Column(Float, default=0.0, nullable=False)
+    hedge_cost_usd = Column(Float, default=0.0, nullable=False)
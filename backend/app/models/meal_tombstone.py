@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DateTime, Index
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class MealTombstone(Base):
+    """Trace d'un repas supprimé, pour la synchronisation incrémentale du cache mobile"""
+    __tablename__ = "meal_tombstones"
+
+    meal_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    # Même horloge que Meal.created_at (côté base) : un seul type de filigrane
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+# Delta : WHERE user_id = ? AND (deleted_at, meal_id) > (?, ?) ORDER BY deleted_at, meal_id
+Index("ix_meal_tombstones_user_id_deleted_at_meal_id", MealTombstone.user_id, MealTombstone.deleted_at, MealTombstone.meal_id)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, Boolean
+from ..core.database import Base
+
+
+class RateLimitBucket(Base):
+    """Token bucket partagé entre les workers (backend `database` du rate limiter)"""
+    __tablename__ = "rate_limit_buckets"
+
+    # "<règle>:user:<id>" ou "<règle>:ip:<adresse>"
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Horloge murale (time.time()) commune à tous les process
+    updated_at = Column(Float, nullable=False, index=True)
+    # Décision du dernier passage, renvoyée par l'UPSERT
+    allowed = Column(Boolean, nullable=False)
@@ -1,4 +1,11 @@
-from .meal import MealAnalysisRequest, MealAnalysisResponse, NutritionData, MealMetadata, MealRead
-
-__all__ = ["MealAnalysisRequest", "MealAnalysisResponse", "NutritionData", "MealMetadata", "MealRead"]
+from .meal import (
+    MealAnalysisRequest, MealAnalysisResponse, NutritionData, MealMetadata, MealRead,
+    MealBatchAnalysisRequest, MealBatchItemResult, MealBatchAnalysisResponse,
+    AnalysisJobAccepted, AnalysisJobRead,
+)
 
+__all__ = [
+    "MealAnalysisRequest", "MealAnalysisResponse", "NutritionData", "MealMetadata", "MealRead",
+    "MealBatchAnalysisRequest", "MealBatchItemResult", "MealBatchAnalysisResponse",
+    "AnalysisJobAccepted", "AnalysisJobRead",
+]
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import Optional
 
 
 class MealAnalysisRequest(BaseModel):
@@ -18,6 +19,7 @@ class MealMetadata(BaseModel):
     model_used: str
     tokens_used: int
     cost_usd: float
+    hedge_cost_usd: float = 0.0
 
 
 class MealAnalysisResponse(BaseModel):
@@ -28,6 +30,40 @@ class MealAnalysisResponse(BaseModel):
     quota_remaining: int
 
 
+class MealBatchAnalysisRequest(BaseModel):
+    items: list[MealAnalysisRequest] = Field(..., min_length=1, max_length=20)
+
+
+class MealBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    result: Optional[MealAnalysisResponse] = None
+    error: Optional[str] = None
+
+
+class MealBatchAnalysisResponse(BaseModel):
+    results: list[MealBatchItemResult]
+    succeeded: int
+    failed: int
+    quota_remaining: int
+
+
+class AnalysisJobAccepted(BaseModel):
+    job_id: str
+    status: str
+    quota_remaining: int
+
+
+class AnalysisJobRead(BaseModel):
+    job_id: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[MealAnalysisResponse] = None
+    created_at: str
+    finished_at: Optional[str] = None
+
+
 class MealRead(BaseModel):
     id: str
     user_id: str
@@ -43,3 +79,11 @@ class MealRead(BaseModel):
     class Config:
         from_attributes = True
 
+
+class MealPage(BaseModel):
+    """Page d'historique paginée par curseur (keyset, plus récents d'abord)"""
+    items: list[MealRead]
+    next_cursor: Optional[str] = Field(
+        default=None,
+        description="Curseur opaque à repasser en `cursor` pour la page suivante ; null sur la dernière page"
+    )
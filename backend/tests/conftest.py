@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+
+# Base SQLite jetable, avant tout import de l'application (settings lus à l'import)
+_db_dir = tempfile.mkdtemp(prefix="nutriai-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["CLERK_SECRET_KEY"] = ""
+
+import pytest
+from sqlalchemy import event
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from app.core.database import engine
+from app.core.migrations import upgrade
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite n'applique les clés étrangères qu'à la demande : même comportement que Postgres
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def schema():
+    await upgrade(engine)
+    yield
+    await engine.dispose()
+
+
+class SigningKey:
+    """Clé RSA de test et son JWK public, pour signer des tokens « Clerk »"""
+
+    def __init__(self, kid: str):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = kid
+        self.private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+        self.public_jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+
+    def token(self, sub: str = "user_test", ttl: int = 60, **claims) -> str:
+        now = int(time.time())
+        payload = {"sub": sub, "iat": now, "nbf": now, "exp": now + ttl, **claims}
+        return jwt.encode(payload, self.private_pem, algorithm="RS256", headers={"kid": self.kid})
+
+
+@pytest.fixture(scope="session")
+def signing_key() -> SigningKey:
+    return SigningKey("test-key-1")
+
+
+@pytest.fixture(scope="session")
+def rotated_key() -> SigningKey:
+    return SigningKey("test-key-2")
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import rate_limit
+from app.core.admin_auth import AdminSessionStore, _hash, settings
+from app.main import app
+
+BACKENDS = ("memory", "database")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_session_is_valid_until_revoked(backend):
+    store = AdminSessionStore(backend, ttl=60, purge_interval=600)
+    token = await store.create()
+    assert await store.verify(token)
+    assert not await store.verify(token + "x")
+    assert not await store.verify(None)
+
+    await store.delete(token)
+    assert not await store.verify(token)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_expired_session_is_rejected(backend):
+    store = AdminSessionStore(backend, ttl=-1, purge_interval=600)  # expirée dès sa création
+    token = await store.create()
+    assert not await store.verify(token)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_expired_sessions_are_purged(backend):
+    store = AdminSessionStore(backend, ttl=60, purge_interval=0)  # purge à chaque vérification
+    await store.backend.add(_hash("expired"), -1)
+    live = await store.create()
+
+    assert await store.verify(live)
+    assert store.purged >= 1
+    assert await store.backend.purge() == 0
+    assert await store.verify(live)
+
+
+async def test_logout_revokes_session_server_side():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        login = await client.post("/api/v1/admin/login", json={"password": settings.ADMIN_PASSWORD})
+        assert login.status_code == 200
+        token = login.cookies["admin_session"]
+        client.cookies.clear()
+        cookie = {"Cookie": f"admin_session={token}"}
+
+        assert (await client.get("/api/v1/admin/sessions", headers=cookie)).status_code == 200
+        assert (await client.get("/api/v1/admin/logout", headers=cookie)).status_code == 303
+        # Cookie rejoué après déconnexion : la session n'existe plus côté serveur
+        assert (await client.get("/api/v1/admin/sessions", headers=cookie)).status_code == 401
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_concurrent_logins_expire_and_revoke_independently(backend):
+    store = AdminSessionStore(backend, ttl=60, purge_interval=0)
+    short = AdminSessionStore(backend, ttl=-1, purge_interval=600)  # même table, sessions déjà expirées
+    await store.backend.purge()
+    before = await store.backend.count()
+    tokens = await asyncio.gather(*(store.create() for _ in range(20)))
+    expired = await asyncio.gather(*(short.create() for _ in range(5)))
+    assert len(set(tokens)) == 20
+
+    revoked, kept = tokens[:10], tokens[10:]
+    # Révocations et vérifications entrelacées
+    await asyncio.gather(*(store.delete(t) for t in revoked), *(store.verify(t) for t in kept))
+
+    assert not any(await asyncio.gather(*(store.verify(t) for t in revoked)))
+    assert all(await asyncio.gather(*(store.verify(t) for t in kept)))
+    assert not any(await asyncio.gather(*(store.verify(t) for t in expired)))
+    # Expirées purgées, révoquées supprimées : il ne reste que les sessions gardées
+    assert await store.backend.count() == before + len(kept)
+
+
+async def test_concurrent_admin_logins_get_distinct_sessions(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_ENABLED", False)  # 5 connexions / min par IP
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        logins = await asyncio.gather(*(
+            client.post("/api/v1/admin/login", json={"password": settings.ADMIN_PASSWORD}) for _ in range(5)
+        ))
+        tokens = [login.cookies["admin_session"] for login in logins]
+        client.cookies.clear()
+        assert len(set(tokens)) == 5
+
+        logout = {"Cookie": f"admin_session={tokens[0]}"}
+        assert (await client.get("/api/v1/admin/logout", headers=logout)).status_code == 303
+        statuses = await asyncio.gather(*(
+            client.get("/api/v1/admin/sessions", headers={"Cookie": f"admin_session={t}"}) for t in tokens
+        ))
+    # Seule la session déconnectée est révoquée
+    assert [s.status_code for s in statuses] == [401, 200, 200, 200, 200]
@@ -0,0 +1,174 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.api.v1.endpoints import meals
+from app.core import rate_limit
+from app.core.database import SessionLocal
+from app.core.singleflight import Claim
+from app.core.user_cache import user_cache
+from app.main import app
+from app.models.user import User
+
+DEV_USER = "temp_user_dev"  # utilisateur du mode sans Clerk
+
+
+@pytest.fixture(autouse=True)
+async def fresh_quota():
+    """Quota du développeur remis à zéro : les tests d'analyse en consomment"""
+    async with SessionLocal() as db:
+        await db.execute(update(User).where(User.id == DEV_USER).values(quota_used=0))
+        await db.commit()
+    user_cache.invalidate(DEV_USER)
+
+
+def _completion(model: str):
+    return {"usage": {"prompt_tokens": 100, "completion_tokens": 50}, "model": model, "hedge_cost_usd": 0.0}
+
+
+NUTRITION = {"calories": 500, "proteins": 20, "carbs": 60, "fats": 15, "fiber": 4, "suggestions": ["ok"]}
+
+
+async def _analyze(client: httpx.AsyncClient, description: str) -> httpx.Response:
+    return await client.post("/api/v1/meals/analyze", json={"description": description})
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_cache_entry_is_labelled_with_the_answering_model(monkeypatch):
+    async def call_llm(description):
+        return dict(NUTRITION), _completion("model/backup")
+
+    monkeypatch.setattr(meals, "_call_llm", call_llm)
+    description = f"plat inconnu {uuid.uuid4()}"
+    async with _client() as client:
+        first = (await _analyze(client, description)).json()
+        second = (await _analyze(client, description)).json()
+    assert first["metadata"]["model_used"] == "model/backup"
+    # Réponse d'un modèle de secours : ni rangée ni présentée sous le modèle principal
+    assert second["metadata"]["model_used"] == "cache:model/backup"
+    assert second["metadata"]["cost_usd"] == 0.0
+
+
+async def _quota_used() -> int:
+    async with SessionLocal() as db:
+        return (await db.get(User, DEV_USER)).quota_used
+
+
+async def test_stream_refunds_when_client_leaves_before_first_event():
+    async with _client() as client:
+        await client.get("/api/v1/auth/me")  # crée l'utilisateur de développement
+    body = b'{"description": "2 oeufs"}'
+    messages = [{"type": "http.request", "body": body, "more_body": False}, {"type": "http.disconnect"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        await asyncio.sleep(0)  # écriture réseau : point de suspension, comme sous uvicorn
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/v1/meals/analyze/stream", "raw_path": b"/api/v1/meals/analyze/stream",
+        "query_string": b"", "root_path": "", "server": ("test", 80), "client": ("127.0.0.1", 5000),
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    # Déconnexion avant que le corps ne soit itéré : le générateur ne démarre jamais
+    await app(scope, receive, send)
+    assert not any(m["type"] == "http.response.body" and m.get("body") for m in sent)
+    assert await _quota_used() == 0
+
+
+async def test_completed_stream_keeps_its_reservation():
+    async with _client() as client:
+        response = await client.post("/api/v1/meals/analyze/stream", json={"description": "2 oeufs"})
+    assert "event: done" in response.text
+    assert await _quota_used() == 1
+
+
+async def test_shared_call_cost_goes_to_a_follower_when_the_leader_leaves(monkeypatch):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = 0
+
+    async def call_llm(description):
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return dict(NUTRITION), _completion("model/a")
+
+    monkeypatch.setattr(meals, "_call_llm", call_llm)
+    description = f"plat partagé {uuid.uuid4()}"
+    async with _client() as client:
+        leader = asyncio.create_task(_analyze(client, description))
+        await started.wait()
+        follower = asyncio.create_task(_analyze(client, description))
+        await asyncio.sleep(0.05)  # le second client rejoint l'appel en cours
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        release.set()
+        shared = (await follower).json()
+        cached = (await _analyze(client, description)).json()
+
+    assert calls == 1
+    # Le client parti n'a rien sauvegardé : le repas du suivant porte le coût de l'appel
+    assert shared["metadata"]["cost_usd"] > 0
+    assert shared["metadata"]["tokens_used"] == 150
+    # ... et l'écriture du cache
+    assert cached["metadata"]["model_used"] == "cache:model/a"
+
+
+def test_charge_returned_after_failed_save_goes_to_the_next_meal():
+    charge = Claim({"cost_usd": 0.01, "cache_key": "k"})
+    first = {"charge": charge, "cache_key": None, "cost_usd": 0.0}
+    second = {"charge": charge, "cache_key": None, "cost_usd": 0.0}
+    meals._take_charge(first)
+    meals._take_charge(second)
+    assert (first["cost_usd"], second["cost_usd"]) == (0.01, 0.0)
+    meals._return_charge(first)  # sauvegarde du premier ratée
+    meals._take_charge(second)
+    assert (first["cost_usd"], second["cost_usd"]) == (0.0, 0.01)
+
+
+async def test_parallel_analyses_reserve_and_refund_exactly(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_ENABLED", False)
+    calls = 0
+
+    async def call_llm(description):
+        nonlocal calls
+        calls += 1
+        failing = calls % 2 == 0
+        await asyncio.sleep(0.01)  # toutes les réservations passent avant le premier remboursement
+        if failing:
+            raise HTTPException(status_code=502, detail="LLM indisponible")
+        return dict(NUTRITION), _completion("model/a")
+
+    monkeypatch.setattr(meals, "_call_llm", call_llm)
+    async with SessionLocal() as db:
+        daily_quota = (await db.get(User, DEV_USER)).daily_quota
+        await db.execute(update(User).where(User.id == DEV_USER).values(daily_quota=4))
+        await db.commit()
+    user_cache.invalidate(DEV_USER)
+    try:
+        async with _client() as client:
+            responses = await asyncio.gather(*(_analyze(client, f"plat {uuid.uuid4()}") for _ in range(12)))
+        codes = [r.status_code for r in responses]
+        assert set(codes) <= {200, 429, 502}
+        assert 0 < codes.count(200) <= 4
+        assert codes.count(502) == calls - codes.count(200)
+        # Chaque échec LLM rend sa réservation, chaque repas sauvegardé garde la sienne
+        assert await _quota_used() == codes.count(200)
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(update(User).where(User.id == DEV_USER).values(daily_quota=daily_quota))
+            await db.commit()
+        user_cache.invalidate(DEV_USER)
@@ -0,0 +1,102 @@
+import json
+
+import httpx
+import pytest
+from jose import JWTError
+
+from app.core import auth, clerk, rate_limit
+from app.core.clerk import ClerkClient, JWKSUnavailable
+from app.main import app
+
+from .conftest import SigningKey
+
+
+def _write_jwks(path, *keys):
+    path.write_text(json.dumps({"keys": [key.public_jwk for key in keys]}), encoding="utf-8")
+
+
+@pytest.fixture
+def jwks_file(tmp_path, monkeypatch):
+    path = tmp_path / "jwks.json"
+    monkeypatch.setattr(clerk.settings, "CLERK_JWKS_URL", f"file://{path}")
+    monkeypatch.setattr(clerk.settings, "CLERK_JWT_LEEWAY", 0)
+    return path
+
+
+async def _loaded_client(jwks_file, *keys) -> ClerkClient:
+    _write_jwks(jwks_file, *keys)
+    client = ClerkClient()
+    assert await client.refresh_jwks()
+    return client
+
+
+async def test_valid_token_is_verified_locally(jwks_file, signing_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    claims = await client.verify(signing_key.token(sub="user_ok", email="ok@nutriai.app"))
+    assert claims["sub"] == "user_ok"
+    assert client.jwks_refreshes == 1
+
+
+async def test_rotated_kid_triggers_one_refresh(jwks_file, signing_key, rotated_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    _write_jwks(jwks_file, signing_key, rotated_key)
+    client._last_refresh_attempt = 0.0  # dernier rechargement plus ancien que MIN_REFRESH_INTERVAL
+
+    claims = await client.verify(rotated_key.token(sub="user_rotated"))
+    assert claims["sub"] == "user_rotated"
+    assert client.jwks_refreshes == 2
+
+
+async def test_unknown_kid_refresh_is_rate_limited(jwks_file, signing_key, rotated_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    # Rechargement à l'instant : un kid inconnu ne relance pas d'appel JWKS
+    for _ in range(3):
+        with pytest.raises(JWTError):
+            await client.verify(rotated_key.token())
+    assert client.jwks_refreshes == 1
+    assert client.rejected == 3
+
+
+async def test_expired_token_is_rejected(jwks_file, signing_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    with pytest.raises(JWTError):
+        await client.verify(signing_key.token(ttl=-30))
+
+
+async def test_token_signed_by_another_key_is_rejected(jwks_file, signing_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    # Même kid que la clé publiée, signature d'une autre clé
+    forged = SigningKey(signing_key.kid).token(sub="user_forged")
+    with pytest.raises(JWTError):
+        await client.verify(forged)
+
+
+async def test_no_keys_loaded_is_unavailable(jwks_file, signing_key):
+    client = ClerkClient()
+    assert not await client.refresh_jwks()  # fichier JWKS absent
+    client._last_refresh_attempt = 0.0
+    with pytest.raises(JWKSUnavailable):
+        await client.verify(signing_key.token())
+
+
+async def _get_me(monkeypatch, client: ClerkClient, token: str) -> httpx.Response:
+    monkeypatch.setattr(auth.settings, "CLERK_SECRET_KEY", "sk_test")
+    monkeypatch.setattr(auth, "clerk_client", client)
+    monkeypatch.setattr(rate_limit, "clerk_client", client)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+
+async def test_expired_token_gets_401(monkeypatch, jwks_file, signing_key):
+    client = await _loaded_client(jwks_file, signing_key)
+    response = await _get_me(monkeypatch, client, signing_key.token(ttl=-30))
+    assert response.status_code == 401
+
+
+async def test_unavailable_jwks_gets_503(monkeypatch, jwks_file, signing_key):
+    client = ClerkClient()
+    client._last_refresh_attempt = 0.0
+    response = await _get_me(monkeypatch, client, signing_key.token())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(int(ClerkClient.MIN_REFRESH_INTERVAL))
@@ -0,0 +1,118 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.api.v1.endpoints import meals as meals_module
+from app.core import job_queue as job_queue_module
+from app.core.database import SessionLocal
+from app.core.job_queue import JobQueue
+from app.models.analysis_job import AnalysisJob, JobStatus
+from app.models.user import SubscriptionTier, User
+
+
+async def _new_user() -> str:
+    user_id = f"jobs_{uuid.uuid4()}"
+    async with SessionLocal() as db:
+        db.add(User(
+            id=user_id, email=f"{user_id}@nutriai.app", display_name="Test", subscription=SubscriptionTier.FREE,
+            daily_quota=10, quota_used=1, quota_reset_date=datetime.now()
+        ))
+        await db.commit()
+    return user_id
+
+
+async def _upstream_unavailable(db, description):
+    raise HTTPException(status_code=503, detail="OpenRouter indisponible", headers={"Retry-After": "30"})
+
+
+async def test_worker_survives_database_errors(monkeypatch):
+    monkeypatch.setattr(job_queue_module.settings, "JOB_POLL_INTERVAL", 0.01)
+    queue = JobQueue()
+    queue._wakeup = asyncio.Event()
+    queue._last_requeue = time.monotonic()
+    calls = []
+
+    async def flaky_claim():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise ConnectionError("connexion perdue")
+        return None
+
+    monkeypatch.setattr(queue, "_claim", flaky_claim)
+    worker = asyncio.create_task(queue._worker())
+    try:
+        await asyncio.sleep(0.2)
+        assert not worker.done()
+        assert len(calls) > 2
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+
+async def test_wait_does_not_spin_after_a_retried_attempt():
+    queue = JobQueue()
+    queue._events["job"] = asyncio.Event()
+    # Fin d'une tentative échouée puis remise en file : une seule notification
+    queue._events["job"].set()
+
+    started = time.monotonic()
+    await queue.wait("job", timeout=1.0)
+    assert time.monotonic() - started < 0.1
+
+    started = time.monotonic()
+    await queue.wait("job", timeout=0.2)
+    assert time.monotonic() - started >= 0.19
+
+
+async def _queued_job(queue: JobQueue, delay: float) -> str:
+    async with SessionLocal() as db:
+        job = AnalysisJob(id=str(uuid.uuid4()), user_id=await _new_user(), description="Salade",
+                          status=JobStatus.RUNNING, attempts=1)
+        db.add(job)
+        await db.commit()
+        await queue.retry(db, job, "OpenRouter indisponible", delay=delay)
+        return job.id
+
+
+async def test_retry_after_delays_the_claim_without_holding_a_worker(monkeypatch):
+    monkeypatch.setattr(meals_module, "_run_analysis", _upstream_unavailable)
+    queue = JobQueue()
+    monkeypatch.setattr(meals_module, "job_queue", queue)
+    user_id = await _new_user()
+    async with SessionLocal() as db:
+        db.add(AnalysisJob(id=(job_id := str(uuid.uuid4())), user_id=user_id, description="Salade",
+                           status=JobStatus.RUNNING, attempts=1))
+        await db.commit()
+
+    started = time.monotonic()
+    await meals_module.run_analysis_job(job_id)
+    # Remis en file aussitôt, sans dormir Retry-After dans le worker
+    assert time.monotonic() - started < 1.0
+    async with SessionLocal() as db:
+        job = await db.get(AnalysisJob, job_id)
+        assert job.status == JobStatus.QUEUED
+        assert job.not_before is not None
+    assert queue.retried == 1
+
+
+async def test_claim_skips_jobs_until_not_before():
+    queue = JobQueue()
+    delayed = await _queued_job(queue, delay=60)
+    ready = await _queued_job(queue, delay=0)
+
+    claimed = []
+    while (job_id := await queue._claim()) is not None:
+        claimed.append(job_id)
+    assert ready in claimed
+    assert delayed not in claimed
+
+    async with SessionLocal() as db:
+        await db.execute(update(AnalysisJob).where(AnalysisJob.id == delayed).values(
+            not_before=datetime.now(timezone.utc) - timedelta(seconds=1)
+        ))
+        await db.commit()
+    assert await queue._claim() == delayed
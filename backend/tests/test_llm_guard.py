@@ -0,0 +1,48 @@
+from app.core.llm_guard import AdaptiveLimiter
+
+
+def _limiter(initial: int = 16) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        initial=initial, minimum=2, maximum=64, latency_target=1.0, queue_timeout=0.1,
+        latency_window=10, latency_percentile=0.9,
+    )
+
+
+async def _call(limiter: AdaptiveLimiter, latency_s: float, ok: bool = True):
+    await limiter.acquire()
+    limiter.release(latency_s, ok)
+
+
+async def test_isolated_slow_successes_do_not_cut_the_limit():
+    limiter = _limiter()
+    for i in range(30):
+        await _call(limiter, 5.0 if i % 10 == 0 else 0.2)  # 1 appel lent sur 10
+    assert limiter.limit >= 16
+    assert limiter.latency_decreases == 0
+
+
+async def test_sustained_slowness_halves_once_per_window():
+    limiter = _limiter()
+    for _ in range(9):
+        await _call(limiter, 5.0)
+    assert limiter.limit == 16  # fenêtre pas encore pleine
+    await _call(limiter, 5.0)
+    assert limiter.limit == 8
+    for _ in range(9):
+        await _call(limiter, 5.0)
+    assert limiter.limit == 8  # fenêtre vidée après la baisse
+    assert limiter.latency_decreases == 1
+
+
+async def test_upstream_error_halves_immediately():
+    limiter = _limiter()
+    await _call(limiter, 0.2, ok=False)
+    assert limiter.limit == 8
+
+
+async def test_cancelled_call_leaves_limit_unchanged():
+    limiter = _limiter()
+    await limiter.acquire()
+    limiter.release(5.0, None)
+    assert limiter.limit == 16
+    assert limiter.inflight == 0
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.core import llm_router as llm_router_module
+from app.core.llm_router import LLMRouter, parse_model_specs
+
+
+async def test_cancelled_caller_cancels_primary_during_hedge_delay(monkeypatch):
+    monkeypatch.setattr(llm_router_module.settings, "ROUTER_HEDGING_ENABLED", True)
+    router = LLMRouter(parse_model_specs(["model/a", "model/b"]))
+    monkeypatch.setattr(router, "hedge_delay", lambda route: 10.0)
+    primary_cancelled = asyncio.Event()
+
+    async def slow_call(route, payload):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+
+    monkeypatch.setattr(router, "_call", slow_call)
+    caller = asyncio.create_task(router.complete({"messages": []}))
+    await asyncio.sleep(0.05)
+    caller.cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+    await asyncio.wait_for(primary_cancelled.wait(), timeout=1.0)
+
+
+async def test_cancelled_hedge_loser_is_not_a_latency_sample(monkeypatch):
+    monkeypatch.setattr(llm_router_module.settings, "ROUTER_HEDGING_ENABLED", True)
+    router = LLMRouter(parse_model_specs(["model/slow", "model/fast"]))
+    monkeypatch.setattr(router, "hedge_delay", lambda route: 0.01)
+
+    async def chat_completion(payload):
+        if payload["model"] == "model/slow":
+            await asyncio.sleep(60)
+        return {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+    monkeypatch.setattr(llm_router_module.llm_client, "chat_completion", chat_completion)
+    _, model, _ = await router.complete({"messages": []})
+    await asyncio.sleep(0)  # le perdant traite son annulation
+    slow, fast = router.routes
+    assert model == "model/fast"
+    # Durée du perdant annulé = borne basse : elle ne doit pas raccourcir les délais de hedge
+    assert len(slow.latencies) == 0
+    assert slow.cancelled == 1
+    assert len(fast.latencies) == 1
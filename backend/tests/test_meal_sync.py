@@ -0,0 +1,144 @@
+import uuid
+from datetime import datetime
+
+import httpx
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal
+from app.core.meal_sync import SyncCursor, delete_meal, delta
+from app.core.rollup import backfill, record_meals
+from app.main import app
+from app.models.analysis_job import AnalysisJob, JobStatus
+from app.models.meal import Meal
+from app.models.meal_daily_rollup import MealDailyRollup
+from app.models.meal_tombstone import MealTombstone
+from app.models.user import SubscriptionTier, User
+
+DEV_USER = "temp_user_dev"  # utilisateur du mode sans Clerk
+
+
+async def _ensure_user(db, user_id: str):
+    if await db.get(User, user_id) is None:
+        db.add(User(
+            id=user_id, email=f"{user_id}@nutriai.app", display_name="Test", subscription=SubscriptionTier.FREE,
+            daily_quota=10, quota_used=0, quota_reset_date=datetime.now()
+        ))
+        await db.flush()
+
+
+async def _add_meal(db, user_id: str, model: str = "test/model") -> Meal:
+    await _ensure_user(db, user_id)
+    meal = Meal(
+        id=str(uuid.uuid4()), user_id=user_id, description="Salade", calories=300.0, proteins=10.0,
+        carbs=20.0, fats=15.0, fiber=5.0, suggestions=[], model_used=model,
+        tokens_used=100, cost_usd=0.01, hedge_cost_usd=0.0
+    )
+    db.add(meal)
+    await record_meals(db, [meal])
+    await db.commit()
+    await db.refresh(meal)
+    return meal
+
+
+async def _rollup_count(db, model: str) -> int:
+    return (await db.execute(
+        select(func.coalesce(func.sum(MealDailyRollup.meal_count), 0)).where(MealDailyRollup.model_used == model)
+    )).scalar()
+
+
+async def _delete(meal_id: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.delete(f"/api/v1/meals/{meal_id}")
+
+
+async def test_delete_meal_produced_by_async_job():
+    model = f"test/{uuid.uuid4()}"
+    async with SessionLocal() as db:
+        meal = await _add_meal(db, DEV_USER, model)
+        job = AnalysisJob(id=str(uuid.uuid4()), user_id=DEV_USER, description="Salade",
+                          status=JobStatus.SUCCEEDED, meal_id=meal.id)
+        db.add(job)
+        await db.commit()
+        assert await _rollup_count(db, model) == 1
+
+    response = await _delete(meal.id)
+    assert response.status_code == 204
+    assert (await _delete(meal.id)).status_code == 404
+
+    async with SessionLocal() as db:
+        assert await db.get(Meal, meal.id) is None
+        assert (await db.get(AnalysisJob, job.id)).meal_id is None
+        assert await db.get(MealTombstone, meal.id) is not None
+        assert await _rollup_count(db, model) == 0
+
+
+async def test_delete_keeps_rollup_equal_to_backfill():
+    model = f"test/{uuid.uuid4()}"
+    async with SessionLocal() as db:
+        await _add_meal(db, DEV_USER, model)
+        removed = await _add_meal(db, DEV_USER, model)
+    assert (await _delete(removed.id)).status_code == 204
+
+    async with SessionLocal() as db:
+        live = await _rollup_count(db, model)
+    async with SessionLocal() as db:
+        await backfill(await db.connection())
+        await db.commit()
+        assert await _rollup_count(db, model) == live == 1
+
+
+async def test_delete_other_users_meal_is_not_found():
+    async with SessionLocal() as db:
+        meal = await _add_meal(db, f"user_{uuid.uuid4()}")
+    assert (await _delete(meal.id)).status_code == 404
+
+
+async def test_delta_reports_new_meals_and_deletions():
+    user_id = f"user_{uuid.uuid4()}"
+    async with SessionLocal() as db:
+        first = await _add_meal(db, user_id)
+        page = await delta(db, user_id, None, limit=100)
+    assert [row[0] for row in page["meals"]] == [first.id]
+    cursor = SyncCursor.decode(page["cursor"])
+
+    async with SessionLocal() as db:
+        second = await _add_meal(db, user_id)
+        assert await delete_meal(db, user_id, first.id)
+        await db.commit()
+        page = await delta(db, user_id, cursor, limit=100)
+    assert second.id in [row[0] for row in page["meals"]]
+    assert first.id not in [row[0] for row in page["meals"]]
+    assert page["deleted"] == [first.id]
+    assert not page["has_more"]
+
+
+async def test_history_pages_carry_the_cursor_in_the_body():
+    async with SessionLocal() as db:
+        for _ in range(3):
+            await _add_meal(db, DEV_USER)
+        total = (await db.execute(select(func.count(Meal.id)).where(Meal.user_id == DEV_USER))).scalar()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        seen, cursor, pages = [], None, 0
+        while True:
+            pages += 1
+            params = {"limit": total // 3 + 1, **({"cursor": cursor} if cursor else {})}
+            response = await client.get("/api/v1/meals/page", params=params)
+            assert response.status_code == 200, response.text
+            page = response.json()
+            seen += [meal["id"] for meal in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        mixed = await client.get("/api/v1/meals/", params={"cursor": cursor or "x", "skip": 2})
+        schema = (await client.get("/openapi.json")).json()
+
+    assert len(seen) == len(set(seen)) == total
+    assert pages > 1
+    # OFFSET et keyset ne se combinent pas
+    assert mixed.status_code == 400
+    assert "next_cursor" in schema["components"]["schemas"]["MealPage"]["properties"]
+    skip = next(p for p in schema["paths"]["/api/v1/meals/"]["get"]["parameters"] if p["name"] == "skip")
+    assert skip["deprecated"]
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.migrations import latest_version, upgrade
+
+
+def _meals_schema(sync_conn):
+    inspector = inspect(sync_conn)
+    columns = {c["name"] for c in inspector.get_columns("meals")}
+    indexes = {i["name"] for i in inspector.get_indexes("meals")}
+    return columns, indexes
+
+
+async def test_baseline_is_pre_series_schema(tmp_path):
+    db_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/baseline.db")
+    try:
+        assert await upgrade(db_engine, target=1) == 1
+        async with db_engine.connect() as conn:
+            columns, indexes = await conn.run_sync(_meals_schema)
+        # Ajoutés par les migrations suivantes, pas par v001
+        assert "hedge_cost_usd" not in columns
+        assert "ix_meals_user_id_created_at_id" not in indexes
+
+        assert await upgrade(db_engine) == latest_version()
+        async with db_engine.connect() as conn:
+            columns, indexes = await conn.run_sync(_meals_schema)
+        assert "hedge_cost_usd" in columns
+        assert {"ix_meals_user_id_created_at_id", "ix_meals_created_at", "ix_meals_model_used"} <= indexes
+    finally:
+        await db_engine.dispose()
@@ -0,0 +1,23 @@
+import pytest
+
+from app.core.nutrition_db import NutritionDB
+
+
+@pytest.fixture(scope="module")
+def nutrition_db() -> NutritionDB:
+    db = NutritionDB()
+    db.load()
+    return db
+
+
+def test_plausible_quantities_are_answered_locally(nutrition_db):
+    result = nutrition_db.analyze("2 oeufs et 200g de riz")
+    assert result is not None
+    assert [item["grams"] for item in result["items"]] == [100.0, 200.0]
+
+
+@pytest.mark.parametrize("description", ["1000 oeufs", "0 oeuf", "50kg de riz", "30 bols de riz"])
+def test_implausible_quantities_fall_back_to_llm(nutrition_db, description):
+    fallbacks = nutrition_db.fallbacks
+    assert nutrition_db.analyze(description) is None
+    assert nutrition_db.fallbacks == fallbacks + 1
@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.core.database import SessionLocal
+from app.core.quota import quota_remaining, quota_used, refund_quota, reserve_quota
+from app.core.user_cache import user_cache
+from app.main import app
+from app.models.user import SubscriptionTier, User
+
+DEV_USER = "temp_user_dev"  # utilisateur du mode sans Clerk
+
+
+async def _new_user(daily_quota: int = 3, quota_used: int = 0, reset: datetime = None) -> str:
+    user_id = f"quota_{uuid.uuid4()}"
+    async with SessionLocal() as db:
+        db.add(User(
+            id=user_id, email=f"{user_id}@nutriai.app", display_name="Test", subscription=SubscriptionTier.FREE,
+            daily_quota=daily_quota, quota_used=quota_used, quota_reset_date=reset or datetime.now()
+        ))
+        await db.commit()
+    return user_id
+
+
+async def _reserve(user_id: str) -> bool:
+    async with SessionLocal() as db:
+        user = await db.get(User, user_id)
+        try:
+            await reserve_quota(db, user)
+        except HTTPException as e:
+            assert e.status_code == 429
+            return False
+        await db.commit()
+        return True
+
+
+async def _stored(user_id: str) -> User:
+    async with SessionLocal() as db:
+        return await db.get(User, user_id)
+
+
+async def test_concurrent_reservations_never_exceed_quota():
+    user_id = await _new_user(daily_quota=3)
+    results = await asyncio.gather(*(_reserve(user_id) for _ in range(10)))
+    assert results.count(True) == 3
+    assert (await _stored(user_id)).quota_used == 3
+
+
+async def test_reservation_resets_after_day_boundary():
+    user_id = await _new_user(daily_quota=3, quota_used=3, reset=datetime.now() - timedelta(days=1))
+    user = await _stored(user_id)
+    assert quota_used(user) == 0
+    assert quota_remaining(user) == 3
+
+    assert await _reserve(user_id)
+    user = await _stored(user_id)
+    assert user.quota_used == 1
+    assert user.quota_reset_date.date() == datetime.now().date()
+
+
+async def test_batch_reservation_is_all_or_nothing():
+    user_id = await _new_user(daily_quota=3, quota_used=2)
+    async with SessionLocal() as db:
+        user = await db.get(User, user_id)
+        with pytest.raises(HTTPException):
+            await reserve_quota(db, user, 2)
+    assert (await _stored(user_id)).quota_used == 2
+
+
+async def test_refund_never_goes_negative():
+    user_id = await _new_user(daily_quota=3, quota_used=1)
+    async with SessionLocal() as db:
+        await refund_quota(db, user_id, 5)
+        await db.commit()
+    assert (await _stored(user_id)).quota_used == 0
+
+
+async def test_me_applies_day_boundary_reset_to_quota_used():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/api/v1/auth/me")).status_code == 200
+        async with SessionLocal() as db:
+            await db.execute(update(User).where(User.id == DEV_USER).values(
+                quota_used=User.daily_quota, quota_reset_date=datetime.now() - timedelta(days=1)
+            ))
+            await db.commit()
+        user_cache.invalidate(DEV_USER)
+
+        info = (await client.get("/api/v1/auth/me")).json()
+    assert info["quota_used"] == 0
+    assert info["quota_remaining"] == info["daily_quota"]
@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core import rate_limit
+from app.core.clerk import ClerkClient
+from app.core.rate_limit import DatabaseBackend, MemoryBackend, RateLimiter, RateLimitMiddleware, RateRule
+
+
+@pytest.fixture(params=["memory", "database"])
+def backend(request):
+    return MemoryBackend() if request.param == "memory" else DatabaseBackend()
+
+
+async def test_bucket_allows_burst_then_rejects(backend):
+    key = f"test:{uuid.uuid4()}"
+    assert await backend.take(key, 2, 1.0) == 0
+    assert await backend.take(key, 2, 1.0) == 0
+    wait = await backend.take(key, 2, 1.0)
+    assert 0 < wait <= 1.0
+
+
+async def test_bucket_refills_over_time(backend):
+    key = f"test:{uuid.uuid4()}"
+    assert await backend.take(key, 1, 20.0) == 0
+    assert await backend.take(key, 1, 20.0) > 0
+    await asyncio.sleep(0.1)  # 20 jetons/s : rechargé
+    assert await backend.take(key, 1, 20.0) == 0
+
+
+def test_rule_parsing():
+    rule = RateRule("post /api/v1/meals/analyze=20/60")
+    assert rule.method == "POST" and rule.capacity == 20 and rule.rate == pytest.approx(1 / 3)
+    assert rule.matches("POST", "/api/v1/meals/analyze/stream")
+    assert not rule.matches("GET", "/api/v1/meals/analyze")
+    with pytest.raises(ValueError):
+        RateRule("POST /x=abc")
+
+
+async def test_rejected_ip_does_not_charge_user_bucket():
+    limiter = RateLimiter(rules=["GET /limited=1/60"], backend="memory", ip_factor=1.0)
+    rule = limiter.rules[0]
+    assert await limiter.check(rule, "alice", "10.0.0.1") == 0
+    # IP épuisée : refus sans toucher au bucket d'un autre utilisateur
+    assert await limiter.check(rule, "bob", "10.0.0.1") > 0
+    assert await limiter.check(rule, "bob", "10.0.0.2") == 0
+
+
+def _app(limiter: RateLimiter):
+    async def ok(request):
+        return PlainTextResponse("ok")
+    return RateLimitMiddleware(Starlette(routes=[Route("/limited", ok)]), limiter=limiter)
+
+
+async def _get(app, headers=None):
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.9", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/limited", headers=headers or {})
+
+
+async def test_middleware_returns_429_with_retry_after():
+    app = _app(RateLimiter(rules=["GET /limited=2/60"], backend="memory", ip_factor=5.0))
+    assert (await _get(app)).status_code == 200
+    assert (await _get(app)).status_code == 200
+    response = await _get(app)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["retry-after"]) <= 30
+
+
+async def test_forwarded_for_rotation_does_not_reset_ip_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_PROXY_HOPS", 1)
+    app = _app(RateLimiter(rules=["GET /limited=1/60"], backend="memory", ip_factor=5.0))
+    # Le proxy ajoute l'adresse réelle à droite ; l'entrée de gauche est choisie par le client
+    assert (await _get(app, {"X-Forwarded-For": "1.1.1.1, 203.0.113.7"})).status_code == 200
+    assert (await _get(app, {"X-Forwarded-For": "2.2.2.2, 203.0.113.7"})).status_code == 429
+
+
+async def test_forwarded_for_ignored_without_trusted_proxy():
+    app = _app(RateLimiter(rules=["GET /limited=1/60"], backend="memory", ip_factor=5.0))
+    assert (await _get(app, {"X-Forwarded-For": "1.1.1.1"})).status_code == 200
+    assert (await _get(app, {"X-Forwarded-For": "2.2.2.2"})).status_code == 429
+
+
+async def test_identity_matches_authentication(monkeypatch, signing_key, rotated_key):
+    client = ClerkClient()
+    client.load_jwks({"keys": [signing_key.public_jwk]})
+    monkeypatch.setattr(client, "MIN_REFRESH_INTERVAL", 1e9)
+    monkeypatch.setattr(rate_limit, "clerk_client", client)
+    monkeypatch.setattr(rate_limit.settings, "CLERK_SECRET_KEY", "sk_test")
+
+    scope = {}
+    token = signing_key.token(sub="user_ok")
+    assert await rate_limit._identity(scope, f"Bearer {token}") == "user_ok"
+    assert scope["state"]["clerk_claims"][0] == token
+    # Token simplifié : l'identité que get_current_user acceptera
+    assert await rate_limit._identity({}, "Bearer clerk_user_app") == "user_app"
+    # Signature d'une clé inconnue du JWKS, absence de token : IP seule
+    assert await rate_limit._identity({}, f"Bearer {rotated_key.token(sub='victim')}") is None
+    assert await rate_limit._identity({}, None) is None
+
+
+async def test_users_behind_one_ip_get_their_own_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "CLERK_SECRET_KEY", "sk_test")
+    app = _app(RateLimiter(rules=["GET /limited=1/60"], backend="memory", ip_factor=5.0))
+    alice = {"Authorization": f"Bearer clerk_{uuid.uuid4()}"}
+    bob = {"Authorization": f"Bearer clerk_{uuid.uuid4()}"}
+    assert (await _get(app, alice)).status_code == 200
+    assert (await _get(app, alice)).status_code == 429
+    # Même IP (NAT) : Bob n'est pas limité par la consommation d'Alice
+    assert (await _get(app, bob)).status_code == 200
+
+
+async def test_jwt_is_verified_once_per_request(monkeypatch, signing_key):
+    from app.core import auth
+    from app.main import app
+
+    client = ClerkClient()
+    client.load_jwks({"keys": [signing_key.public_jwk]})
+    monkeypatch.setattr(rate_limit, "clerk_client", client)
+    monkeypatch.setattr(auth, "clerk_client", client)
+    monkeypatch.setattr(rate_limit.settings, "CLERK_SECRET_KEY", "sk_test")
+    token = signing_key.token(sub=f"user_{uuid.uuid4()}", email="once@nutriai.app")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert client.verified == 1
+
+
+async def test_forged_identity_does_not_widen_ip_bucket(monkeypatch, signing_key, rotated_key):
+    client = ClerkClient()
+    client.load_jwks({"keys": [signing_key.public_jwk]})
+    monkeypatch.setattr(client, "MIN_REFRESH_INTERVAL", 1e9)
+    monkeypatch.setattr(rate_limit, "clerk_client", client)
+    monkeypatch.setattr(rate_limit.settings, "CLERK_SECRET_KEY", "sk_test")
+    app = _app(RateLimiter(rules=["GET /limited=1/60"], backend="memory", ip_factor=5.0))
+    forged = {"Authorization": f"Bearer {rotated_key.token(sub=str(uuid.uuid4()))}"}
+    assert (await _get(app, forged)).status_code == 200
+    forged = {"Authorization": f"Bearer {rotated_key.token(sub=str(uuid.uuid4()))}"}
+    assert (await _get(app, forged)).status_code == 429
@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from app.core.database import SessionLocal, engine
+from app.core.events import meal_events
+from app.core.rollup import backfill_counters, publish_meals, record_meals, user_count
+from app.models.meal import Meal
+from app.models.user import SubscriptionTier, User
+
+
+def _user() -> User:
+    user_id = f"rollup_{uuid.uuid4()}"
+    return User(
+        id=user_id, email=f"{user_id}@nutriai.app", display_name="Test", subscription=SubscriptionTier.FREE,
+        daily_quota=10, quota_used=0, quota_reset_date=datetime.now()
+    )
+
+
+async def _count_users(db) -> int:
+    return (await db.execute(select(func.count(User.id)))).scalar()
+
+
+async def test_user_counter_follows_inserts_and_deletes():
+    async with SessionLocal() as db:
+        before = await user_count(db)
+        users = [_user(), _user()]
+        db.add_all(users)
+        await db.commit()
+        assert await user_count(db) == before + 2
+
+        await db.delete(users[0])
+        await db.commit()
+        assert await user_count(db) == before + 1
+        assert await user_count(db) == await _count_users(db)
+
+
+async def test_counter_backfill_matches_users():
+    async with engine.begin() as conn:
+        await backfill_counters(conn)
+    async with SessionLocal() as db:
+        assert await user_count(db) == await _count_users(db)
+
+
+async def test_published_delta_uses_the_rollup_day():
+    queue = meal_events.subscribe()
+    try:
+        async with SessionLocal() as db:
+            user = _user()
+            db.add(user)
+            meal = Meal(
+                id=str(uuid.uuid4()), user_id=user.id, description="Salade", calories=300.0, proteins=10.0,
+                carbs=20.0, fats=15.0, fiber=5.0, suggestions=[], model_used="test/rollup-day",
+                tokens_used=100, cost_usd=0.01, hedge_cost_usd=0.0
+            )
+            db.add(meal)
+            await db.flush()
+            day = await record_meals(db, [meal])
+            await db.commit()
+            meal_day = (await db.execute(select(func.date(Meal.created_at)).where(Meal.id == meal.id))).scalar()
+            publish_meals([meal], day)
+        # Horloge de la base pour la ligne du rollup, la date du repas et l'événement
+        assert day.isoformat() == str(meal_day)
+        assert queue.get_nowait()["date"] == day.isoformat()
+    finally:
+        meal_events.unsubscribe(queue)